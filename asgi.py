@@ -0,0 +1,14 @@
+from core import app as wsgi_app
+from core.asgi import AsyncReads
+
+import os
+
+port = int(os.environ.get("PORT", 8000))
+
+# pip install aiosqlite uvicorn (and asgiref to serve the writes from the same process)
+app = AsyncReads(wsgi_app)
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run('asgi:app', host='0.0.0.0', port=port)
@@ -0,0 +1,163 @@
+"""
+_summary_
+
+Compare concurrent-connection throughput of the blog reads served over WSGI and ASGI.
+
+The database is seeded once, then each server runs against it in turn on localhost:
+
+wsgi          - gunicorn sync workers (app:app), as the Procfile runs it
+wsgi-threads  - gunicorn gthread workers with --threads per worker
+asgi          - gunicorn managing uvicorn workers (asgi:app), the reads on the async engine
+
+For each level of --concurrency that many client connections send a mix of GET /post/all,
+/post/<id>, /post/<id>/comments and /post/<id>/comment/<id> for --duration seconds,
+reconnecting whenever the server closes the connection. The report shows requests per
+second, p50/p99 latency and failed requests. Requires gunicorn, uvicorn and aiosqlite.
+
+    python benchmarks/bench_asgi.py --workers 2 --concurrency 1 16 64 --duration 5
+"""
+
+import os
+import sys
+import time
+import random
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_db_dir = tempfile.mkdtemp()
+os.environ['DATABASE_URI'] = 'sqlite:///' + os.path.join(_db_dir, 'bench.db')
+os.environ.setdefault('SECRET_KEY', 'bench-secret-key')
+
+import seed as seeder
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if (not values): return float('nan')
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def server_command(mode, port, workers, threads):
+    bind = f'127.0.0.1:{port}'
+    if (mode == 'wsgi'):
+        return [sys.executable, '-m', 'gunicorn', '--preload', '--workers', str(workers), '--bind', bind, 'app:app']
+    if (mode == 'wsgi-threads'):
+        return [sys.executable, '-m', 'gunicorn', '--preload', '--workers', str(workers), '--worker-class', 'gthread',
+                '--threads', str(threads), '--bind', bind, 'app:app']
+    return [sys.executable, '-m', 'gunicorn', '--preload', '--workers', str(workers), '--worker-class', 'uvicorn.workers.UvicornWorker',
+            '--bind', bind, 'asgi:app']
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for(port, timeout=30):
+    deadline = time.perf_counter() + timeout
+    while (time.perf_counter() < deadline):
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'server on port {port} did not start')
+
+
+def paths(data, rng):
+    ''' Yield an endless mix of the four read endpoints. '''
+    post_ids = data['post_ids']
+    while True:
+        post_id = rng.choice(post_ids)
+        yield rng.choice(('/post/all', f'/post/{post_id}', f'/post/{post_id}/comments', f'/post/{post_id}/comment/1'))
+
+
+async def request(reader, writer, path):
+    ''' Send a GET and read the response; return (status, keep_alive). '''
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n'.encode())
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length, keep_alive = 0, True
+    while True:
+        line = await reader.readline()
+        if (line in (b'\r\n', b'')):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        name, value = name.strip().lower(), value.strip().lower()
+        if (name == 'content-length'): length = int(value)
+        elif (name == 'connection'): keep_alive = value != 'close'
+    await reader.readexactly(length)
+    return status, keep_alive
+
+
+async def connection(port, requests, deadline, timings, errors):
+    reader = writer = None
+    for path in requests:
+        if (time.perf_counter() >= deadline):
+            break
+        begin = time.perf_counter()
+        try:
+            if (writer is None):
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            status, keep_alive = await request(reader, writer, path)
+            failed = status >= 500
+        except (OSError, ValueError, IndexError, asyncio.IncompleteReadError):
+            status, keep_alive, failed = None, False, True
+        timings.append((time.perf_counter() - begin) * 1000)
+        errors.append(failed)
+        if (not keep_alive):
+            writer.close()
+            reader = writer = None
+    if (writer is not None):
+        writer.close()
+
+
+async def drive(port, data, concurrency, duration, seed):
+    timings, errors = [], []
+    deadline = time.perf_counter() + duration
+    begin = time.perf_counter()
+    await asyncio.gather(*(connection(port, paths(data, random.Random(seed + i)), deadline, timings, errors)
+                           for i in range(concurrency)))
+    return timings, sum(errors), time.perf_counter() - begin
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--posts', type=int, default=1000)
+    parser.add_argument('--comments', type=int, default=10, help='comments per post')
+    parser.add_argument('--workers', type=int, default=2, help='server worker processes')
+    parser.add_argument('--threads', type=int, default=4, help='threads per gthread worker')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 16, 64])
+    parser.add_argument('--duration', type=float, default=5, help='seconds per mode and concurrency')
+    parser.add_argument('--modes', nargs='+', choices=('wsgi', 'wsgi-threads', 'asgi'), default=['wsgi', 'wsgi-threads', 'asgi'])
+    args = parser.parse_args()
+
+    data = seeder.seed(users=10, tokens=1, posts=args.posts, comments=args.comments)
+    environment = dict(os.environ, DATABASE_PROFILE=os.environ.get('DATABASE_PROFILE', 'production'))
+
+    print(f"{'mode':>13} {'conns':>6} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for mode in args.modes:
+        port = free_port()
+        server = subprocess.Popen(server_command(mode, port, args.workers, args.threads), cwd=ROOT, env=environment,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_for(port)
+            asyncio.run(drive(port, data, 4, 0.5, 0))  # warm up every worker's connections
+            for concurrency in args.concurrency:
+                timings, errors, elapsed = asyncio.run(drive(port, data, concurrency, args.duration, concurrency))
+                print(f'{mode:>13} {concurrency:>6} {len(timings) / elapsed:>9.1f} {percentile(timings, 50):>8.2f} '
+                      f'{percentile(timings, 99):>8.2f} {errors:>7}')
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+_summary_
+
+Compare JSON providers on post and comment listings.
+
+Each provider serves the same pages of GET /post/all and GET /post/<id>/comments through
+the test client, with the response cache off. The report shows requests per second and
+the time spent inside the provider's response() per request, which is the serialization
+of the envelope (datetimes included).
+
+flask       - Flask's DefaultJSONProvider
+stdlib      - core.utils.JSONProvider on the stdlib encoder
+orjson      - core.utils.JSONProvider on orjson, RFC 822 datetimes (default)
+orjson-iso  - core.utils.JSONProvider on orjson, ISO 8601 datetimes encoded natively
+
+    python benchmarks/bench_json.py --requests 500
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_db_dir = tempfile.mkdtemp()
+os.environ['DATABASE_URI'] = 'sqlite:///' + os.path.join(_db_dir, 'bench.db')
+os.environ.setdefault('SECRET_KEY', 'bench-secret-key')
+
+from flask.json.provider import DefaultJSONProvider
+
+from core import app
+from core.utils import JSONProvider
+import seed as seeder
+
+
+PAGES = {
+    'posts summary x10': '/post/all',
+    'posts full x100': '/post/all?limit=100&view=full',
+    'comments x25': '/post/1/comments',
+    'comments x100': '/post/1/comments?limit=100',
+}
+
+
+class Timed(object):
+    ''' Wraps a provider and adds up the time spent in response(). '''
+
+    def __init__(self, provider):
+        self.provider = provider
+        self.seconds = 0.0
+
+    def __getattr__(self, name):
+        return getattr(self.provider, name)
+
+    def response(self, *args, **kwargs):
+        begin = time.perf_counter()
+        try:
+            return self.provider.response(*args, **kwargs)
+        finally:
+            self.seconds += time.perf_counter() - begin
+
+
+def providers():
+    yield 'flask', DefaultJSONProvider(app)
+    for name, library, datetimes in (('stdlib', 'stdlib', 'http'), ('orjson', 'orjson', 'http'), ('orjson-iso', 'orjson', 'iso')):
+        app.config.update(JSON_LIBRARY=library, JSON_DATETIME_FORMAT=datetimes)
+        yield name, JSONProvider(app)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--posts', type=int, default=200)
+    parser.add_argument('--comments', type=int, default=100, help='comments per post')
+    parser.add_argument('--requests', type=int, default=500, help='timed requests per page and provider')
+    args = parser.parse_args()
+
+    app.config['RESPONSE_CACHE_BACKEND'] = ''
+    seeder.seed(users=10, tokens=1, posts=args.posts, comments=args.comments)
+    client = app.test_client()
+
+    print(f"{'page':>18} {'provider':>11} {'bytes':>7} {'req/s':>8} {'encode us':>10}")
+    for page, url in PAGES.items():
+        for name, provider in providers():
+            app.json = timed = Timed(provider)
+            size = len(client.get(url).get_data())
+            timed.seconds = 0.0
+            begin = time.perf_counter()
+            for _ in range(args.requests):
+                assert client.get(url).status_code == 200
+            elapsed = time.perf_counter() - begin
+            print(f'{page:>18} {name:>11} {size:>7} {args.requests / elapsed:>8.1f} {timed.seconds / args.requests * 1e6:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
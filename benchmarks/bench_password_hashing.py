@@ -0,0 +1,87 @@
+"""
+_summary_
+
+Compare login latency with inline and pooled password hashing under concurrent load.
+
+A set of threads log in continuously while another set reads /post/all. Each mode runs
+for the same duration and reports p50/p99 for logins and for the unrelated reads, which
+is where hashing on the request thread shows up as tail latency.
+
+    python benchmarks/bench_password_hashing.py --method pbkdf2:sha256:260000 --workers 4
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_db_dir = tempfile.mkdtemp()
+os.environ['DATABASE_URI'] = 'sqlite:///' + os.path.join(_db_dir, 'bench.db')
+os.environ.setdefault('SECRET_KEY', 'bench-secret-key')
+
+from core import app, db
+from core.user_auth import models
+from core.user_auth.hashing import password_hasher
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if (not values): return float('nan')
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def worker(url, payload, stop, timings):
+    client = app.test_client()
+    while (not stop.is_set()):
+        begin = time.perf_counter()
+        if (payload): client.post(url, json=payload)
+        else: client.get(url)
+        timings.append((time.perf_counter() - begin) * 1000)
+
+
+def run(logins, readers, duration, users):
+    stop = threading.Event()
+    login_times, read_times = [], []
+    threads = [threading.Thread(target=worker, args=('/login', {'email': users[i % len(users)], 'password': 'password'}, stop, login_times)) for i in range(logins)]
+    threads += [threading.Thread(target=worker, args=('/post/all', None, stop, read_times)) for _ in range(readers)]
+    for t in threads: t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in threads: t.join()
+    return login_times, read_times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--method', default='pbkdf2:sha256:260000')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--logins', type=int, default=8, help='concurrent login threads')
+    parser.add_argument('--readers', type=int, default=4, help='concurrent /post/all threads')
+    parser.add_argument('--duration', type=float, default=10)
+    args = parser.parse_args()
+
+    app.config['PASSWORD_HASH_METHOD'] = args.method
+    with app.app_context():
+        db.create_all()
+        password_hasher.init_app(app)
+        users = [f'user{i}@example.com' for i in range(args.logins)]
+        for email in users:
+            db.session.add(models.User.create(email, 'password'))
+        db.session.commit()
+
+    print(f"{'mode':>8} {'logins/s':>9} {'login p50':>10} {'login p99':>10} {'read p50':>9} {'read p99':>9}")
+    for mode, workers in (('inline', 0), ('pooled', args.workers)):
+        app.config['PASSWORD_HASH_WORKERS'] = workers
+        password_hasher.init_app(app)
+        logins, reads = run(args.logins, args.readers, args.duration, users)
+        print(f'{mode:>8} {len(logins) / args.duration:>9.1f} {percentile(logins, 50):>10.2f} {percentile(logins, 99):>10.2f} '
+              f'{percentile(reads, 50):>9.2f} {percentile(reads, 99):>9.2f}')
+    password_hasher.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+_summary_
+
+Benchmark GET /post/all at increasing table sizes.
+
+Times the first page and a page near the end of the table (reached through a cursor
+taken from the oldest rows) so the cost of deep pages can be compared with page one.
+Keyset pagination should keep both flat as the table grows.
+
+    python benchmarks/bench_post_pagination.py --sizes 1000 10000 100000 1000000
+"""
+
+import os
+import sys
+import time
+import argparse
+import datetime
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_db_dir = tempfile.mkdtemp()
+os.environ['DATABASE_URI'] = 'sqlite:///' + os.path.join(_db_dir, 'bench.db')
+
+from core import app, db
+from core.blog import models
+from core.utils import encode_cursor
+
+
+def seed(count, batch=50000):
+    ''' Fill the post table with `count` rows using executemany batches. '''
+    start = datetime.datetime(2020, 1, 1)
+    table = models.Post.__table__
+    for offset in range(0, count, batch):
+        rows = [{
+            'title': f'post {i}',
+            'body': b'lorem ipsum dolor sit amet ' * 8,
+            'created_at': start + datetime.timedelta(seconds=i),
+        } for i in range(offset, min(offset + batch, count))]
+        db.session.execute(table.insert(), rows)
+    db.session.commit()
+
+
+def measure(client, url, repeat):
+    timings = []
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        response = client.get(url)
+        timings.append((time.perf_counter() - begin) * 1000)
+        assert response.status_code == 200
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    client = app.test_client()
+    print(f"{'posts':>10} {'first page ms':>14} {'deep page ms':>14}")
+
+    with app.app_context():
+        for size in args.sizes:
+            db.drop_all()
+            db.create_all()
+            seed(size)
+
+            # A cursor pointing just past the oldest `limit` rows is the deepest page there is.
+            oldest = models.Post.query.order_by(models.Post.created_at, models.Post.id).offset(args.limit).first()
+            cursor = encode_cursor([oldest.created_at, oldest.id])
+
+            first = measure(client, f'/post/all?limit={args.limit}', args.repeat)
+            deep = measure(client, f'/post/all?limit={args.limit}&cursor={cursor}', args.repeat)
+            print(f'{size:>10} {first:>14.3f} {deep:>14.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+_summary_
+
+Compare throughput of mixed reads and writes from several worker processes with the stock
+SQLite settings and with the production profile (DATABASE_PROFILE, see core/utils/database.py).
+
+Each profile runs in a fresh interpreter: the database is seeded, then forked worker
+processes (like gunicorn workers) loop for a fixed duration, creating a comment on a
+fraction of their requests and reading /post/all and a comment listing otherwise.
+Failed requests ("database is locked") are counted as errors.
+
+    python benchmarks/bench_sqlite_concurrency.py --workers 8 --writes 0.2 --duration 10
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import subprocess
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PROFILES = {
+    'stock': {'DATABASE_PROFILE': '', 'DATABASE_POOL_SIZE': '0'},
+    'production': {'DATABASE_PROFILE': 'production'},
+}
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if (not values): return float('nan')
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def worker(seed, posts, headers, writes, duration, results):
+    from core import app
+
+    random.seed(seed)
+    client = app.test_client()
+    reads, written, errors = [], [], 0
+    deadline = time.perf_counter() + duration
+    while (time.perf_counter() < deadline):
+        post_id = random.randint(1, posts)
+        begin = time.perf_counter()
+        if (random.random() < writes):
+            response = client.post(f'/post/{post_id}/comment/create', json={'body': 'benchmark comment'}, headers=headers)
+            timings = written
+        else:
+            response = client.get('/post/all' if random.random() < 0.5 else f'/post/{post_id}/comments')
+            timings = reads
+        timings.append((time.perf_counter() - begin) * 1000)
+        errors += response.status_code != 200
+    results.put((reads, written, errors))
+
+
+def run_profile(args):
+    ''' Seed a fresh database and run the forked workers; print the summary as JSON. '''
+    from core import app, db
+    from core.blog import models as blog_models
+    from core.user_auth import models as auth_models
+
+    with app.app_context():
+        db.create_all()
+        admin = auth_models.User.create('admin@example.com', 'password')
+        admin.is_admin = True
+        db.session.add(admin)
+        for i in range(args.posts):
+            db.session.add(blog_models.Post.create({'title': f'post {i}', 'body': 'lorem ipsum dolor sit amet ' * 40}))
+        db.session.commit()
+        token = admin.generate_token()
+        db.session.add(token)
+        db.session.commit()
+        token = token.token
+        db.session.remove()
+        # Connections must not cross the fork.
+        db.get_engine(app).dispose()
+
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(i, args.posts, {'Authorization': token}, args.writes, args.duration, results))
+                 for i in range(args.workers)]
+    for p in processes: p.start()
+    reads, writes, errors = [], [], 0
+    for _ in processes:
+        r, w, e = results.get()
+        reads += r
+        writes += w
+        errors += e
+    for p in processes: p.join()
+
+    print(json.dumps({
+        'requests/s': (len(reads) + len(writes)) / args.duration,
+        'writes/s': len(writes) / args.duration,
+        'errors': errors,
+        'read p50': percentile(reads, 50), 'read p99': percentile(reads, 99),
+        'write p50': percentile(writes, 50), 'write p99': percentile(writes, 99),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=8, help='worker processes')
+    parser.add_argument('--writes', type=float, default=0.2, help='fraction of requests that write')
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--posts', type=int, default=200)
+    parser.add_argument('--profile', choices=list(PROFILES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if (args.profile):
+        return run_profile(args)
+
+    print(f"{'profile':>10} {'req/s':>8} {'writes/s':>9} {'errors':>7} {'read p50':>9} {'read p99':>9} {'write p50':>10} {'write p99':>10}")
+    for profile, settings in PROFILES.items():
+        env = dict(os.environ, DATABASE_URI='sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db'),
+                   SECRET_KEY=os.environ.get('SECRET_KEY', 'bench-secret-key'), **settings)
+        argv = [sys.executable, os.path.abspath(__file__), '--profile', profile, '--workers', str(args.workers),
+                '--writes', str(args.writes), '--duration', str(args.duration), '--posts', str(args.posts)]
+        r = json.loads(subprocess.run(argv, env=env, check=True, capture_output=True, text=True).stdout.splitlines()[-1])
+        print(f"{profile:>10} {r['requests/s']:>8.1f} {r['writes/s']:>9.1f} {r['errors']:>7} {r['read p50']:>9.2f} "
+              f"{r['read p99']:>9.2f} {r['write p50']:>10.2f} {r['write p99']:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
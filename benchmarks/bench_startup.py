@@ -0,0 +1,101 @@
+"""
+_summary_
+
+Measure how long a worker takes from start to its first served request.
+
+cold    - a fresh interpreter imports core, calls create_app() and serves GET /post/all,
+          as every worker does without --preload. Timed from spawning the interpreter,
+          with the import / create_app / first request phases reported separately.
+preload - the application is created once in this process and workers are forked from
+          it, as gunicorn --preload does. Timed from fork to the first served request.
+
+    python benchmarks/bench_startup.py --runs 10
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_db_dir = tempfile.mkdtemp()
+os.environ['DATABASE_URI'] = 'sqlite:///' + os.path.join(_db_dir, 'bench.db')
+os.environ.setdefault('SECRET_KEY', 'bench-secret-key')
+
+# Run in a fresh interpreter; prints the phase timings in milliseconds.
+COLD = '''
+import json, time
+begin = time.perf_counter()
+import core
+imported = time.perf_counter()
+app = core.create_app()
+created = time.perf_counter()
+assert app.test_client().get('/post/all').status_code == 200
+served = time.perf_counter()
+print(json.dumps({'import': (imported - begin) * 1000, 'create_app': (created - imported) * 1000,
+                  'first request': (served - created) * 1000}))
+'''
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if (not values): return float('nan')
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def cold_start():
+    begin = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', COLD], cwd=ROOT, check=True, capture_output=True, text=True).stdout
+    timings = json.loads(output.strip().splitlines()[-1])
+    timings['total'] = (time.perf_counter() - begin) * 1000
+    return timings
+
+
+def preload_start(app):
+    read, write = os.pipe()
+    begin = time.perf_counter()
+    pid = os.fork()
+    if (pid == 0):
+        try:
+            status = app.test_client().get('/post/all').status_code
+            os.write(write, json.dumps([status, (time.perf_counter() - begin) * 1000]).encode())
+        finally:
+            os._exit(0)
+    os.close(write)
+    status, elapsed = json.loads(os.read(read, 64))
+    os.close(read)
+    os.waitpid(pid, 0)
+    assert status == 200
+    return {'total': elapsed}
+
+
+def report(mode, runs):
+    for phase in runs[0]:
+        values = [run[phase] for run in runs]
+        print(f'{mode:>8} {phase:>14} {percentile(values, 50):>9.1f} {percentile(values, 90):>9.1f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    from core import create_app, db
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        # Let the parent use its pool, so the forked workers have connections to leave behind.
+        assert app.test_client().get('/post/all').status_code == 200
+
+    print(f"{'mode':>8} {'phase':>14} {'p50 ms':>9} {'p90 ms':>9}")
+    report('cold', [cold_start() for _ in range(args.runs)])
+    report('preload', [preload_start(app) for _ in range(args.runs)])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+_summary_
+
+Fill a scratch database with synthetic users, tokens, posts and comments.
+
+Rows are generated deterministically from a random seed and written with executemany
+INSERTs in batches, bypassing the ORM, so seeding a million comments takes seconds. Every
+user's password is 'password' (hashed once). Import this module after pointing
+DATABASE_URI at the scratch database, as benchmarks/suite.py does.
+"""
+
+import uuid
+import random
+import datetime
+
+from core import app, db
+from core.blog import models as blog_models
+from core.blog import activity, search
+from core.user_auth import models as auth_models
+from core.user_auth.hashing import password_hasher
+
+PASSWORD = 'password'
+BATCH = 10000
+
+WORDS = ('lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt ut labore '
+         'et dolore magna aliqua flask sqlite python cursor index cache token request response').split()
+
+
+def _text(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def _insert(table, rows):
+    rows = iter(rows)
+    while True:
+        batch = [row for _, row in zip(range(BATCH), rows)]
+        if (not batch):
+            break
+        db.session.execute(table.insert(), batch)
+
+
+def seed(users=100, tokens=2, posts=1000, comments=5, body_words=300, seed=0):
+    '''
+    Create the schema and the rows. Return a dict of what the benchmarks need:
+    the admin email, a list of (email, token) per user, and the post ids.
+    '''
+    rng = random.Random(seed)
+    config = app.config
+    start = datetime.datetime(2020, 1, 1)
+    expires = datetime.datetime.now() + datetime.timedelta(days=7)
+
+    with app.app_context():
+        db.create_all()
+        password = password_hasher.hash(PASSWORD)
+
+        # User 1 is the admin.
+        user_rows = [{'id': i, 'public_id': str(uuid.UUID(int=rng.getrandbits(128))), 'email': f'user{i}@example.com',
+                      'password': password, 'is_admin': i == 1} for i in range(1, users + 1)]
+        _insert(auth_models.User.__table__, user_rows)
+
+        credentials = []
+
+        def token_rows():
+            for user in user_rows:
+                for _ in range(tokens):
+                    token = auth_models.User(id=user['id'], public_id=user['public_id']).generate_token(expires)
+                    credentials.append((user['email'], token.token))
+                    yield {'user_id': user['id'], 'token': token.token, 'expires_at': expires}
+        _insert(auth_models.Token.__table__, token_rows())
+
+        def post_rows():
+            for i in range(1, posts + 1):
+                text = _text(rng, body_words)
+                body, encoding = blog_models.encode_body(text, config['POST_BODY_COMPRESSION_LEVEL'], config['POST_BODY_COMPRESSION_MIN_SIZE'])
+                yield {'id': i, 'user_id': 1, 'title': f'post {i} {_text(rng, 4)}', 'body': body, 'body_encoding': encoding,
+                       'excerpt': blog_models.make_excerpt(text, config['POST_EXCERPT_LENGTH']), 'word_count': body_words,
+                       'created_at': start + datetime.timedelta(minutes=i)}
+        _insert(blog_models.Post.__table__, post_rows())
+
+        def comment_rows():
+            for i in range(posts * comments):
+                post_id = i // comments + 1
+                yield {'post_id': post_id, 'user_id': rng.randint(1, users), 'body': _text(rng, 30),
+                       'created_at': start + datetime.timedelta(minutes=post_id, seconds=i % comments)}
+        _insert(blog_models.Comment.__table__, comment_rows())
+
+        activity.recount(db.session.connection())
+        db.session.commit()
+        search.reindex()
+        db.session.remove()
+
+    return {
+        'admin': user_rows[0]['email'] if user_rows else None,
+        'credentials': credentials,
+        'post_ids': list(range(1, posts + 1)),
+    }
@@ -0,0 +1,203 @@
+"""
+_summary_
+
+Benchmark the main endpoints against a seeded scratch database.
+
+The database is filled by benchmarks/seed.py, then every scenario is driven through the
+Flask test client (in process, no network) and through a concurrent HTTP load generator
+hitting a threaded server on localhost. For each driver and scenario the suite reports
+throughput and p50/p95/p99 latency, and with --output writes them as JSON so runs can be
+diffed across commits.
+
+    python benchmarks/suite.py --posts 10000 --comments 10 --requests 500 --concurrency 8 --output before.json
+    python benchmarks/suite.py --scenarios post_get comment_list --drivers http
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import http.client
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_db_dir = tempfile.mkdtemp()
+os.environ['DATABASE_URI'] = 'sqlite:///' + os.path.join(_db_dir, 'bench.db')
+os.environ.setdefault('SECRET_KEY', 'bench-secret-key')
+
+from werkzeug.serving import make_server, WSGIRequestHandler
+
+from core import app
+from core.blog import models as blog_models
+from core.utils import encode_cursor
+import seed as seeder
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if (not values): return float('nan')
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+# scenario -> request factory (data, rng, i) -> (method, path, json body, authorization token)
+SCENARIOS = {
+    'login': lambda data, rng, i: ('POST', '/login', {'email': rng.choice(data['credentials'])[0], 'password': seeder.PASSWORD}, None),
+    'post_list': lambda data, rng, i: ('GET', '/post/all', None, None),
+    'post_list_deep': lambda data, rng, i: ('GET', f"/post/all?cursor={data['deep_cursor']}", None, None),
+    'post_get': lambda data, rng, i: ('GET', f"/post/{rng.choice(data['post_ids'])}", None, None),
+    'comment_list': lambda data, rng, i: ('GET', f"/post/{rng.choice(data['post_ids'])}/comments", None, None),
+    'search': lambda data, rng, i: ('GET', f"/search?q={rng.choice(seeder.WORDS)}", None, None),
+    'post_create': lambda data, rng, i: ('POST', '/post/create', {'title': f"bench {data['run']} {i}", 'body': 'benchmark post ' * 50}, data['admin_token']),
+    'comment_create': lambda data, rng, i: ('POST', f"/post/{rng.choice(data['post_ids'])}/comment/create", {'body': 'benchmark comment'}, rng.choice(data['credentials'])[1]),
+}
+
+
+def summarize(timings, errors, elapsed):
+    return {
+        'requests': len(timings),
+        'errors': errors,
+        'throughput': round(len(timings) / elapsed, 2) if elapsed else None,
+        'mean_ms': round(sum(timings) / len(timings), 3) if timings else None,
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+    }
+
+
+def drive_client(factory, data, requests, concurrency, seed):
+    ''' Send the requests through Flask test clients, one per thread. '''
+    def work(n, rng, timings, errors):
+        client = app.test_client()
+        for i in range(n):
+            method, path, body, token = factory(data, rng, rng.getrandbits(32))
+            headers = {'Authorization': token} if token else {}
+            begin = time.perf_counter()
+            response = client.open(path, method=method, json=body, headers=headers)
+            timings.append((time.perf_counter() - begin) * 1000)
+            errors.append(response.status_code >= 400)
+    return _run_threads(work, requests, concurrency, seed)
+
+
+def drive_http(factory, data, requests, concurrency, seed, port):
+    ''' Send the requests over keep-alive HTTP connections, one per thread. '''
+    def work(n, rng, timings, errors):
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        for i in range(n):
+            method, path, body, token = factory(data, rng, rng.getrandbits(32))
+            headers = {'Content-Type': 'application/json'} if body is not None else {}
+            if (token): headers['Authorization'] = token
+            payload = json.dumps(body) if body is not None else None
+            begin = time.perf_counter()
+            try:
+                connection.request(method, path, body=payload, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                failed = response.status >= 400
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                failed = True
+            timings.append((time.perf_counter() - begin) * 1000)
+            errors.append(failed)
+        connection.close()
+    return _run_threads(work, requests, concurrency, seed)
+
+
+def _run_threads(work, requests, concurrency, seed):
+    timings, errors = [], []
+    shares = [requests // concurrency + (1 if i < requests % concurrency else 0) for i in range(concurrency)]
+    threads = [threading.Thread(target=work, args=(n, random.Random(seed + i), timings, errors)) for i, n in enumerate(shares)]
+    begin = time.perf_counter()
+    for t in threads: t.start()
+    for t in threads: t.join()
+    return summarize(timings, sum(errors), time.perf_counter() - begin)
+
+
+class Handler(WSGIRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--tokens', type=int, default=2, help='tokens per user')
+    parser.add_argument('--posts', type=int, default=2000)
+    parser.add_argument('--comments', type=int, default=5, help='comments per post')
+    parser.add_argument('--requests', type=int, default=300, help='timed requests per scenario and driver')
+    parser.add_argument('--warmup', type=int, default=20, help='untimed requests per scenario and driver')
+    parser.add_argument('--concurrency', type=int, default=4, help='threads sending requests')
+    parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--drivers', nargs='+', choices=('client', 'http'), default=['client', 'http'])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    args = parser.parse_args()
+
+    begin = time.perf_counter()
+    data = seeder.seed(args.users, args.tokens, args.posts, args.comments, seed=args.seed)
+    print(f'seeded in {time.perf_counter() - begin:.1f}s', file=sys.stderr)
+
+    client = app.test_client()
+    admin = client.post('/login', json={'email': data['admin'], 'password': seeder.PASSWORD}).get_json()
+    data['admin_token'] = admin['body']['Authorization']
+    with app.app_context():
+        # A cursor just past the oldest posts, to compare the deepest page with the first one.
+        oldest = blog_models.Post.query.order_by(blog_models.Post.created_at, blog_models.Post.id) \
+            .offset(app.config['POSTS_PER_PAGE']).first()
+        data['deep_cursor'] = encode_cursor([oldest.created_at, oldest.id]) if oldest else ''
+
+    server = None
+    if ('http' in args.drivers):
+        server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    results = {}
+    for driver in args.drivers:
+        results[driver] = {}
+        for number, name in enumerate(args.scenarios):
+            data['run'] = f'{driver}-{time.time_ns()}'
+            run = (lambda n, s: drive_client(SCENARIOS[name], data, n, args.concurrency, s)) if driver == 'client' else \
+                  (lambda n, s: drive_http(SCENARIOS[name], data, n, args.concurrency, s, server.server_port))
+            if (args.warmup):
+                run(args.warmup, args.seed + 1000 * number + 500)
+            results[driver][name] = run(args.requests, args.seed + 1000 * number)
+
+    if (server):
+        server.shutdown()
+
+    print(f"{'driver':>7} {'scenario':>15} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for driver, scenarios in results.items():
+        for name, r in scenarios.items():
+            print(f"{driver:>7} {name:>15} {r['throughput']:>9.1f} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['errors']:>7}")
+
+    if (args.output):
+        report = {
+            'revision': git_revision(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'parameters': {k: v for k, v in vars(args).items() if k != 'output'},
+            'results': results,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
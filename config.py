@@ -21,4 +21,117 @@ class Configuration (object):
         'sqlite:///' + os.path.join(basedir, 'default.db')
 
     SQLALCHEMY_TRACK_MODIFICATIONS = True
+
+    # Database profile: 'production' applies SQLITE_PRAGMAS to every new SQLite connection, '' keeps the driver defaults.
+    # Deployments opt in through the environment.
+    DATABASE_PROFILE = os.environ.get('DATABASE_PROFILE', '')
+    SQLITE_PRAGMAS = {
+        'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+        'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000)),  # milliseconds
+        'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE', -65536)),  # negative: KiB per connection
+        'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 268435456)),  # bytes
+        'temp_store': os.environ.get('SQLITE_TEMP_STORE', 'MEMORY'),
+    }
+    # Seconds between `PRAGMA optimize` runs in each worker (0 disables, use `flask sqlite optimize`).
+    SQLITE_OPTIMIZE_INTERVAL = float(os.environ.get('SQLITE_OPTIMIZE_INTERVAL', 0))
+
+    # Connection pool of each worker process (0 opens a connection per checkout), checked with a ping before use.
+    # SQLite databases are only pooled under the production DATABASE_PROFILE.
+    DATABASE_POOL_SIZE = int(os.environ.get('DATABASE_POOL_SIZE', 5))
+    DATABASE_MAX_OVERFLOW = int(os.environ.get('DATABASE_MAX_OVERFLOW', 10))
+    DATABASE_POOL_TIMEOUT = float(os.environ.get('DATABASE_POOL_TIMEOUT', 30))
+    DATABASE_POOL_RECYCLE = int(os.environ.get('DATABASE_POOL_RECYCLE', 3600))
+
+    # Database of the ASGI read server (asgi.py), empty for DATABASE_URI on its async driver (sqlite+aiosqlite).
+    ASYNC_DATABASE_URI = os.environ.get('ASYNC_DATABASE_URI', '')
+
+    # Comma separated read replica URIs serving the read-only blog views (empty reads from the primary only),
+    # how often a replica is health checked, and for how many seconds a client reads from the primary after a write.
+    READ_REPLICA_URIS = os.environ.get('READ_REPLICA_URIS', '')
+    READ_REPLICA_CHECK_INTERVAL = float(os.environ.get('READ_REPLICA_CHECK_INTERVAL', 5))
+    READ_YOUR_WRITES_WINDOW = float(os.environ.get('READ_YOUR_WRITES_WINDOW', 5))
+
+    # Request metrics served, unauthenticated, at /metrics (off by default). Set METRICS_DIR to a directory shared by
+    # the workers of a host to report their sum; each worker writes its counts there every METRICS_FLUSH_INTERVAL seconds,
+    # and gunicorn.conf.py clears it when the server starts (see core/utils/metrics.py).
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '').lower() in ('1', 'true', 'yes')
+    METRICS_DIR = os.environ.get('METRICS_DIR', '')
+    METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 1))
+
+    # Record the SQL statements of every request (always on in debug and testing mode): statements repeated
+    # QUERY_REPEAT_THRESHOLD times in one request are logged as possible N+1 queries, and query budgets are checked.
+    QUERY_LOG_ENABLED = os.environ.get('QUERY_LOG_ENABLED', '').lower() in ('1', 'true', 'yes')
+    QUERY_REPEAT_THRESHOLD = int(os.environ.get('QUERY_REPEAT_THRESHOLD', 5))
+
+    # Default and maximum number of rows returned by one page of a paginated listing.
+    POSTS_PER_PAGE = int(os.environ.get('POSTS_PER_PAGE', 10))
+    COMMENTS_PER_PAGE = int(os.environ.get('COMMENTS_PER_PAGE', 25))
+    MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', 100))
+
+    # Post bodies of at least POST_BODY_COMPRESSION_MIN_SIZE bytes are stored zlib compressed (level 0 disables).
+    POST_BODY_COMPRESSION_LEVEL = int(os.environ.get('POST_BODY_COMPRESSION_LEVEL', 6))
+    POST_BODY_COMPRESSION_MIN_SIZE = int(os.environ.get('POST_BODY_COMPRESSION_MIN_SIZE', 512))
+    POST_EXCERPT_LENGTH = int(os.environ.get('POST_EXCERPT_LENGTH', 280))
+
+    # Rows written per statement and per transaction by the bulk import (POST /post/import).
+    IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', 500))
+
+    # Rows fetched per batch by the streaming exports (GET /export/<dataset>, `flask export`).
+    EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 1000))
+
+    # Most operations accepted by one POST /batch request.
+    BATCH_MAX_OPERATIONS = int(os.environ.get('BATCH_MAX_OPERATIONS', 50))
+
+    # Cache-Control sent with the cacheable blog reads (validated with ETag / Last-Modified).
+    BLOG_CACHE_CONTROL = os.environ.get('BLOG_CACHE_CONTROL', 'no-cache')
+
+    # JSON encoding of responses: 'orjson' (default when installed) or 'stdlib', and how datetimes are written,
+    # 'http' (RFC 822, Flask's format) or 'iso' (ISO 8601, encoded natively by orjson).
+    JSON_LIBRARY = os.environ.get('JSON_LIBRARY', '')
+    JSON_DATETIME_FORMAT = os.environ.get('JSON_DATETIME_FORMAT', 'http')
+
+    # Compress JSON and text responses of at least COMPRESSION_MIN_SIZE bytes with the first of COMPRESSION_ENCODINGS
+    # the client accepts ('br' and 'zstd' need the brotli and zstandard packages; '' disables) at COMPRESSION_LEVEL.
+    COMPRESSION_ENCODINGS = os.environ.get('COMPRESSION_ENCODINGS', 'br,zstd,gzip,deflate')
+    COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+    COMPRESSION_LEVEL = int(os.environ.get('COMPRESSION_LEVEL', 6))
+
+    # Cache of rendered blog reads: '' (off), 'memory' (single worker only) or 'sqlite' (shared by the workers on a host).
+    RESPONSE_CACHE_BACKEND = os.environ.get('RESPONSE_CACHE_BACKEND', '')
+    RESPONSE_CACHE_PATH = os.environ.get('RESPONSE_CACHE_PATH') or os.path.join(basedir, 'response-cache.db')
+    RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', 1024))
+
+    # Token bucket rate limits as '<requests>/<second|minute|hour|day>' ('' lifts a limit): authenticated requests per
+    # user and per token, anonymous requests per client IP, and logins per client IP. Buckets are kept per worker
+    # ('memory') or in a SQLite file shared by the workers on a host ('sqlite'), from which a worker leases
+    # RATE_LIMIT_LEASE requests at a time; '' disables rate limiting.
+    RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', '')
+    RATE_LIMIT_PATH = os.environ.get('RATE_LIMIT_PATH') or os.path.join(basedir, 'rate-limit.db')
+    RATE_LIMIT_LEASE = int(os.environ.get('RATE_LIMIT_LEASE', 5))
+    RATE_LIMIT_USER = os.environ.get('RATE_LIMIT_USER', '100/minute')
+    RATE_LIMIT_TOKEN = os.environ.get('RATE_LIMIT_TOKEN', '')
+    RATE_LIMIT_IP = os.environ.get('RATE_LIMIT_IP', '300/minute')
+    RATE_LIMIT_LOGIN = os.environ.get('RATE_LIMIT_LOGIN', '10/minute')
+
+    # Verified authentication tokens kept per worker (0 disables) and for how many seconds.
+    AUTH_CACHE_SIZE = int(os.environ.get('AUTH_CACHE_SIZE', 4096))
+    AUTH_CACHE_TTL = int(os.environ.get('AUTH_CACHE_TTL', 60))
+
+    # Authenticate tokens by signature and expiry alone instead of looking them up in the token table.
+    # Revoked token ids are kept in a per worker denylist refreshed in the background every AUTH_REVOCATION_REFRESH
+    # seconds (0 refreshes it on every check instead).
+    AUTH_STATELESS = os.environ.get('AUTH_STATELESS', '').lower() in ('1', 'true', 'yes')
+    AUTH_REVOCATION_REFRESH = float(os.environ.get('AUTH_REVOCATION_REFRESH', 2))
+    AUTH_REVOCATION_CAPACITY = int(os.environ.get('AUTH_REVOCATION_CAPACITY', 10000))
+
+    # Seconds between background purges of expired tokens in each worker (0 disables, use `flask tokens sweep`).
+    TOKEN_SWEEP_INTERVAL = float(os.environ.get('TOKEN_SWEEP_INTERVAL', 0))
+
+    # Password hashing: werkzeug hash method, processes in the hashing pool per worker (0 hashes inline),
+    # jobs allowed in flight per worker (default 4 per process) and seconds to wait for a slot or a result.
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'sha256')
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 0))
+    PASSWORD_HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE', 0)) or None
+    PASSWORD_HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 5))
     
\ No newline at end of file
@@ -1,34 +1,27 @@
+import os
 
 from flask import Flask
 from flask_cors import CORS
-from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import MetaData
 from flask_migrate import Migrate
 
 from config import Configuration
 
 
-""" 
+"""
     This file contains the initialization of the application.
-    * Construct and configure flask application.
-    * Create database connection and configure the database.
-    * Register modules as flask blueprints.
-    * Import core application views. 
+    * Create the database and migration extensions, bound to no application yet.
+    * create_app() constructs and configures a flask application:
+      registers the extensions, the blueprints, the core application views and the CLI commands.
+    * `core.app` is the application built from Configuration, created on first use.
+
+    Importing core builds nothing, so a server can import it (and create the app) once in a
+    parent process and fork its workers from there (gunicorn --preload). Workers drop the
+    database connections inherited from the parent and open their own.
 """
 
-# Create the flask application instance
-app = Flask(__name__)
-
-CORS(app)
-
-# Register application configuration settings
-app.config.from_object(Configuration)
-
 
-# Create the database connection and register the application
-db = SQLAlchemy(app)
-
-# Create the database connection, register the application, and apply migration naming conventions.
+# Create the database connection and apply migration naming conventions.
 naming_convention = {
     'ix': 'ix_$(column_0_label)s',
     'uq': 'uq_%(table_name)s_%(column_0_name)s',
@@ -37,22 +30,102 @@ naming_convention = {
     'pk': 'pk_%(table_name)s'
 }
 
-# Apply the naming_convention to the database
-db = SQLAlchemy(metadata=MetaData(naming_convention=naming_convention))
+# Apply the naming_convention to the database; sessions route read-only views to the read replicas.
+from .utils.replicas import RoutingSQLAlchemy, read_replicas
+db = RoutingSQLAlchemy(metadata=MetaData(naming_convention=naming_convention))
+
+# Pooled connections must not be shared with forked children.
+if (hasattr(os, 'register_at_fork')):
+    os.register_at_fork(after_in_child=db.dispose_engines)
 
 # Allow database migrations
-migrate = Migrate(app, db, render_as_batch=True)
+migrate = Migrate(render_as_batch=True)
+
+
+# CLI command name -> 'module:attribute', imported when the command is looked up.
+COMMANDS = {
+    'sqlite': 'core.utils.database:sqlite_cli',
+    'tokens': 'core.user_auth.sweeper:tokens_cli',
+    'search': 'core.blog.search:search_cli',
+    'comments': 'core.blog.activity:comments_cli',
+    'export': 'core.export:export_command',
+}
+
+
+def create_app(config=Configuration, **settings):
+    '''
+    Construct the application from a configuration object (or import path), then apply `settings` over it.
+    The extensions are module level singletons, so the most recently created application configures them.
+    '''
+    from .utils import LazyGroup
+
+    # Create the flask application instance
+    app = Flask(__name__)
+    app.cli = LazyGroup(app.name, lazy_commands=COMMANDS)
+
+    CORS(app)
+
+    # Register application configuration settings
+    app.config.from_object(config)
+    app.config.update(settings)
+
+    # Serialize the response envelopes with orjson when it is installed.
+    from .utils import JSONProvider
+    app.json = JSONProvider(app)
+
+    # Tune the pool and the SQLite connections before the engine is first used.
+    from .utils import sqlite_profile
+    sqlite_profile.init_app(app, db)
+    read_replicas.init_app(app, db)
+
+    db.init_app(app)
+    migrate.init_app(app, db)
+
+    # register application blueprints
+    from .user_auth import user_auth as user_auth_blueprint
+    app.register_blueprint(user_auth_blueprint)
+
+    from .user_auth.cache import token_cache
+    token_cache.init_app(app)
+
+    from .user_auth.revocation import revoked_tokens
+    revoked_tokens.init_app(app)
+
+    from .user_auth.hashing import password_hasher
+    password_hasher.init_app(app)
+
+    from .user_auth.sweeper import token_sweeper
+    token_sweeper.init_app(app, app.config['TOKEN_SWEEP_INTERVAL'])
+
+    from .blog import blog as blog_blueprint
+    app.register_blueprint(blog_blueprint)
+
+    from .utils import response_cache
+    response_cache.init_app(app)
+
+    from .utils import compression
+    compression.init_app(app)
 
+    from .utils import metrics
+    metrics.init_app(app)
 
-# register application blueprints
-from .user_auth import user_auth as user_auth_blueprint
-app.register_blueprint(user_auth_blueprint)
+    from .utils import query_recorder
+    query_recorder.init_app(app)
 
-from .blog import blog as blog_blueprint
-app.register_blueprint(blog_blueprint)
+    from .utils import rate_limiter
+    rate_limiter.init_app(app)
 
+    # register the core application views
+    from . import views
+    views.init_app(app)
 
-# import the core application views
-from core import views
+    return app
 
 
+def __getattr__(name):
+    ''' Create the default application the first time `core.app` is looked up (from core import app). '''
+    if (name == 'app'):
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
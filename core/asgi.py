@@ -0,0 +1,222 @@
+import datetime
+from urllib.parse import parse_qsl
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from werkzeug.datastructures import Accept, Headers, MultiDict
+from werkzeug.exceptions import HTTPException
+from werkzeug.http import http_date, parse_accept_header, parse_date, parse_etags
+from werkzeug.routing import Map, RequestRedirect, Rule
+
+from . import utils
+from .blog import reads
+from .utils.compression import compression, variant_etag
+from .utils.requests import _http_date
+
+try:
+    from asgiref.wsgi import WsgiToAsgi
+except ImportError:  # optional, without it only the reads are served
+    WsgiToAsgi = None
+
+
+"""
+_summary_
+
+Asynchronous (ASGI) serving of the blog reads.
+
+`asgi.py` serves GET /post/all, /post/<id>, /post/<post_id>/comments and
+/post/<post_id>/comment/<id> from an event loop, so a slow client or a slow query holds a
+coroutine rather than a whole worker:
+
+    pip install aiosqlite uvicorn
+    uvicorn asgi:app --workers 4
+
+The reads are those of get_posts, get_post, get_comments and get_comment in core.blog.views,
+shared through core.blog.reads: the same queries, parameters, cursors, fieldsets, envelopes
+and ETags, and the same compression, so a client cannot tell which server answered. They query through SQLAlchemy's async
+engine on ASYNC_DATABASE_URI, by default SQLALCHEMY_DATABASE_URI on the aiosqlite driver.
+
+Every other request, the writes included, goes to the WSGI application through asgiref
+when it is installed, and gets a 404 otherwise (route writes to the WSGI server then).
+The response cache, read replicas, rate limits, query budgets and metrics are features of
+the WSGI application and do not apply to the reads served here.
+"""
+
+__all__ = ['async_database_uri', 'AsyncReads']
+
+
+ROUTES = Map([
+    Rule('/post/all', endpoint='get_posts', methods=['GET']),
+    Rule('/post/<id>', endpoint='get_post', methods=['GET']),
+    Rule('/post/<post_id>/comments', endpoint='get_comments', methods=['GET']),
+    Rule('/post/<post_id>/comment/<id>', endpoint='get_comment', methods=['GET']),
+])
+
+
+def async_database_uri(config):
+    ''' Return ASYNC_DATABASE_URI, or SQLALCHEMY_DATABASE_URI with SQLite's driver swapped for aiosqlite. '''
+    if (config.get('ASYNC_DATABASE_URI')):
+        return config['ASYNC_DATABASE_URI']
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    if (url.get_backend_name() == 'sqlite'):
+        url = url.set(drivername='sqlite+aiosqlite')
+    return url
+
+
+def async_engine_options(url, config):
+    ''' Pool the async engine's connections with the DATABASE_POOL_* settings, as the WSGI engine is. '''
+    url = make_url(url)
+    if (url.get_backend_name() == 'sqlite' and (config.get('DATABASE_PROFILE') != 'production' or url.database in (None, '', ':memory:'))):
+        return {}
+    return {
+        'poolclass': AsyncAdaptedQueuePool,
+        'pool_size': config['DATABASE_POOL_SIZE'] or 1,
+        'max_overflow': config['DATABASE_MAX_OVERFLOW'],
+        'pool_timeout': config['DATABASE_POOL_TIMEOUT'],
+        'pool_recycle': config['DATABASE_POOL_RECYCLE'],
+        'pool_pre_ping': True,
+    }
+
+
+class Request(object):
+    ''' The parts of an ASGI http request the handlers read. '''
+
+    def __init__(self, scope):
+        self.method = scope['method']
+        self.path = scope['path']
+        self.args = MultiDict(parse_qsl(scope.get('query_string', b'').decode('latin-1'), keep_blank_values=True))
+        self.headers = Headers([(k.decode('latin-1'), v.decode('latin-1')) for k, v in scope.get('headers', [])])
+
+
+async def run(read, config, session, request, **kwargs):
+    ''' Run one of the reads shared with the WSGI views (see core.blog.reads) on the async session. '''
+    try:
+        statement, finish = read(request.args, config, **kwargs)
+    except ValueError as e:
+        envelope = reads.invalid(e)
+        return reads.Result(lambda: envelope)
+
+    try:
+        return finish((await session.execute(statement)).scalars())
+    except Exception as e:
+        envelope = reads.failed(read, e)
+        if (envelope is None): raise
+        return reads.Result(lambda: envelope)
+
+
+HANDLERS = {
+    'get_posts': reads.posts,
+    'get_post': reads.post,
+    'get_comments': reads.comments,
+    'get_comment': reads.comment,
+}
+
+
+class AsyncReads(object):
+    '''
+    ASGI application serving the blog reads of a Flask application on the async engine,
+    and handing every other request to the Flask application itself.
+    '''
+
+    def __init__(self, app):
+        self.app = app
+        self.config = app.config
+        self.engine = None
+        self.sessions = None
+        self.fallback = WsgiToAsgi(app) if WsgiToAsgi else None
+
+    def start(self):
+        ''' Create the engine. Runs in every worker process, on its event loop. '''
+        url = async_database_uri(self.config)
+        self.engine = create_async_engine(url, **async_engine_options(url, self.config))
+        self.sessions = sessionmaker(self.engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def stop(self):
+        if (self.engine is not None):
+            await self.engine.dispose()
+            self.engine = self.sessions = None
+
+    async def __call__(self, scope, receive, send):
+        if (scope['type'] == 'lifespan'):
+            return await self.lifespan(receive, send)
+        if (scope['type'] != 'http'):
+            raise ValueError(f"unsupported ASGI scope {scope['type']!r}")
+
+        try:
+            endpoint, kwargs = ROUTES.bind('localhost').match(scope['path'], method=scope['method'])
+        except (HTTPException, RequestRedirect):
+            return await self.pass_on(scope, receive, send)
+
+        if (self.engine is None):
+            self.start()
+        request = Request(scope)
+        try:
+            async with self.sessions() as session:
+                result = await run(HANDLERS[endpoint], self.config, session, request, **kwargs)
+        except Exception as e:
+            envelope = {'status': 500, 'msg': 'request failed', 'body': str(e)}
+            result = reads.Result(lambda: envelope)
+        await self.respond(send, request, result)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if (message['type'] == 'lifespan.startup'):
+                self.start()
+                await send({'type': 'lifespan.startup.complete'})
+            elif (message['type'] == 'lifespan.shutdown'):
+                await self.stop()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def pass_on(self, scope, receive, send):
+        if (self.fallback is not None):
+            return await self.fallback(scope, receive, send)
+        body = self.app.json.encode({'status': 404, 'msg': 'not served here', 'body': 'only the blog reads are served over ASGI'})
+        await self._send(send, scope['method'], 404, [('Content-Type', 'application/json')], body)
+
+    async def respond(self, send, request, result):
+        ''' Send the envelope, or a 304 when the request's validators match, compressed as the WSGI app would. '''
+        headers = [('Content-Type', 'application/json')]
+        etag, last_modified = result.etag, result.last_modified
+        if (etag):
+            if (last_modified):
+                headers.append(('Last-Modified', http_date(_http_date(last_modified))))
+            headers.append(('Cache-Control', self.config['BLOG_CACHE_CONTROL']))
+
+        encoding = None
+        if (compression.encodings):
+            headers.append(('Vary', 'Accept-Encoding'))
+            accepted = request.headers.get('Accept-Encoding')
+            encoding = parse_accept_header(accepted, Accept).best_match(compression.encodings) if accepted else None
+
+        if (etag):
+            if_modified_since = parse_date(request.headers.get('If-Modified-Since'))
+            if (if_modified_since and if_modified_since.tzinfo is None):
+                if_modified_since = if_modified_since.replace(tzinfo=datetime.timezone.utc)
+            if_none_match = parse_etags(request.headers.get('If-None-Match'))
+            if (utils.validators_match(if_none_match, if_modified_since, etag, last_modified)):
+                # Answer with the tag of the variant the client holds.
+                if (encoding and if_none_match.contains(variant_etag(etag, encoding))):
+                    etag = variant_etag(etag, encoding)
+                headers = [h for h in headers if h[0] != 'Content-Type']
+                return await self._send(send, request.method, 304, headers + [('ETag', f'"{etag}"')], b'')
+
+        envelope = result.render()
+        body = self.app.json.encode(envelope) + b'\n'
+        if (encoding and len(body) >= compression.min_size):
+            body = compression.compress(body, encoding)
+            headers.append(('Content-Encoding', encoding))
+            etag = etag and variant_etag(etag, encoding)
+        if (etag):
+            headers.append(('ETag', f'"{etag}"'))
+        await self._send(send, request.method, envelope['status'], headers, body)
+
+    @staticmethod
+    async def _send(send, method, status, headers, body):
+        headers = headers + [('Content-Length', str(len(body)))]
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(k.encode('latin-1'), v.encode('latin-1')) for k, v in headers]})
+        await send({'type': 'http.response.body', 'body': b'' if method == 'HEAD' else body})
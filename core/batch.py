@@ -0,0 +1,99 @@
+from flask import current_app, g, request
+from werkzeug.exceptions import HTTPException
+
+from . import db
+from .utils import response_cache
+
+
+"""
+_summary_
+
+Run many API operations in one HTTP request and one database transaction.
+
+Each operation {"method": "PATCH", "path": "/post/1/comment/2/update", "body": {...}} is
+routed through the application's url map to the existing view function, inside a request
+context of its own that carries the batch's Authorization header. The batch authenticates
+once and hands the user to the operations (see user_auth.utils.authenticate).
+
+Operations run in savepoints of a single transaction: the commit a view makes only
+releases its savepoint, and a failed operation (status >= 400) rolls back to it. The
+transaction is committed once at the end, or, in atomic mode, rolled back entirely as soon
+as an operation fails; the remaining operations are then not run. Response cache
+invalidations are held back until the end of the batch.
+"""
+
+__all__ = ['EXCLUDED_ENDPOINTS', 'run_operation', 'run_batch']
+
+
+# Endpoints that manage their own transactions or stream their responses cannot take part in a batch.
+EXCLUDED_ENDPOINTS = {'run_batch', 'export_dataset', 'blog.import_posts', 'static'}
+
+METHODS = {'GET', 'POST', 'PATCH', 'PUT', 'DELETE'}
+
+
+def _envelope(response):
+    data = response.get_json(silent=True)
+    if (isinstance(data, dict) and 'status' in data and 'msg' in data):
+        return {'status': data['status'], 'msg': data['msg'], 'body': data.get('body')}
+    return {'status': response.status_code, 'msg': response.status, 'body': data}
+
+
+def run_operation(operation):
+    ''' Dispatch one operation to its view and return the result as an envelope. '''
+    if (not isinstance(operation, dict)):
+        return {'status': 400, 'msg': 'invalid operation', 'body': 'an operation is an object with a method and a path'}
+    method = str(operation.get('method', 'GET')).upper()
+    path = operation.get('path')
+    if (method not in METHODS or not isinstance(path, str) or not path.startswith('/')):
+        return {'status': 400, 'msg': 'invalid operation', 'body': f"method must be one of {', '.join(sorted(METHODS))} and path must start with /"}
+
+    headers = {'Authorization': request.headers['Authorization']} if 'Authorization' in request.headers else {}
+    with current_app.test_request_context(path, method=method, json=operation.get('body'), headers=headers):
+        try:
+            if (request.url_rule and request.url_rule.endpoint in EXCLUDED_ENDPOINTS):
+                return {'status': 400, 'msg': 'invalid operation', 'body': f'{path} cannot be used in a batch'}
+            response = current_app.make_response(current_app.dispatch_request())
+        except HTTPException as e:
+            return {'status': e.code, 'msg': e.name, 'body': e.description}
+        except Exception as e:
+            return {'status': 500, 'msg': 'operation failed', 'body': str(e)}
+    return _envelope(response)
+
+
+def run_batch(operations, user, token, atomic=False):
+    ''' Run the operations in one transaction and return (committed, results). '''
+    session = db.session()
+    connection = session.connection()
+    if (connection.dialect.name == 'sqlite' and not connection.connection.dbapi_connection.in_transaction):
+        # pysqlite only opens a transaction before a write, so the first SAVEPOINT would open one
+        # instead and releasing it would commit. Open the transaction explicitly.
+        connection.exec_driver_sql('BEGIN')
+
+    results, failed = [], False
+    g.authenticated = (token, user)
+    try:
+        with response_cache.deferred():
+            for operation in operations:
+                if (failed and atomic):
+                    results.append({'status': 424, 'msg': 'operation not run', 'body': 'an earlier operation failed'})
+                    continue
+
+                savepoint = session.begin_nested()
+                result = run_operation(operation)
+                # A view that committed has already released its savepoint.
+                if (session.get_nested_transaction() is savepoint):
+                    if (result['status'] < 400): savepoint.commit()
+                    else: savepoint.rollback()
+                failed = failed or result['status'] >= 400
+                results.append(result)
+
+            if (failed and atomic):
+                session.rollback()
+                return False, results
+            session.commit()
+            return True, results
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        del g.authenticated
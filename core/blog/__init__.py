@@ -4,4 +4,6 @@ blog = Blueprint('blog', __name__)
 
 
 from . import views
-from . import models
\ No newline at end of file
+from . import models
+from . import search
+from . import activity
\ No newline at end of file
@@ -0,0 +1,127 @@
+from collections import defaultdict
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import bindparam, case, event, func, inspect, or_, select
+from sqlalchemy.orm import Session
+
+from .. import db
+from ..utils import response_cache
+
+from . import models
+
+
+"""
+_summary_
+
+Comment counts and last activity of posts.
+
+Post.comment_count and Post.last_comment_at are denormalized from the comment table so
+listings show "N comments" and sort by them (sort=discussed, sort=active) without
+touching the comments. They are kept in step with the ORM from a session after_flush
+hook, inside the same transaction as the comment change itself: a new comment increments
+its post's count, a removed or moved comment has its posts recounted.
+
+Writes that bypass the ORM must set the columns themselves or call recount.
+`flask comments reconcile` repairs any drift.
+"""
+
+
+posts = models.Post.__table__
+comments = models.Comment.__table__
+
+
+def add_comments(connection, added):
+    ''' Count new comments given as {post_id: (count, latest created_at)}. '''
+    if (not added):
+        return
+    latest = bindparam('latest', type_=posts.c.last_comment_at.type)
+    connection.execute(
+        posts.update().where(posts.c.id == bindparam('post_id')).values(
+            comment_count=posts.c.comment_count + bindparam('count'),
+            last_comment_at=case((or_(posts.c.last_comment_at.is_(None), posts.c.last_comment_at < latest), latest),
+                                 else_=posts.c.last_comment_at)),
+        [{'post_id': post_id, 'count': count, 'latest': at} for post_id, (count, at) in added.items()]
+    )
+
+
+def _recount_statement():
+    belongs = comments.c.post_id == posts.c.id
+    count = select(func.count()).where(belongs).scalar_subquery()
+    latest = select(func.max(comments.c.created_at)).where(belongs).scalar_subquery()
+    return posts.update().values(comment_count=count, last_comment_at=latest), count, latest
+
+
+def recount(connection, post_ids=None):
+    ''' Recompute the counts of the given posts (all posts by default) from their comments. '''
+    statement, _, _ = _recount_statement()
+    if (post_ids is not None):
+        if (not post_ids):
+            return
+        statement = statement.where(posts.c.id.in_(list(post_ids)))
+    connection.execute(statement)
+
+
+def _post_id(obj):
+    ''' The post a flushed comment belonged to before the flush. '''
+    history = inspect(obj).attrs.post_id.history
+    return history.deleted[0] if history.deleted else obj.post_id
+
+
+@event.listens_for(Session, 'after_flush')
+def update_counts(session, flush_context):
+    ''' Count flushed comment changes on their posts. '''
+    if (not (session.new or session.dirty or session.deleted)):
+        return
+
+    added, changed = defaultdict(lambda: (0, None)), set()
+    for obj in session.new:
+        if (isinstance(obj, models.Comment) and obj.post_id is not None):
+            count, latest = added[int(obj.post_id)]
+            added[int(obj.post_id)] = (count + 1, max(filter(None, (latest, obj.created_at)), default=None))
+    for obj in session.dirty:
+        if (isinstance(obj, models.Comment) and inspect(obj).attrs.post_id.history.has_changes()):
+            changed.update((_post_id(obj), obj.post_id))
+    for obj in session.deleted:
+        if (isinstance(obj, models.Comment)):
+            changed.add(_post_id(obj))
+    if (not (added or changed)):
+        return
+
+    # Posts deleted in the same flush have no row left to update; a recount covers new comments too.
+    removed = {obj.id for obj in session.deleted if isinstance(obj, models.Post)}
+    changed = {int(post_id) for post_id in changed if post_id is not None} - removed
+    connection = session.connection()
+    add_comments(connection, {post_id: value for post_id, value in added.items() if post_id not in changed})
+    recount(connection, changed)
+
+
+def reconcile(batch_size=1000):
+    '''
+    Recount the posts whose counts drifted from their comments, a primary key range at a time. Return how many.
+    The cached pages of the repaired posts are invalidated.
+    '''
+    statement, count, latest = _recount_statement()
+    drifted = or_(posts.c.comment_count != count, posts.c.last_comment_at.is_distinct_from(latest))
+    last_id = db.session.execute(select(func.max(posts.c.id))).scalar() or 0
+
+    repaired = 0
+    for start in range(0, last_id, batch_size):
+        ids = db.session.execute(select(posts.c.id).where(drifted, posts.c.id > start, posts.c.id <= start + batch_size)).scalars().all()
+        if (ids):
+            db.session.execute(statement.where(posts.c.id.in_(ids)))
+        db.session.commit()
+        if (ids):
+            response_cache.invalidate('posts', *[response_cache.namespace('post', id) for id in ids])
+        repaired += len(ids)
+    return repaired
+
+
+comments_cli = AppGroup('comments', help='Maintain the comment counts of posts.')
+
+
+@comments_cli.command('reconcile')
+@click.option('--batch-size', default=1000, show_default=True, help='Posts recounted per transaction.')
+def reconcile_command(batch_size):
+    ''' Backfill or repair the comment counts and last comment times of posts. '''
+    click.echo(f'repaired {reconcile(batch_size)} posts')
@@ -0,0 +1,159 @@
+import json
+import datetime
+
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from .. import db
+
+from . import models
+from . import search
+
+
+"""
+_summary_
+
+Bulk import of posts and their comments from newline delimited JSON.
+
+Every line holds one post, `created_at` (ISO 8601, defaults to now) and `comments` are optional:
+    {"title": "...", "body": "...", "created_at": "...", "comments": [{"body": "...", "created_at": "..."}]}
+
+Lines are read from the stream one at a time and validated; valid posts are written
+IMPORT_BATCH_SIZE at a time with a single executemany INSERT and one commit per batch,
+so memory is bounded by the batch rather than the upload. Duplicate titles are left to
+the unique constraint: a batch that violates it is rolled back and replayed row by row,
+each row in a savepoint, which pins the error on the offending lines and still writes
+the rest of the batch.
+"""
+
+__all__ = ['parse_row', 'import_posts']
+
+
+def _timestamp(value):
+    if (value is None):
+        return datetime.datetime.now()
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'created_at {value!r} is not an ISO 8601 timestamp')
+
+
+def parse_row(data, user_id, config):
+    ''' Validate a decoded line and return (post row, comment rows, post text). Raise ValueError when invalid. '''
+    if (not isinstance(data, dict)):
+        raise ValueError('expected a JSON object')
+
+    title, text = data.get('title'), data.get('body')
+    max_title = models.Post.title.type.length
+    if (not isinstance(title, str) or not title.strip()):
+        raise ValueError('title is required')
+    if (len(title) > max_title):
+        raise ValueError(f'title is longer than {max_title} characters')
+    if (not isinstance(text, str)):
+        raise ValueError('body is required')
+
+    comments = data.get('comments') or []
+    if (not isinstance(comments, list) or not all(isinstance(c, dict) and isinstance(c.get('body'), str) for c in comments)):
+        raise ValueError('comments must be a list of objects with a body')
+
+    body, encoding = models.encode_body(text, config['POST_BODY_COMPRESSION_LEVEL'], config['POST_BODY_COMPRESSION_MIN_SIZE'])
+    post = {
+        'user_id': user_id,
+        'title': title,
+        'body': body,
+        'body_encoding': encoding,
+        'excerpt': models.make_excerpt(text, config['POST_EXCERPT_LENGTH']),
+        'word_count': len(text.split()),
+        'created_at': _timestamp(data.get('created_at')),
+    }
+    comments = [{'user_id': user_id, 'body': c['body'], 'created_at': _timestamp(c.get('created_at'))} for c in comments]
+    # Core inserts bypass the count hook (core.blog.activity), so the post row carries its counts.
+    post['comment_count'] = len(comments)
+    post['last_comment_at'] = max((c['created_at'] for c in comments), default=None)
+    return post, comments, text
+
+
+def _conflict(error):
+    if ('UNIQUE' in str(error.orig).upper()):
+        return 'post with the same title already exists'
+    return str(error.orig)
+
+
+def _write_batch(batch, report, written_ids):
+    ''' Write a batch of (line, post, comments, text) and commit it. Add the new post ids to written_ids. '''
+    posts = models.Post.__table__
+    try:
+        db.session.execute(posts.insert(), [post for _, post, _, _ in batch])
+        written = batch
+    except IntegrityError:
+        db.session.rollback()
+        connection = db.session.connection()
+        if (connection.dialect.name == 'sqlite' and not connection.connection.dbapi_connection.in_transaction):
+            # pysqlite would open the transaction with the first SAVEPOINT instead, and releasing it would commit
+            # that row alone (see core.batch.run_batch). The batch commits as a whole.
+            connection.exec_driver_sql('BEGIN')
+        written = []
+        for row in batch:
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(posts.insert(), row[1])
+                written.append(row)
+            except IntegrityError as e:
+                report['errors'].append({'line': row[0], 'error': _conflict(e)})
+
+    if (written):
+        # executemany cannot return the new ids, so read them back by their (unique) titles.
+        titles = [post['title'] for _, post, _, _ in written]
+        ids = dict(db.session.execute(select(models.Post.title, models.Post.id).where(models.Post.title.in_(titles))).all())
+
+        comments = [dict(comment, post_id=ids[post['title']]) for _, post, rows, _ in written for comment in rows]
+        if (comments):
+            db.session.execute(models.Comment.__table__.insert(), comments)
+
+        # Core inserts bypass the session, so the search index is fed directly.
+        connection = db.session.connection()
+        if (search.is_supported(connection)):
+            search.index_posts(connection, [(ids[post['title']], post['title'], text) for _, post, _, text in written])
+            if (comments):
+                search.index_comments(connection, db.session.execute(
+                    select(models.Comment.id, models.Comment.post_id, models.Comment.body)
+                    .where(models.Comment.post_id.in_(list(ids.values())))).all())
+
+        report['posts'] += len(written)
+        report['comments'] += len(comments)
+
+    db.session.commit()
+    if (written):
+        written_ids.extend(ids.values())
+
+
+def import_posts(stream, user_id, batch_size=None, written_ids=None):
+    '''
+    Import the posts of an NDJSON byte stream on behalf of user_id.
+    Return a report of the posts and comments written and the errors, by line number.
+    The ids of the committed posts are appended to `written_ids` as the batches go, so they are known even after a failure.
+    '''
+    written_ids = [] if written_ids is None else written_ids
+    config = current_app.config
+    batch_size = batch_size or config['IMPORT_BATCH_SIZE']
+    report = {'posts': 0, 'comments': 0, 'errors': []}
+
+    batch = []
+    for number, line in enumerate(stream, 1):
+        if (not line.strip()):
+            continue
+        try:
+            post, comments, text = parse_row(json.loads(line), user_id, config)
+        except ValueError as e:  # json.JSONDecodeError is a ValueError
+            report['errors'].append({'line': number, 'error': str(e)})
+            continue
+
+        batch.append((number, post, comments, text))
+        if (len(batch) >= batch_size):
+            _write_batch(batch, report, written_ids)
+            batch = []
+
+    if (batch):
+        _write_batch(batch, report, written_ids)
+    return report
@@ -1,30 +1,120 @@
 
+import zlib
 import datetime
 
+from flask import current_app
+
 from .. import db
 
 
+def encode_body(text, level=6, min_size=512):
+    ''' Return (data, encoding) for a post body, compressing it when that is worth it. '''
+    data = bytes(text, 'UTF-8')
+    if (level and len(data) >= min_size):
+        compressed = zlib.compress(data, level)
+        if (len(compressed) < len(data)):
+            return compressed, 'zlib'
+    return data, 'utf-8'
+
+
+def decode_body(data, encoding):
+    if (encoding == 'zlib'):
+        data = zlib.decompress(data)
+    return data.decode('utf-8')
+
+
+def make_excerpt(text, length=280):
+    ''' Return the start of the text cut at a word boundary. '''
+    text = ' '.join(text.split())
+    if (len(text) <= length):
+        return text
+    cut = text[:length].rsplit(' ', 1)[0] or text[:length]
+    return cut + '…'
+
+
 class Post(db.Model):
     __tablename__ = 'post'
+    __table_args__ = (
+        # Serves the keyset pagination of /post/all in both directions.
+        db.Index('ix_post_created_at_id', 'created_at', 'id'),
+        # Serves sort=discussed; sort=active is served by ix_post_last_active_at_id below.
+        db.Index('ix_post_comment_count_created_at_id', 'comment_count', 'created_at', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     title = db.Column(db.String(126), unique=True, nullable=False)
     body = db.Column(db.LargeBinary, nullable=False)
+    # 'utf-8' for raw text or 'zlib' for compressed text, see encode_body.
+    body_encoding = db.Column(db.String(16), nullable=False, default='utf-8', server_default='utf-8')
+    excerpt = db.Column(db.String(300), nullable=False, default='', server_default='')
+    word_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     created_at = db.Column(db.DateTime(), nullable=False)
     updated_at = db.Column(db.DateTime(), nullable=True)
+    # Kept in step with the comments by core.blog.activity, so listings never count comments.
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    last_comment_at = db.Column(db.DateTime(), nullable=True)
+    # When the post was last commented on, or created if it never was.
+    last_active_at = db.column_property(db.func.coalesce(last_comment_at, created_at), deferred=True)
 
     comments = db.relationship('Comment', backref='post', lazy=True, cascade='all, delete-orphan')
 
+    @property
+    def text(self):
+        ''' The decoded body. Only decompressed when it is actually served. '''
+        return decode_body(self.body, self.body_encoding)
+
+    @text.setter
+    def text(self, text):
+        config = current_app.config
+        self.body, self.body_encoding = encode_body(text, config['POST_BODY_COMPRESSION_LEVEL'], config['POST_BODY_COMPRESSION_MIN_SIZE'])
+        self.excerpt = make_excerpt(text, config['POST_EXCERPT_LENGTH'])
+        self.word_count = len(text.split())
+
+    # Serialized field -> columns it is computed from, and the named fieldsets (see core.utils.fieldsets).
+    FIELDS = {
+        'id': ('id',),
+        'title': ('title',),
+        'body': ('body', 'body_encoding'),
+        'excerpt': ('excerpt',),
+        'word_count': ('word_count',),
+        'created_at': ('created_at',),
+        'updated_at': ('updated_at',),
+        'comment_count': ('comment_count',),
+        'last_comment_at': ('last_comment_at',),
+    }
+    VIEWS = {
+        'summary': ('id', 'title', 'excerpt', 'word_count', 'comment_count', 'created_at', 'updated_at', 'last_comment_at'),
+        'full': ('id', 'title', 'body', 'excerpt', 'word_count', 'comment_count', 'created_at', 'updated_at', 'last_comment_at'),
+    }
+    # Columns behind the ETag and Last-Modified of a post, always loaded.
+    VALIDATORS = ('id', 'created_at', 'updated_at', 'comment_count', 'last_comment_at')
+    # Orders of the post listings -> their keyset columns, descending.
+    SORTS = {
+        'new': ('created_at', 'id'),
+        'discussed': ('comment_count', 'created_at', 'id'),
+        'active': ('last_active_at', 'id'),
+    }
+
+    @staticmethod
+    def sort_columns(sort):
+        ''' Return the keyset columns of a listing order. Raise ValueError for unknown orders. '''
+        if (sort not in Post.SORTS):
+            raise ValueError(f"unknown sort {sort}; choose from {', '.join(Post.SORTS)}")
+        return tuple(getattr(Post, column) for column in Post.SORTS[sort])
+
+    @property
+    def modified_at(self):
+        ''' When the post or its comments last changed, the Last-Modified of its representations. '''
+        return max(filter(None, (self.updated_at or self.created_at, self.last_comment_at)))
+
+    def to_dict(self, fields):
+        ''' Serialize only the given fields. '''
+        return {field: self.text if field == 'body' else getattr(self, field) for field in fields}
+
     @property
     def serialize(self):
-        return {
-            'id': self.id, 
-            'title': self.title,
-            'body': self.body.decode("utf-8"),
-            'created_at': self.created_at,
-            'updated_at': self.updated_at
-        }
+        return self.to_dict(Post.VIEWS['full'])
 
     @staticmethod
     def create(data={}):
@@ -34,9 +124,11 @@ class Post(db.Model):
         if ('created_at' not in data):
             data['created_at'] = datetime.datetime.now()
         
-        data['body'] = bytes(data['body'], 'UTF-8')
-
-        try: return Post(**data)
+        try:
+            text = data.pop('body')
+            post = Post(**data)
+            post.text = text
+            return post
         except: return None
 
 
@@ -49,7 +141,7 @@ class Post(db.Model):
             self.updated_at = data['updated_at']
 
         if ('body' in data.keys()):
-            self.body = bytes(data['body'], 'UTF-8')
+            self.text = data['body']
 
         if('title' in data.keys()):
             self.title = data['title']
@@ -57,11 +149,17 @@ class Post(db.Model):
         return self
 
 
+# Serves sort=active; an index on the expression itself, since the ORDER BY is on it.
+db.Index('ix_post_last_active_at_id', Post.last_active_at.expression, Post.id)
 
 
 
 class Comment(db.Model):
     ''' Comment of a post. '''
+    __table_args__ = (
+        # Serves the per post listing (oldest first) and the (post_id, id) lookups.
+        db.Index('ix_comment_post_id_created_at_id', 'post_id', 'created_at', 'id'),
+    )
 
     post_id = db.Column(db.Integer, db.ForeignKey('post.id'))
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
@@ -72,15 +170,29 @@ class Comment(db.Model):
     updated_at = db.Column(db.DateTime(), nullable=True)
 
 
+    FIELDS = {
+        'id': ('id',),
+        'post_id': ('post_id',),
+        'body': ('body',),
+        'created_at': ('created_at',),
+        'updated_at': ('updated_at',),
+    }
+    VIEWS = {
+        'summary': ('id', 'post_id', 'created_at', 'updated_at'),
+        'full': ('id', 'post_id', 'body', 'created_at', 'updated_at'),
+    }
+
+    def to_dict(self, fields):
+        return {field: getattr(self, field) for field in fields}
+
     @property
     def serialize(self):
-        return {
-            'id': self.id,
-            'post_id': self.post_id,
-            'body': self.body,
-            'created_at': self.created_at,
-            'updated_at': self.updated_at
-        }
+        return self.to_dict(Comment.VIEWS['full'])
+
+    @staticmethod
+    def find(post_id, id, *options):
+        ''' Return the comment with the matching post_id and id or None. '''
+        return Comment.query.options(*options).filter_by(post_id=post_id, id=id).first()
 
     @staticmethod
     def create(data):
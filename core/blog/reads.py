@@ -0,0 +1,119 @@
+from collections import namedtuple
+
+from sqlalchemy import select
+
+from .. import utils
+
+from . import models
+
+
+"""
+_summary_
+
+The blog reads served both by the WSGI views (core.blog.views) and the ASGI server (core.asgi).
+
+Each read is planned around its one query, so that either server runs it on its own
+session, synchronously or on the async engine:
+
+    statement, finish = reads.posts(args, config)     # ValueError for invalid parameters
+    result = finish(session.execute(statement).scalars())
+
+The Result carries the response validators and renders the envelope on demand: a request
+answered with a 304 never serializes a row. Results without an etag are not cacheable.
+When the query itself fails, `failed` gives the envelope to answer with.
+"""
+
+__all__ = ['Result', 'invalid', 'failed', 'posts', 'post', 'comments', 'comment']
+
+
+Result = namedtuple('Result', ['render', 'etag', 'last_modified'], defaults=[None, None])
+
+# (status, msg) answering a read whose query failed; the errors of other reads propagate.
+FAILURES = {
+    'post': (404, 'post not found'),
+    'comments': (400, 'problem loading comments'),
+    'comment': (400, 'comment not found'),
+}
+
+
+def invalid(error):
+    ''' The envelope of a request with invalid parameters. '''
+    return {'status': 400, 'msg': 'invalid request parameters', 'body': str(error)}
+
+
+def failed(read, error):
+    ''' The envelope of a read whose query raised `error`, or None if the error should propagate. '''
+    if (read.__name__ not in FAILURES):
+        return None
+    status, msg = FAILURES[read.__name__]
+    return {'status': status, 'msg': msg, 'body': str(error)}
+
+
+def posts(args, config):
+    ''' A page of posts, newest first (or by `sort`), starting at the `cursor`. '''
+    sort = args.get('sort', 'new')
+    columns = models.Post.sort_columns(sort)
+    limit = utils.page_size(args.get('limit'), config['POSTS_PER_PAGE'], config['MAX_PAGE_SIZE'])
+    cursor = args.get('cursor')
+    fields = utils.requested_fields(models.Post, 'summary', args)
+    # Only the requested columns are selected; the summary view is served from the excerpt, never the body.
+    statement = select(models.Post).options(utils.load_fields(models.Post, fields, *columns, *models.Post.VALIDATORS))
+    statement, direction = utils.keyset_query(statement, columns, limit, cursor)
+
+    def finish(rows):
+        page, next_cursor, prev_cursor = utils.keyset_page(rows, columns, limit, cursor, direction)
+        # Validators come from the rows on the page, so a 304 never serializes a post.
+        etag = utils.make_etag('posts', sort, fields, [(p.id, p.modified_at, p.comment_count) for p in page], next_cursor, prev_cursor)
+        last_modified = max((p.modified_at for p in page), default=None)
+        data = lambda: {'posts': [p.to_dict(fields) for p in page], 'next': next_cursor, 'prev': prev_cursor}
+        return Result(lambda: {'status': 200, 'msg': f'{len(page)} posts found', 'body': data()}, etag, last_modified)
+    return statement, finish
+
+
+def post(args, config, id):
+    ''' One post. '''
+    fields = utils.requested_fields(models.Post, 'full', args)
+    statement = select(models.Post).options(utils.load_fields(models.Post, fields, *models.Post.VALIDATORS)) \
+        .filter_by(id=id).limit(1)
+
+    def finish(rows):
+        found = rows.first()
+        if (not found):
+            return Result(lambda: {'status': 404, 'msg': 'post not found', 'body': f'Could not find post with id {id}'})
+        last_modified = found.modified_at
+        etag = utils.make_etag('post', fields, found.id, last_modified, found.comment_count)
+        return Result(lambda: {'status': 200, 'msg': 'post found', 'body': found.to_dict(fields)}, etag, last_modified)
+    return statement, finish
+
+
+def comments(args, config, post_id):
+    ''' A page of the comments of a post, oldest first, after the `after` cursor. '''
+    columns = (models.Comment.created_at, models.Comment.id)
+    limit = utils.page_size(args.get('limit'), config['COMMENTS_PER_PAGE'], config['MAX_PAGE_SIZE'])
+    after = args.get('after')
+    fields = utils.requested_fields(models.Comment, 'full', args)
+    statement = select(models.Comment).options(utils.load_fields(models.Comment, fields, *columns, models.Comment.updated_at)) \
+        .filter_by(post_id=post_id)
+    statement, direction = utils.keyset_query(statement, columns, limit, after, descending=False)
+
+    def finish(rows):
+        page, next_cursor, prev_cursor = utils.keyset_page(rows, columns, limit, after, direction)
+        etag = utils.make_etag('comments', post_id, fields, [(c.id, c.updated_at or c.created_at) for c in page], next_cursor, prev_cursor)
+        last_modified = max((c.updated_at or c.created_at for c in page), default=None)
+        data = lambda: {'comments': [c.to_dict(fields) for c in page], 'next': next_cursor, 'prev': prev_cursor}
+        return Result(lambda: {'status': 200, 'msg': f'{len(page)} comments found', 'body': data()}, etag, last_modified)
+    return statement, finish
+
+
+def comment(args, config, post_id, id):
+    ''' One comment of a post. Not cacheable. '''
+    fields = utils.requested_fields(models.Comment, 'full', args)
+    statement = select(models.Comment).options(utils.load_fields(models.Comment, fields)).filter_by(post_id=post_id, id=id).limit(1)
+
+    def finish(rows):
+        found = rows.first()
+        if (not found):
+            return Result(lambda: {'status': 400, 'msg': 'comment not found',
+                                   'body': f'Could not find comment with (post_id, id) ({post_id}, {id})'})
+        return Result(lambda: {'status': 200, 'msg': 'comment found', 'body': found.to_dict(fields)})
+    return statement, finish
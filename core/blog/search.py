@@ -0,0 +1,191 @@
+import re
+import html
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import DDL, event, inspect, text
+from sqlalchemy.orm import Session
+
+from .. import db
+
+from . import models
+
+
+"""
+_summary_
+
+Full-text search over posts and comments with an SQLite FTS5 index.
+
+The search_index virtual table holds the title and decoded body of every post and the
+body of every comment. Documents share one rowid space: a post is stored at rowid
+2 * id and a comment at 2 * id + 1, so documents are replaced or removed by rowid
+without any lookup.
+
+The index is kept in step with the ORM from a session after_flush hook, inside the same
+transaction as the change itself. Writes that bypass the ORM must call index_posts or
+index_comments themselves. `flask search reindex` rebuilds the index from scratch.
+"""
+
+
+CREATE_INDEX = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_index "
+    "USING fts5(title, body, post_id UNINDEXED, tokenize='porter unicode61')"
+)
+DROP_INDEX = "DROP TABLE IF EXISTS search_index"
+
+# bm25 column weights: a match in the title counts ten times a match in the body.
+RANK = 'bm25(search_index, 10.0, 1.0)'
+
+
+def post_rowid(id):
+    return 2 * id
+
+
+def comment_rowid(id):
+    return 2 * id + 1
+
+
+def is_supported(connection):
+    return connection.dialect.name == 'sqlite'
+
+
+# Create and drop the index along with the tables (db.create_all / db.drop_all).
+event.listen(db.metadata, 'after_create', DDL(CREATE_INDEX).execute_if(dialect='sqlite'))
+event.listen(db.metadata, 'before_drop', DDL(DROP_INDEX).execute_if(dialect='sqlite'))
+
+
+def index_posts(connection, posts):
+    ''' Add or replace the documents of (id, title, text) tuples. '''
+    rows = [{'rowid': post_rowid(id), 'title': title, 'body': text, 'post_id': id} for id, title, text in posts]
+    if (rows):
+        connection.execute(text('INSERT OR REPLACE INTO search_index (rowid, title, body, post_id) '
+                                'VALUES (:rowid, :title, :body, :post_id)'), rows)
+
+
+def index_comments(connection, comments):
+    ''' Add or replace the documents of (id, post_id, body) tuples. '''
+    rows = [{'rowid': comment_rowid(id), 'body': body, 'post_id': post_id} for id, post_id, body in comments]
+    if (rows):
+        connection.execute(text("INSERT OR REPLACE INTO search_index (rowid, title, body, post_id) "
+                                "VALUES (:rowid, '', :body, :post_id)"), rows)
+
+
+def remove(connection, rowids):
+    if (rowids):
+        connection.execute(text('DELETE FROM search_index WHERE rowid = :rowid'), [{'rowid': r} for r in rowids])
+
+
+def _changed(obj, *attributes):
+    state = inspect(obj)
+    return any(state.attrs[a].history.has_changes() for a in attributes)
+
+
+@event.listens_for(Session, 'after_flush')
+def update_index(session, flush_context):
+    ''' Mirror flushed post and comment changes into the index. '''
+    if (not (session.new or session.dirty or session.deleted)):
+        return
+    connection = session.connection()
+    if (not is_supported(connection)):
+        return
+
+    posts, comments, removed = [], [], []
+    for obj in session.new:
+        if (isinstance(obj, models.Post)): posts.append((obj.id, obj.title, obj.text))
+        elif (isinstance(obj, models.Comment)): comments.append((obj.id, obj.post_id, obj.body))
+    for obj in session.dirty:
+        if (isinstance(obj, models.Post) and _changed(obj, 'title', 'body')): posts.append((obj.id, obj.title, obj.text))
+        elif (isinstance(obj, models.Comment) and _changed(obj, 'body', 'post_id')): comments.append((obj.id, obj.post_id, obj.body))
+    for obj in session.deleted:
+        if (isinstance(obj, models.Post)): removed.append(post_rowid(obj.id))
+        elif (isinstance(obj, models.Comment)): removed.append(comment_rowid(obj.id))
+
+    index_posts(connection, posts)
+    index_comments(connection, comments)
+    remove(connection, removed)
+
+
+def match_expression(query):
+    ''' Turn free text into an FTS5 query: every word must match, the last one as a prefix. '''
+    words = re.findall(r'\w+', query)
+    if (not words):
+        return None
+    terms = [f'"{w}"' for w in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+# snippet() wraps matches in these control characters, which stand in for <mark> and </mark> until the text is escaped.
+MARK_START, MARK_END = '\x02', '\x03'
+
+
+def highlight(fragment):
+    ''' HTML escape a snippet and turn its match markers into <mark> elements. '''
+    if (fragment is None):
+        return None
+    return html.escape(fragment, quote=False).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+
+
+def search(query, limit, offset=0):
+    ''' Return up to `limit` ranked hits (best first) for the free text query. '''
+    expression = match_expression(query)
+    if (not expression):
+        return []
+
+    rows = db.session.execute(text(
+        f"SELECT rowid, post_id, "
+        f"snippet(search_index, 0, '{MARK_START}', '{MARK_END}', '…', 12) AS title, "
+        f"snippet(search_index, 1, '{MARK_START}', '{MARK_END}', '…', 24) AS snippet, "
+        f"{RANK} AS score "
+        f"FROM search_index WHERE search_index MATCH :expression "
+        f"ORDER BY score LIMIT :limit OFFSET :offset"
+    ), {'expression': expression, 'limit': limit, 'offset': offset})
+
+    return [{
+        'type': 'comment' if rowid % 2 else 'post',
+        'id': rowid // 2,
+        'post_id': post_id,
+        'title': highlight(title) or None,
+        'snippet': highlight(snippet),
+        'score': -score,
+    } for rowid, post_id, title, snippet, score in rows]
+
+
+def reindex(batch_size=1000):
+    ''' Rebuild the index from the post and comment tables. Return the number of documents indexed. '''
+    connection = db.session.connection()
+    connection.execute(text(DROP_INDEX))
+    connection.execute(text(CREATE_INDEX))
+
+    count = 0
+    query = models.Post.query.options(db.load_only(models.Post.id, models.Post.title, models.Post.body, models.Post.body_encoding))
+    batch = []
+    for post in query.yield_per(batch_size):
+        batch.append((post.id, post.title, post.text))
+        if (len(batch) >= batch_size):
+            index_posts(connection, batch)
+            count, batch = count + len(batch), []
+    index_posts(connection, batch)
+    count += len(batch)
+
+    rows = db.session.query(models.Comment.id, models.Comment.post_id, models.Comment.body).yield_per(batch_size)
+    batch = []
+    for row in rows:
+        batch.append(tuple(row))
+        if (len(batch) >= batch_size):
+            index_comments(connection, batch)
+            count, batch = count + len(batch), []
+    index_comments(connection, batch)
+    count += len(batch)
+
+    db.session.commit()
+    return count
+
+
+search_cli = AppGroup('search', help='Manage the full-text search index.')
+
+
+@search_cli.command('reindex')
+def reindex_command():
+    ''' Rebuild the search index from scratch. '''
+    click.echo(f'indexed {reindex()} documents')
@@ -1,18 +1,51 @@
 import datetime
-from flask import request
+from flask import current_app, request
 
 from core.user_auth.utils import require_admin, require_token
 
 from .. import db
+from .. import utils
+from ..utils import response_cache, read_replicas
 
 from . import blog
 from . import models
+from . import reads
+from . import search
+from . import importer
 
 
+# Query budgets count the view's own statements; token validation is budgeted apart (see
+# utils.query_budget). Writes also update the search index, and comment writes the comment counts of
+# their posts.
 
 
 
+
+
+def _read(read, **kwargs):
+    ''' Run one of the reads shared with the ASGI server (see core.blog.reads), answering with a 304 when the validators match. '''
+    try:
+        statement, finish = read(request.args, current_app.config, **kwargs)
+    except ValueError as e:
+        return reads.invalid(e)
+
+    try:
+        result = finish(db.session.execute(statement).scalars())
+    except Exception as e:
+        envelope = reads.failed(read, e)
+        if (envelope is None): raise
+        return envelope
+
+    if (result.etag is None):
+        return result.render()
+    response = utils.not_modified(result.etag, result.last_modified)
+    if (response): return response
+    return utils.cacheable(result.render(), result.etag, result.last_modified)
+
+
 @blog.route("/post/create", methods=['POST'])
+@utils.http_status
+@utils.query_budget(4)
 @require_admin
 def create_post(admin, token):
     ''' Create a blog post and save to the database. '''
@@ -33,45 +66,62 @@ def create_post(admin, token):
         post = models.Post.create(data)
         db.session.add(post)
         db.session.commit()
+        response_cache.invalidate('posts')
         return {'status': 200, 'msg': 'post created', 'body': post.serialize}
     except Exception as e:
         return {'status': 400, 'msg': 'post not created', 'body': str(e)}
 
 
-@blog.route('/post/all')
-def get_posts():
-    ''' Get all posts. Use pagenativation was database gets large. '''
-    # Implement pagnagation
-    posts = models.Post.query.order_by(models.Post.created_at.desc()).limit(10) #.all()
-
-    # Hide private posts unless requester provides admin authentication token.
-    posts = [post.serialize for post in posts]
-    count = len(posts)
-    data = {'posts': posts}
-    return {'status': 200, 'msg': f'{count} posts found', 'body': data} 
-
-
-@blog.route('/post/<id>', methods=['GET'])
-def get_post(id):
-    ''' retrieve a blog post from the database '''
+@blog.route('/post/import', methods=['POST'])
+@utils.http_status
+@require_admin
+def import_posts(admin, token):
+    '''
+    Bulk import posts (and their comments) from an NDJSON request body, one post per line (see core.blog.importer).
+    Returns the number of posts and comments written and the errors by line number.
+    '''
+    written = []
     try:
-        post = models.Post.query.filter_by(id=id).first()
-
-        if (not post): 
-            raise Exception(f'Could not find post with id {id}')
+        report = importer.import_posts(request.stream, admin.id, written_ids=written)
+    except Exception as e:
+        db.session.rollback()
+        return {'status': 400, 'msg': 'import failed', 'body': str(e)}
+    finally:
+        # Batches are committed as they go, so anything written so far is visible even after a failure.
+        # A new id may already have a cached (empty) comment listing.
+        response_cache.invalidate('posts', *[response_cache.namespace(name, id) for id in written for name in ('post', 'comments')])
 
-        response = post.serialize                    
-        return {'status': 200, 'msg': 'post found', 'body': post.serialize} 
+    return {'status': 200, 'msg': f"{report['posts']} posts imported", 'body': report}
 
-    except Exception as e:
-        return {'status': 404, 'msg': 'post not found', 'body': str(e)} 
 
-  
+@blog.route('/post/all')
+@utils.http_status
+@utils.query_budget(1)
+@response_cache.cached(lambda: ['posts'])
+@read_replicas.read_only
+def get_posts():
+    '''
+    Get a page of posts, newest first.
+    Pass the `next` or `prev` cursor from a previous page as `cursor` to continue, and `limit` to size the page.
+    Choose the serialized fields with `fields=id,title,...` or `view=summary|full` (default summary).
+    Order by `sort=new` (default), `discussed` (most comments first) or `active` (most recently commented first).
+    '''
+    return _read(reads.posts)
 
 
+@blog.route('/post/<id>', methods=['GET'])
+@utils.http_status
+@utils.query_budget(1)
+@response_cache.cached(lambda id: [response_cache.namespace('post', id)])
+@read_replicas.read_only
+def get_post(id):
+    ''' retrieve a blog post from the database, optionally only some `fields` or a `view` (default full) '''
+    return _read(reads.post, id=id)
 
 
 @blog.route('/post/<id>/delete', methods=['DELETE'])
+@utils.http_status
+@utils.query_budget(5)
 @require_admin
 def delete_post(id, admin, token):
     ''' remove a blog post from the database '''
@@ -81,6 +131,7 @@ def delete_post(id, admin, token):
         
         db.session.delete(post)
         db.session.commit()
+        response_cache.invalidate('posts', response_cache.namespace('post', id), response_cache.namespace('comments', id))
         return {'status': 200, 'msg': 'post deleted', 'body': {}}
     except Exception as e:
         return {'status': 400, 'msg': 'post not deleted', 'body': str(e)}
@@ -88,6 +139,8 @@ def delete_post(id, admin, token):
 
 
 @blog.route('/post/<id>/update', methods=['PATCH'])
+@utils.http_status
+@utils.query_budget(3)
 @require_admin
 def update_post(id, admin, token):
 # def update_post(id):
@@ -102,9 +155,12 @@ def update_post(id, admin, token):
         
         post.update(data)
         
-        post = db.session.merge(post)
+        # Serialized before the commit expires the post, which would select it again.
+        db.session.flush()
+        body = post.serialize
         db.session.commit()
-        return {'status': 200, 'msg': 'post updated', 'body': post.serialize}
+        response_cache.invalidate('posts', response_cache.namespace('post', id))
+        return {'status': 200, 'msg': 'post updated', 'body': body}
     except Exception as e:
         return {'status': 400, 'msg': 'post not updated', 'body': str(e)}
 
@@ -116,6 +172,8 @@ def update_post(id, admin, token):
 
 
 @blog.route('/post/<post_id>/comment/create', methods=['POST'])
+@utils.http_status
+@utils.query_budget(5)
 @require_token
 def create_comment(post_id, user, token):
     ''' Create a new comment for a given post '''
@@ -128,37 +186,42 @@ def create_comment(post_id, user, token):
         comment = models.Comment.create(data)
         db.session.add(comment)
         db.session.commit()
+        # The post's comment count changed along with its comments.
+        response_cache.invalidate('posts', response_cache.namespace('post', post_id), response_cache.namespace('comments', post_id))
         return {'status': 200, 'msg':'comment created', 'body': comment.serialize}
     except Exception as e:
         return {'status': 400, 'msg':'comment not created', 'body': str(e)}
 
 
 @blog.route('/post/<post_id>/comment/<id>', methods=['GET'])
+@utils.http_status
+@utils.query_budget(1)
+@read_replicas.read_only
 def get_comment(post_id, id):
-    ''' Retireve the comment with the matching post_id and id '''
-    try:
-        comment = models.Comment.query.filter_by(post_id=post_id, id=id).first()
-        if (not comment): raise Exception(f'Could not find comment with (post_id, id) ({post_id}, {id})')
-        
-        return {'status': 200, 'msg':'comment found', 'body': comment.serialize}
-    except Exception as e:
-        return {'status': 400, 'msg':'comment not found', 'body': str(e)}
+    ''' Retireve the comment with the matching post_id and id, optionally only some `fields` or a `view` '''
+    return _read(reads.comment, post_id=post_id, id=id)
 
 
 @blog.route('/post/<post_id>/comment/<id>/update', methods=['PATCH'])
+@utils.http_status
+@utils.query_budget(5)
 @require_token
 def update_comment(post_id, id, user, token):
     ''' Update the comment with the matching post_id and id '''
     data = request.get_json()
 
     try:
-        comment = models.Comment.query.filter_by(post_id=post_id, id=id).first()
+        comment = models.Comment.find(post_id, id)
         if (not comment): raise Exception(f'Could not find comment with (post_id, id) ({post_id}, {id})')
 
         comment.update(data)
 
         db.session.add(comment)
         db.session.commit()
+        namespaces = {response_cache.namespace('comments', post_id), response_cache.namespace('comments', comment.post_id)}
+        if (str(comment.post_id) != str(post_id)):
+            namespaces.update(('posts', response_cache.namespace('post', post_id), response_cache.namespace('post', comment.post_id)))
+        response_cache.invalidate(*sorted(namespaces))
         return {'status': 200, 'msg':'comment updated', 'body': comment.serialize}
     except Exception as e:
         return {'status': 400, 'msg':'comment not updated', 'body': str(e)}
@@ -166,15 +229,18 @@ def update_comment(post_id, id, user, token):
 
 
 @blog.route('/post/<post_id>/comment/<id>/delete', methods=['DELETE'])
+@utils.http_status
+@utils.query_budget(4)
 @require_token
 def delete_comment(post_id, id, user, token):
     ''' delete the comment with matching post_id and id '''
     try:
-        comment = models.Comment.query.filter_by(post_id=post_id, id=id).first()
+        comment = models.Comment.find(post_id, id)
         if (not comment): raise Exception(f'Could not find comment with (post_id, id) ({post_id}, {id})')
 
         db.session.delete(comment)
         db.session.commit()
+        response_cache.invalidate('posts', response_cache.namespace('post', post_id), response_cache.namespace('comments', post_id))
         return {'status': 200, 'msg':'comment deleted', 'body': {}}
     except Exception as e:
         return {'status': 400, 'msg':'comment not deleted', 'body': str(e)}
@@ -183,15 +249,52 @@ def delete_comment(post_id, id, user, token):
 
 
 @blog.route('/post/<post_id>/comments')
+@utils.http_status
+@utils.query_budget(1)
+@response_cache.cached(lambda post_id: [response_cache.namespace('comments', post_id)])
+@read_replicas.read_only
 def get_comments(post_id):
-    ''' return all the comments realted to a post. '''
-    try:
-        comments = models.Comment.query.filter_by(post_id=post_id).all()
-        return {'status': 200, 'msg':f'{len(comments)} comments found', 'body': [c.serialize for c in comments]}
-    except Exception as e:
-        return {'status': 400, 'msg':'problem loading comments', 'body': str(e)}
-
-
+    '''
+    Return a page of the comments related to a post, oldest first.
+    Pass the `next` cursor from a previous page as `after` to show more, and `limit` to size the page.
+    Choose the serialized fields with `fields=id,body,...` or `view=summary|full` (default full).
+    '''
+    return _read(reads.comments, post_id=post_id)
+
+
+# The search cursor only carries the offset of the next page.
+SEARCH_OFFSET = db.column('offset', db.Integer)
+
+
+@blog.route('/search')
+@utils.http_status
+@utils.query_budget(1)
+@read_replicas.read_only
+def search_blog():
+    '''
+    Full-text search over post titles and bodies and comment bodies, best matches first.
+    `q` is the free text query; pass `next` from a previous page as `cursor` to continue.
+    Titles and snippets are HTML escaped, with the matched words in <mark> elements.
+    '''
+    config = current_app.config
+    query = request.args.get('q', '').strip()
+    if (not query):
+        return {'status': 400, 'msg': 'missing search query', 'body': 'provide the query as q'}
+    if (not search.is_supported(db.session.connection())):
+        return {'status': 501, 'msg': 'search not available', 'body': 'full-text search requires SQLite FTS5'}
 
+    try:
+        limit = utils.page_size(request.args.get('limit'), config['POSTS_PER_PAGE'], config['MAX_PAGE_SIZE'])
+        cursor = request.args.get('cursor')
+        offset = utils.decode_cursor(cursor, (SEARCH_OFFSET,))[0][0] if cursor else 0
+    except ValueError as e:
+        return {'status': 400, 'msg': 'invalid request parameters', 'body': str(e)}
 
+    try:
+        results = search.search(query, limit + 1, offset)
+    except Exception as e:
+        return {'status': 400, 'msg': 'search failed', 'body': str(e)}
 
+    next_cursor = utils.encode_cursor([offset + limit]) if len(results) > limit else None
+    results = results[:limit]
+    return {'status': 200, 'msg': f'{len(results)} results found', 'body': {'results': results, 'next': next_cursor}}
@@ -0,0 +1,130 @@
+import io
+import csv
+import json
+import zlib
+import datetime
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import select
+
+from . import db
+from .blog import models as blog_models
+from .user_auth import models as auth_models
+
+
+"""
+_summary_
+
+Streaming export of posts, comments and users as NDJSON or CSV, optionally gzipped.
+
+Rows are read `yield_per` at a time with stream_results, so neither the ORM nor the
+driver holds more than one batch, and every batch is encoded (and compressed) and handed
+on before the next is read. An export therefore starts sending bytes as soon as the
+first batch is read and runs in constant memory regardless of the size of the tables.
+Passwords are never exported.
+"""
+
+__all__ = ['DATASETS', 'FORMATS', 'export_rows', 'export_stream', 'filename', 'export_command']
+
+
+Post, Comment, User = blog_models.Post, blog_models.Comment, auth_models.User
+
+
+def _post_row(row):
+    data = dict(row._mapping)
+    data['body'] = blog_models.decode_body(data['body'], data.pop('body_encoding'))
+    return data
+
+
+# dataset -> (columns selected, row -> dict), ordered by primary key.
+DATASETS = {
+    'posts': ((Post.id, Post.user_id, Post.title, Post.body, Post.body_encoding, Post.excerpt,
+               Post.word_count, Post.created_at, Post.updated_at), _post_row),
+    'comments': ((Comment.id, Comment.post_id, Comment.user_id, Comment.body, Comment.created_at, Comment.updated_at),
+                 lambda row: dict(row._mapping)),
+    'users': ((User.id, User.public_id, User.email, User.is_admin), lambda row: dict(row._mapping)),
+}
+
+# format -> (mimetype, file extension)
+FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv', 'csv'),
+}
+
+
+def export_rows(dataset, batch_size=1000):
+    ''' Yield lists of at most batch_size row dicts of the dataset. '''
+    columns, to_dict = DATASETS[dataset]
+    statement = select(*columns).order_by(columns[0]).execution_options(stream_results=True, yield_per=batch_size)
+    for rows in db.session.execute(statement).partitions(batch_size):
+        yield [to_dict(row) for row in rows]
+
+
+def _json_default(value):
+    if (isinstance(value, (datetime.datetime, datetime.date))):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def _encode_ndjson(batches):
+    for rows in batches:
+        yield ''.join(json.dumps(row, default=_json_default, ensure_ascii=False) + '\n' for row in rows).encode('utf-8')
+
+
+def _encode_csv(batches, fieldnames):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames, lineterminator='\n')
+    writer.writeheader()
+    for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if (buffer.tell()):
+        yield buffer.getvalue().encode('utf-8')
+
+
+def _gzip(chunks, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 16 + 15 writes a gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if (data):
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(dataset, format='ndjson', gzip=False, batch_size=None):
+    ''' Return a generator of the encoded bytes of the dataset. Raise ValueError for an unknown dataset or format. '''
+    batch_size = batch_size or current_app.config['EXPORT_BATCH_SIZE']
+    if (dataset not in DATASETS):
+        raise ValueError(f"unknown dataset {dataset}; choose from {', '.join(DATASETS)}")
+    if (format not in FORMATS):
+        raise ValueError(f"unknown format {format}; choose from {', '.join(FORMATS)}")
+
+    batches = export_rows(dataset, batch_size)
+    if (format == 'csv'):
+        fieldnames = [key for key in (c.key for c in DATASETS[dataset][0]) if key != 'body_encoding']
+        chunks = _encode_csv(batches, fieldnames)
+    else:
+        chunks = _encode_ndjson(batches)
+    return _gzip(chunks) if gzip else chunks
+
+
+def filename(dataset, format, gzip=False):
+    return f'{dataset}.{FORMATS[format][1]}' + ('.gz' if gzip else '')
+
+
+@click.command('export')
+@click.argument('dataset', type=click.Choice(list(DATASETS)))
+@click.option('--format', 'format', type=click.Choice(list(FORMATS)), default='ndjson', show_default=True)
+@click.option('--gzip', is_flag=True, help='Compress the output with gzip.')
+@click.option('--batch-size', type=int, help='Rows read per query batch (default EXPORT_BATCH_SIZE).')
+@click.option('-o', '--output', default='-', help='File to write (default stdout).')
+@with_appcontext
+def export_command(dataset, format, gzip, batch_size, output):
+    ''' Stream a dataset (posts, comments or users) to a file or stdout. '''
+    with click.open_file(output, 'wb') as out:
+        for chunk in export_stream(dataset, format, gzip, batch_size):
+            out.write(chunk)
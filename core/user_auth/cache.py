@@ -0,0 +1,83 @@
+import time
+import datetime
+import threading
+from collections import OrderedDict
+
+
+"""
+_summary_
+
+In-process cache of verified authentication tokens.
+
+Maps an encoded token to a snapshot of the user it authenticates so a repeated
+request with the same token needs neither a JWT decode nor a database query.
+Entries live until the configured ttl or the token's own expiry, whichever comes
+first, and are evicted explicitly on logout and user deletion. The cache is per
+worker process; hits are still checked against the revocation denylist so a
+token logged out on another worker is dropped once the denylist refreshes.
+"""
+
+
+class TokenCache(object):
+    ''' Bounded LRU of encoded token -> (user snapshot, token id, deadline). '''
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        ''' Size the cache from the application configuration. '''
+        self.maxsize = app.config.get('AUTH_CACHE_SIZE', self.maxsize)
+        self.ttl = app.config.get('AUTH_CACHE_TTL', self.ttl)
+        self.clear()
+
+    def get(self, token):
+        ''' Return (user snapshot, jti) cached for the token or None if absent or stale. '''
+        with self._lock:
+            entry = self._entries.get(token)
+            if (not entry):
+                return None
+            snapshot, jti, deadline = entry
+            if (time.monotonic() >= deadline):
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return snapshot, jti
+
+    def set(self, token, snapshot, expires, jti=None):
+        ''' Cache the snapshot until the ttl elapses or the token expires. '''
+        if (self.maxsize <= 0):
+            return
+        remaining = (expires - datetime.datetime.now()).total_seconds()
+        if (remaining <= 0):
+            return
+        deadline = time.monotonic() + min(self.ttl, remaining)
+
+        with self._lock:
+            self._entries[token] = (snapshot, jti, deadline)
+            self._entries.move_to_end(token)
+            while (len(self._entries) > self.maxsize):
+                self._entries.popitem(last=False)
+
+    def evict(self, token):
+        with self._lock:
+            self._entries.pop(token, None)
+
+    def evict_user(self, user_id):
+        ''' Drop every cached token belonging to the user. '''
+        with self._lock:
+            stale = [token for token, (snapshot, _, _) in self._entries.items() if snapshot['id'] == user_id]
+            for token in stale:
+                del self._entries[token]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+token_cache = TokenCache()
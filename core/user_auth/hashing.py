@@ -0,0 +1,92 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+"""
+_summary_
+
+Password hashing off the request thread.
+
+Hashing and verifying passwords is CPU bound. With PASSWORD_HASH_WORKERS > 0 the work is
+sent to a process pool of that size so a burst of logins cannot occupy every worker thread.
+At most PASSWORD_HASH_QUEUE jobs may be in flight per worker; a request that cannot get a
+slot, or whose job does not finish, within PASSWORD_HASH_TIMEOUT seconds fails with
+HashingBusy (503) instead of queueing forever; a job keeps its slot until it finishes. PASSWORD_HASH_METHOD is passed to werkzeug
+(e.g. 'pbkdf2:sha256:260000') to trade hashing cost for throughput.
+
+The pool is created lazily and per process, so it is never inherited across a fork.
+"""
+
+
+class HashingBusy(Exception):
+    ''' Raised when the hashing pool is saturated or a job times out. '''
+    pass
+
+
+class PasswordHasher(object):
+
+    def __init__(self, workers=0, queue=None, timeout=5, method='sha256'):
+        self.workers = workers
+        self.queue = queue
+        self.timeout = timeout
+        self.method = method
+        self._executor = None
+        self._slots = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.shutdown()
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS', self.workers)
+        self.queue = app.config.get('PASSWORD_HASH_QUEUE', self.queue)
+        self.timeout = app.config.get('PASSWORD_HASH_TIMEOUT', self.timeout)
+        self.method = app.config.get('PASSWORD_HASH_METHOD', self.method)
+
+    def hash(self, password):
+        ''' Return the hash of the password using the configured method. '''
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        ''' Return the results of checking the password to the stored hash. '''
+        return self._run(check_password_hash, pwhash, password)
+
+    def shutdown(self):
+        with self._lock:
+            if (self._executor and self._pid == os.getpid()):
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor, self._slots, self._pid = None, None, None
+
+    def _pool(self):
+        if (self._pid != os.getpid()):
+            with self._lock:
+                if (self._pid != os.getpid()):
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                    self._slots = threading.BoundedSemaphore(self.queue or self.workers * 4)
+                    self._pid = os.getpid()
+        return self._executor, self._slots
+
+    def _run(self, func, *args):
+        if (self.workers <= 0):
+            return func(*args)
+
+        executor, slots = self._pool()
+        if (not slots.acquire(timeout=self.timeout)):
+            raise HashingBusy('password hashing queue is full')
+        try:
+            future = executor.submit(func, *args)
+        except BaseException:
+            slots.release()
+            raise
+        # The slot is held until the job finishes, not until the request stops waiting for it, so jobs
+        # that timed out still count against PASSWORD_HASH_QUEUE.
+        future.add_done_callback(lambda future: slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise HashingBusy('password hashing timed out')
+
+
+password_hasher = PasswordHasher()
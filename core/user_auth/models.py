@@ -4,12 +4,16 @@ import uuid
 
 import datetime
 import jwt
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import current_app
+from sqlalchemy.orm import make_transient_to_detached
 
 from .. import db
 from .. import Configuration
 
 from . import utils
+from .cache import token_cache
+from .revocation import revoked_tokens
+from .hashing import password_hasher
 
 
 now = datetime.datetime.now
@@ -35,10 +39,14 @@ def generate_public_id():
 class Token(db.Model):
     ''' Authentication Token for user sessions. '''
     __tablename__ = 'token'
+    __table_args__ = (
+        db.Index('ix_token_expires_at', 'expires_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
-    token = db.Column(db.String(256), unique=True)
+    token = db.Column(db.String(512), unique=True)
+    expires_at = db.Column(db.DateTime(), nullable=True)
 
     @property
     def serialize(self):
@@ -46,6 +54,7 @@ class Token(db.Model):
             'id': self.id,
             'user_id': self.user_id,
             'token': self.token,
+            'expires_at': self.expires_at,
         }
 
     @staticmethod
@@ -57,12 +66,18 @@ class Token(db.Model):
     def decode_token(encoded_token):
         ''' Decode the token string and return a token object '''
         try:
-            data = jwt.decode(encoded_token, Configuration.SECRET_KEY, 'HS256')
+            data = jwt.decode(encoded_token, current_app.config['SECRET_KEY'], 'HS256')
             data['created'] = datetime.datetime.fromisoformat(data['created'])
             data['expires'] = datetime.datetime.fromisoformat(data['expires'])
             return data
         except: return None
 
+    def revoke(self):
+        ''' Add the token's id to the revocation denylist. The caller removes the row and commits. '''
+        data = Token.decode_token(self.token)
+        if (data and data.get('jti')):
+            revoked_tokens.revoke(data['jti'], data['expires'])
+
     @staticmethod
     def has_expired(encoded_token):
         ''' Return True or False for if the encoded token is valid. '''
@@ -76,6 +91,20 @@ class Token(db.Model):
 
 
 
+class RevokedToken(db.Model):
+    ''' Id (jti claim) of a token revoked before it expired. Only needed until the token expires. '''
+    __tablename__ = 'revoked_token'
+    __table_args__ = (
+        db.Index('ix_revoked_token_expires_at', 'expires_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    jti = db.Column(db.String(64), unique=True, nullable=False)
+    expires_at = db.Column(db.DateTime(), nullable=False)
+    revoked_at = db.Column(db.DateTime(), nullable=False)
+
+
+
 # Redesign user to use a basic autoincrement id.
 # generate a public id for public use
 # generate a private id for private use
@@ -101,21 +130,34 @@ class User(db.Model):
             'password': self.password,
             'is_admin': self.is_admin,
         }
+
+    @property
+    def snapshot(self):
+        ''' Plain column values of the user, safe to keep beyond the session that loaded it. '''
+        return {column.key: getattr(self, column.key) for column in User.__table__.columns}
+
+    @staticmethod
+    def from_snapshot(snapshot):
+        ''' Attach a user rebuilt from a snapshot to the current session without querying the database. '''
+        user = User(**snapshot)
+        make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
     
 
     def verify_password(self, password):
         ''' Return the results of checking the password to the stored hash. '''
-        return check_password_hash(self.password, password)
+        return password_hasher.verify(self.password, password)
 
     def generate_token(self, expires=None):
         ''' Generate an authentication token for the user. '''
 
         created = now()
         if (not expires):
-            expires = created + datetime.timedelta(day=1)
+            expires = created + datetime.timedelta(days=1)
 
         try:
             token = {
+                'jti': uuid.uuid4().hex,
                 'public_id': self.public_id,
                 'created': created.isoformat(),
                 'expires': expires.isoformat(),
@@ -124,28 +166,16 @@ class User(db.Model):
             raise Exception("Failure creating token dictionary")
 
         try:
-            encoded_token = jwt.encode(token, Configuration.SECRET_KEY, 'HS256')
+            encoded_token = jwt.encode(token, current_app.config['SECRET_KEY'], 'HS256')
         except Exception as e:
-            raise Exception(f"Failure encoding token dictionary secret_key is null: {Configuration.SECRET_KEY == None}")
+            raise Exception(f"Failure encoding token dictionary secret_key is null: {current_app.config['SECRET_KEY'] == None}")
 
         try:
-            token = Token(user_id=self.id, token=encoded_token)
+            token = Token(user_id=self.id, token=encoded_token, expires_at=expires)
         except Exception as e:
             raise Exception("Failure creating token object")
 
         return token
-    
-    def remove_expired_tokens(self):
-        ''' Purge any invalid tokens stored in the database for the user '''
-        try:
-            tokens = Token.query.filter_by(user_id=self.id).all()
-            for token in tokens:
-                if (Token.has_expired(token.token)):
-                    db.session.delete(token)
-            db.session.commit()
-            return True
-        except Exception as e:
-            return False
             
             
             
@@ -153,7 +183,7 @@ class User(db.Model):
     def create(email, password):
         ''' Create a new user with a unique public id and has the password. '''
         public_id = generate_public_id()
-        password_hash = generate_password_hash(password, method='sha256')
+        password_hash = password_hasher.hash(password)
         data = {
             'public_id': public_id, 
             'password': password_hash, 
@@ -165,23 +195,43 @@ class User(db.Model):
 
     @staticmethod
     def validate_token(encoded_token):
-        ''' decode the token and return the corresponding user if the token is valid. '''
+        ''' 
+        decode the token and return the corresponding user if the token is valid. 
+        Verified tokens are cached so repeated requests cost no decode and no query.
+        '''
+        cached = token_cache.get(encoded_token)
+        if (cached):
+            snapshot, jti = cached
+            if (jti and revoked_tokens.is_revoked(jti)):
+                token_cache.evict(encoded_token)
+                return None
+            return User.from_snapshot(snapshot)
 
-        if (Token.has_expired(encoded_token)):
+        data = Token.decode_token(encoded_token)
+        if (not data or data['expires'] <= now()):
             # print ("Token has expired") 
             return None
-        if (not Token.exists(encoded_token)): 
-            # print ("Token does not exist") 
+
+        jti = data.get('jti')
+        if (jti and revoked_tokens.is_revoked(jti)):
+            # print ("Token has been revoked") 
             return None
 
-        # token = Token.query.join(Token, User).filter(User.public_id=data['public_id'] and Token.token=encoded_token)
+        if (jti and current_app.config.get('AUTH_STATELESS')):
+            # The signature and expiry are enough, skip the token table entirely.
+            user = User.query.filter_by(public_id=data['public_id']).first()
+        else:
+            # One query confirms the token is stored and loads the user it belongs to.
+            user = User.query.join(Token, Token.user_id == User.id) \
+                .filter(Token.token == encoded_token, User.public_id == data['public_id']) \
+                .first()
 
-        data = Token.decode_token(encoded_token)
+        if (not user):
+            # print ("Token does not exist") 
+            return None
 
-        token = Token.query.filter_by(token=encoded_token).first()
-        
-        # return the user if the token is valid
-        return User.query.filter_by(public_id=data['public_id']).first()
+        token_cache.set(encoded_token, user.snapshot, data['expires'], jti)
+        return user
 
 
 
@@ -0,0 +1,129 @@
+import math
+import hashlib
+import datetime
+import threading
+
+from .. import db
+from ..utils import PeriodicTask
+
+from . import models
+
+
+"""
+_summary_
+
+Revocation denylist for stateless token verification.
+
+In stateless mode a token is authenticated by its signature and `expires` claim
+alone, so logging out cannot simply delete a row that every request looks up.
+Instead the token's `jti` claim is written to the revoked_token table and every
+worker keeps a Bloom filter of the revoked ids in memory:
+
+    * A miss in the filter proves the token was not revoked (the common case, no I/O).
+    * A hit is confirmed against the table, so a false positive costs one query
+      instead of rejecting a valid token.
+
+Each worker loads the filter on first use, then pulls rows added by other workers
+incrementally (by primary key) every AUTH_REVOCATION_REFRESH seconds on a background
+thread, so requests never wait on the refresh. The interval bounds how long a token
+logged out on one worker stays usable on another. An interval of 0 refreshes on every
+check instead.
+"""
+
+
+class BloomFilter(object):
+    ''' Fixed size Bloom filter over strings. '''
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = max(capacity, 1)
+        self.size = int(math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, int(round(self.size / self.capacity * math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RevocationList(object):
+    ''' Per worker view of the revoked_token table. '''
+
+    def __init__(self, capacity=10000, refresh=2):
+        self.capacity = capacity
+        self.refresh_interval = refresh
+        self._filter = None
+        self._last_id = 0
+        self._lock = threading.Lock()
+        self.refresher = PeriodicTask('revocation-refresh', self.refresh, refresh)
+
+    def init_app(self, app):
+        self.capacity = app.config.get('AUTH_REVOCATION_CAPACITY', self.capacity)
+        self.refresh_interval = app.config.get('AUTH_REVOCATION_REFRESH', self.refresh_interval)
+        self.refresher.init_app(app, self.refresh_interval)
+        self.reset()
+
+    def reset(self):
+        ''' Forget everything loaded; the next check reloads from the table. '''
+        with self._lock:
+            self._filter = None
+            self._last_id = 0
+
+    def _load(self):
+        ''' Rebuild the filter from every unexpired revocation. '''
+        RevokedToken = models.RevokedToken
+        rows = RevokedToken.query.with_entities(RevokedToken.id, RevokedToken.jti) \
+            .filter(RevokedToken.expires_at > datetime.datetime.now()).all()
+        self._filter = BloomFilter(max(self.capacity, 2 * len(rows)))
+        self._last_id = 0
+        for id, jti in rows:
+            self._filter.add(jti)
+            self._last_id = max(self._last_id, id)
+
+    def refresh(self):
+        ''' Pull revocations recorded since the last refresh, loading the filter on first use. '''
+        RevokedToken = models.RevokedToken
+
+        with self._lock:
+            if (self._filter is None):
+                self._load()
+            else:
+                rows = RevokedToken.query.with_entities(RevokedToken.id, RevokedToken.jti) \
+                    .filter(RevokedToken.id > self._last_id).order_by(RevokedToken.id).all()
+                for id, jti in rows:
+                    self._filter.add(jti)
+                    self._last_id = id
+
+                # A saturated filter is rebuilt from the table, leaving out revocations of expired tokens.
+                if (self._filter.count > self._filter.capacity):
+                    self._load()
+
+    def is_revoked(self, jti):
+        ''' Return True if the token id has been revoked. '''
+        # Later revocations are pulled by the refresher.
+        if (self._filter is None or self.refresh_interval <= 0):
+            self.refresh()
+        bloom = self._filter
+        if (bloom is not None and jti not in bloom):
+            return False
+        return models.RevokedToken.query.filter_by(jti=jti).first() is not None
+
+    def revoke(self, jti, expires):
+        ''' Record the revocation in the session (committed by the caller) and in this worker's filter. '''
+        db.session.add(models.RevokedToken(jti=jti, expires_at=expires, revoked_at=datetime.datetime.now()))
+        with self._lock:
+            if (self._filter is not None):
+                self._filter.add(jti)
+
+
+revoked_tokens = RevocationList()
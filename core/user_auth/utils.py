@@ -1,8 +1,9 @@
+import time
 import datetime
 from functools import wraps
 
 import jwt
-from flask import request
+from flask import g, request
 
 from .. import utils
 from .. import Configuration
@@ -10,6 +11,22 @@ from .. import Configuration
 from . import models
 
 
+def authenticate(token):
+    '''
+    Return the user of a valid token or None.
+    A batch request authenticates once and hands the user to its operations through g.authenticated.
+    '''
+    authenticated = g.get('authenticated')
+    if (authenticated and authenticated[0] == token):
+        return authenticated[1]
+    started = time.perf_counter()
+    try:
+        with utils.auth_statements():
+            return models.User.validate_token(token)
+    finally:
+        utils.metrics.record_auth(time.perf_counter() - started)
+
+
 def require_token(f):
     ''' 
     Decorator to restrict access allowing only valid authentication tokens and other constraints.
@@ -24,15 +41,20 @@ def require_token(f):
             
         # Validate authentication token.
         token = request.headers.get('Authorization')
-        user = models.User.validate_token(token)
+        user = authenticate(token)
         
         if (not user):
             return {'status': 404, 'msg': "User was not found with provided token.", 'body':{}}
             # raise ValueError('session authentication failed: token is not valid')
         
-        # Implement us
-        # age limits on authenticated session (I.e. limit session/account to 100 requests per minute.)
+        # Rate limit the session per account and per token (RATE_LIMIT_USER / RATE_LIMIT_TOKEN).
+        limited = utils.rate_limiter.check([('user', user.id), ('token', token)])
+        if (limited):
+            return limited
+
         return f(*args, user=user, token=token, **kwargs)
+    # Anonymous routes are limited per IP; tells the rate limiter this one is not.
+    func.requires_token = True
     return func
 
 
@@ -46,16 +68,21 @@ def require_admin(f):
             # raise KeyError('Authentication token missing')
 
         token = request.headers.get('Authorization')
-        user = models.User.validate_token(token)
+        user = authenticate(token)
 
         if (not user):
             return {'status': 404, 'msg': "User was not found with provided token.", 'body':{}}
 
         if (not user.is_admin): return {'status': 401, 'msg': "User is not an admin.", 'body':{}}
 
+        limited = utils.rate_limiter.check([('user', user.id), ('token', token)])
+        if (limited):
+            return limited
+
         kwargs['admin'] = user
         kwargs['token'] = token
         return f(*args, **kwargs)
+    func.requires_token = True
     return func
 
 
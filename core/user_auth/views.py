@@ -2,7 +2,7 @@ import datetime
 from functools import wraps
 
 
-from flask import request
+from flask import current_app, request
 import jwt
 
 
@@ -16,6 +16,8 @@ from .. import db
 from .. import Configuration
 
 from .utils import require_admin, require_token 
+from .cache import token_cache
+from .hashing import HashingBusy
 
 
 
@@ -45,7 +47,7 @@ def create_admin():
     
     # Verify application secret key
     token = request.headers['Authorization']
-    data = jwt.decode(token, Configuration.ADMIN_SECRET_KEY, 'HS256')
+    data = jwt.decode(token, current_app.config['ADMIN_SECRET_KEY'], 'HS256')
     
     try:
         user = models.User.create(data['email'], data['password'])
@@ -54,6 +56,8 @@ def create_admin():
         db.session.add(user)
         db.session.commit()
         return {'status': 200, 'msg': 'created admin', 'body': user.serialize}
+    except HashingBusy as e:
+        return {'status': 503, 'msg': 'create admin failed', 'body': str(e)}, 503
     except Exception as e:
         return {'status': 400, 'msg': 'create admin failed', 'body': str(e)}
 
@@ -67,10 +71,12 @@ def register():
     data = request.get_json()
     
     try:
-        user = models.User.create(data)
+        user = models.User.create(data['email'], data['password'])
         db.session.add(user)
         db.session.commit()
         return {'status': 200, 'msg': 'user registered', 'body': user.serialize}
+    except HashingBusy as e:
+        return {'status': 503, 'msg': 'user not registered', 'body': str(e)}, 503
     except Exception as e: 
         return {'status': 400, 'msg': 'user not registered', 'body': str(e)}    
  
@@ -80,11 +86,12 @@ def register():
 
 
 @user_auth.route('/login', methods=['POST'])
+@utils.rate_limit(ip='RATE_LIMIT_LOGIN')
 def login():
     """ 
     Attempt a user login using the provided email and password. 
     Return an authentication token upon successful login.
-    Upon login remove old invalid tokens
+    Expired tokens are purged by `flask tokens sweep` or the background token sweeper.
     """
     data = request.get_json()
 
@@ -99,10 +106,6 @@ def login():
         if (not user.verify_password(data['password'])):
             return {'status': 400, 'msg': 'login failed: password incorrect', 'body': {}}
 
-
-        try: user.remove_expired_tokens()    
-        except: pass
-
         expires = datetime.datetime.now() + datetime.timedelta(days=1)
         
         try:
@@ -119,6 +122,8 @@ def login():
         response = {'Authorization': token.token, 'user': user.serialize}
         
         return {'status': 200, 'msg': 'login success', 'body': response}
+    except HashingBusy as e:
+        return {'status': 503, 'msg': 'login failed', 'body': str(e)}, 503
     except Exception as e:
         return {'status': 400, 'msg': 'login failed', 'body': str(e)}
 
@@ -139,8 +144,10 @@ def logout():
         return {'status': 400, 'msg': 'failed to remove token on token exists check', 'body': str(e)}
 
     try:
+        token.revoke()
         db.session.delete(token)
         db.session.commit()
+        token_cache.evict(token.token)
         return {'status': 200, 'msg': 'token removed', 'body': {}}
     except Exception as e:
         return {'status': 400, 'msg': 'failed to remove token', 'body': str(e)}
@@ -157,13 +164,17 @@ def delete_user(user, token):
 
         # Replace `user` with the user to delete.
         try:
-            user = models.User.query.filter_by(id=data['user_id'])
+            user = models.User.query.filter_by(id=data['user_id']).first()
+            if (not user): raise Exception(f"Could not find user with id {data['user_id']}")
         except Exception as e:
             return {'status': 400, 'msg': 'user not found', 'body': str(e)}
 
     try:
+        for user_token in user.tokens:
+            user_token.revoke()
         db.session.delete(user)
         db.session.commit()
+        token_cache.evict_user(user.id)
         return {'status': 200, 'msg': 'user deleted', 'body': {}}
     except Exception as e:
         return {'status': 400, 'msg': 'failed to delete user', 'body': str(e)}
@@ -181,6 +192,7 @@ def validate (id, user, token):
 
 
 @user_auth.route('/users/all')
+@utils.query_budget(1)
 @require_admin
 def get_all_users(admin, token):
     # users = [{'email': user.email, 'password': user.password} for user in models.User.query.all()]
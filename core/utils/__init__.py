@@ -7,4 +7,16 @@ Includes a way to standardize application responses.
 """
 
 from .requests import *
+from .pagination import *
+from .fieldsets import *
+from .periodic import *
+from .database import *
+from .replicas import *
+from .metrics import *
+from .queries import *
+from .response_cache import *
+from .ratelimit import *
+from .cli import *
+from .serialization import *
+from .compression import *
 
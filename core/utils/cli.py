@@ -0,0 +1,30 @@
+import importlib
+
+from flask.cli import AppGroup
+
+
+__all__ = ['LazyGroup']
+
+
+class LazyGroup(AppGroup):
+    '''
+    AppGroup whose commands are imported the first time they are looked up.
+    `lazy_commands` maps a command name to 'module:attribute', so serving requests never
+    imports the modules behind the CLI and `flask <command>` imports only the one it runs.
+    '''
+
+    def __init__(self, *args, lazy_commands=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lazy_commands = dict(lazy_commands or {})
+
+    def add_lazy_command(self, name, import_path):
+        self.lazy_commands[name] = import_path
+
+    def list_commands(self, ctx):
+        return sorted(set(super().list_commands(ctx)) | set(self.lazy_commands))
+
+    def get_command(self, ctx, name):
+        if (name in self.lazy_commands and name not in self.commands):
+            module, attribute = self.lazy_commands[name].split(':')
+            self.add_command(getattr(importlib.import_module(module), attribute), name)
+        return super().get_command(ctx, name)
@@ -0,0 +1,142 @@
+import zlib
+import gzip
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # optional, 'br' is not offered without it
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional, 'zstd' is not offered without it
+    zstandard = None
+
+
+"""
+_summary_
+
+Response compression negotiated through Accept-Encoding.
+
+Responses of a compressible type (JSON and text) of at least COMPRESSION_MIN_SIZE bytes
+are compressed with the first of COMPRESSION_ENCODINGS the client accepts with the best
+quality, at COMPRESSION_LEVEL: 'br' and 'zstd' when the brotli and zstandard packages are
+installed, then 'gzip' and 'deflate'. Streamed responses (the exports) are left alone.
+Compressible responses always carry Vary: Accept-Encoding.
+
+A compressed response is a different representation, so its ETag gets the encoding as a
+suffix ("<etag>-gzip"); `not_modified` accepts the suffixed tags as well.
+
+The response cache keeps the compressed variants of a cached body next to it and serves
+them through `encode`, so a hot page is compressed once per encoding rather than on every
+request.
+"""
+
+__all__ = ['Compression', 'compression']
+
+
+def _brotli(data, level):
+    return brotli.compress(data, quality=min(level, 11))
+
+
+def _zstd(data, level):
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+
+def _gzip(data, level):
+    # A fixed mtime keeps the output, and so the cached variants, deterministic.
+    return gzip.compress(data, level, mtime=0)
+
+
+def _deflate(data, level):
+    # HTTP "deflate" is the zlib format.
+    return zlib.compress(data, level)
+
+
+# encoding -> compress(data, level), None when the library is missing.
+CODECS = {
+    'br': _brotli if brotli else None,
+    'zstd': _zstd if zstandard else None,
+    'gzip': _gzip,
+    'deflate': _deflate,
+}
+
+COMPRESSIBLE = ('application/json', 'text/')
+
+
+def variant_etag(etag, encoding):
+    return f'{etag}-{encoding}'
+
+
+class Compression(object):
+
+    def __init__(self):
+        self.encodings = []
+        self.min_size = 1024
+        self.level = 6
+
+    def init_app(self, app):
+        config = app.config
+        names = [name.strip() for name in (config.get('COMPRESSION_ENCODINGS') or '').split(',') if name.strip()]
+        unknown = [name for name in names if name not in CODECS]
+        if (unknown):
+            raise ValueError(f"unknown COMPRESSION_ENCODINGS {', '.join(unknown)}; choose from {', '.join(CODECS)}")
+        self.encodings = [name for name in names if CODECS[name]]
+        self.min_size = config.get('COMPRESSION_MIN_SIZE', self.min_size)
+        self.level = config.get('COMPRESSION_LEVEL', self.level)
+        if (self._after_request not in app.after_request_funcs.get(None, [])):
+            app.after_request(self._after_request)
+
+    def negotiate(self):
+        ''' Return the encoding to use for the current request or None. '''
+        if (not self.encodings or 'Accept-Encoding' not in request.headers):
+            return None
+        return request.accept_encodings.best_match(self.encodings)
+
+    @staticmethod
+    def compressible(response):
+        return (response.mimetype or '').startswith(COMPRESSIBLE)
+
+    def compress(self, data, encoding):
+        return CODECS[encoding](data, self.level)
+
+    def encode(self, response, encoding, data):
+        ''' Make `data`, the compressed body of the response, its content. '''
+        response.set_data(data)
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if (etag):
+            response.set_etag(variant_etag(etag, encoding), weak)
+        return response
+
+    def _after_request(self, response):
+        if (not self.encodings):
+            return response
+        if (response.status_code == 304):
+            return self._not_modified(response)
+        if (not self.compressible(response)):
+            return response
+        response.vary.add('Accept-Encoding')
+
+        encoding = self.negotiate()
+        if (encoding is None or 'Content-Encoding' in response.headers):
+            return response
+        if (response.direct_passthrough or response.is_streamed or response.status_code < 200 or response.status_code == 204):
+            return response
+        data = response.get_data()
+        if (len(data) < self.min_size):
+            return response
+        return self.encode(response, encoding, self.compress(data, encoding))
+
+    def _not_modified(self, response):
+        # Answer with the tag of the variant the client holds.
+        response.vary.add('Accept-Encoding')
+        etag, weak = response.get_etag()
+        encoding = self.negotiate()
+        if (etag and encoding and request.if_none_match.contains(variant_etag(etag, encoding))):
+            response.set_etag(variant_etag(etag, encoding), weak)
+        return response
+
+
+compression = Compression()
@@ -0,0 +1,107 @@
+import sqlite3
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import QueuePool
+
+from .periodic import PeriodicTask
+
+
+"""
+_summary_
+
+Engine and connection tuning for running SQLite under several worker processes.
+
+With DATABASE_PROFILE = 'production' every new SQLite connection gets SQLITE_PRAGMAS:
+WAL lets readers run alongside the single writer instead of blocking behind it,
+synchronous=NORMAL is durable in WAL mode with far fewer fsyncs, and busy_timeout makes a
+second writer wait for the lock rather than fail with "database is locked". Connections
+are pooled (DATABASE_POOL_SIZE), so the pragmas and the page cache are paid for once per
+connection instead of once per request. Without the profile SQLite keeps SQLAlchemy's
+defaults: a connection per checkout, used by the thread that opened it.
+
+`PRAGMA optimize` refreshes the query planner statistics; run it from cron with
+`flask sqlite optimize` or in the background of each worker with SQLITE_OPTIMIZE_INTERVAL.
+"""
+
+__all__ = ['SQLiteProfile', 'sqlite_profile', 'sqlite_cli']
+
+
+def _is_sqlite(dbapi_connection):
+    # The async engine (core.asgi) connects through aiosqlite's adapter, which takes the same pragmas. It is
+    # matched by name so that only the ASGI server imports aiosqlite.
+    return isinstance(dbapi_connection, sqlite3.Connection) or type(dbapi_connection).__name__ == 'AsyncAdapt_aiosqlite_connection'
+
+
+class SQLiteProfile(object):
+
+    def __init__(self):
+        self.pragmas = {}
+        self._app = None
+        self._db = None
+        self._listening = False
+        self.optimizer = PeriodicTask('sqlite-optimize', self.optimize)
+
+    def init_app(self, app, db):
+        ''' Configure the pool and the connection pragmas. Call before the engine is first used. '''
+        config = app.config
+        self._app, self._db = app, db
+        self.pragmas = dict(config['SQLITE_PRAGMAS']) if config.get('DATABASE_PROFILE') == 'production' else {}
+        config['SQLALCHEMY_ENGINE_OPTIONS'] = self.engine_options(config)
+
+        if (not self._listening):
+            event.listen(Engine, 'connect', self.on_connect)
+            self._listening = True
+        self.optimizer.init_app(app, config['SQLITE_OPTIMIZE_INTERVAL'])
+
+    @staticmethod
+    def engine_options(config):
+        ''' Return SQLALCHEMY_ENGINE_OPTIONS with the pool settings added (for SQLite, under the production profile only). '''
+        options = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+        url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+        pool_size = config['DATABASE_POOL_SIZE']
+        if (url.get_backend_name() == 'sqlite'):
+            if (config.get('DATABASE_PROFILE') != 'production' or url.database in (None, '', ':memory:') or not pool_size):
+                # In memory databases keep their single static connection; no pool size means a connection per checkout.
+                return options
+            # SQLAlchemy 1.4 defaults file databases to NullPool; a pooled connection is used by one thread at a time.
+            options.setdefault('poolclass', QueuePool)
+            options['connect_args'] = dict(options.get('connect_args', {}), check_same_thread=False)
+
+        options.setdefault('pool_size', pool_size)
+        options.setdefault('max_overflow', config['DATABASE_MAX_OVERFLOW'])
+        options.setdefault('pool_timeout', config['DATABASE_POOL_TIMEOUT'])
+        options.setdefault('pool_recycle', config['DATABASE_POOL_RECYCLE'])
+        options.setdefault('pool_pre_ping', True)
+        return options
+
+    def on_connect(self, dbapi_connection, connection_record):
+        if (not self.pragmas or not _is_sqlite(dbapi_connection)):
+            return
+        cursor = dbapi_connection.cursor()
+        for name, value in self.pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+    def optimize(self):
+        ''' Run PRAGMA optimize on the application's SQLite database. '''
+        engine = self._db.get_engine(self._app)
+        if (engine.dialect.name != 'sqlite'):
+            return
+        with engine.connect() as connection:
+            connection.exec_driver_sql('PRAGMA optimize')
+
+
+sqlite_profile = SQLiteProfile()
+
+
+sqlite_cli = AppGroup('sqlite', help='Maintain the SQLite database.')
+
+
+@sqlite_cli.command('optimize')
+def optimize_command():
+    ''' Refresh the query planner statistics (PRAGMA optimize). '''
+    sqlite_profile.optimize()
+    click.echo('optimized')
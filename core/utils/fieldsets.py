@@ -0,0 +1,47 @@
+
+from flask import request
+from sqlalchemy.orm import load_only
+
+
+"""
+_summary_
+
+Sparse fieldsets for serialized models.
+
+A model taking part declares:
+    FIELDS - serialized field name -> names of the columns needed to produce it
+    VIEWS  - named fieldsets, e.g. {'summary': (...), 'full': (...)}
+
+Clients choose `?fields=id,title,created_at` or `?view=summary`; `fields` wins when both are
+given. Only the columns behind the chosen fields (plus any the view itself needs, such as
+sort keys and cache validators) are selected.
+"""
+
+__all__ = ['requested_fields', 'load_fields']
+
+
+def requested_fields(model, default_view, args=None):
+    '''
+    Return the tuple of fields requested for the model. Raise ValueError for unknown names.
+    The query arguments default to those of the current request.
+    '''
+    args = request.args if args is None else args
+    fields = args.get('fields')
+    if (fields):
+        fields = tuple(f.strip() for f in fields.split(',') if f.strip())
+        unknown = [f for f in fields if f not in model.FIELDS]
+        if (unknown or not fields):
+            raise ValueError(f"unknown fields {', '.join(unknown)}; choose from {', '.join(model.FIELDS)}")
+        return fields
+
+    view = args.get('view', default_view)
+    if (view not in model.VIEWS):
+        raise ValueError(f"unknown view {view}; choose from {', '.join(model.VIEWS)}")
+    return model.VIEWS[view]
+
+
+def load_fields(model, fields, *always):
+    ''' Return a loader option selecting only the columns behind the fields and the `always` columns (attributes or names). '''
+    columns = {column for field in fields for column in model.FIELDS[field]}
+    columns.update(getattr(column, 'key', column) for column in always)
+    return load_only(*[getattr(model, column) for column in sorted(columns)])
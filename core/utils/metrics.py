@@ -0,0 +1,278 @@
+import os
+import json
+import time
+import uuid
+import atexit
+import threading
+
+try:
+    import fcntl
+except ImportError:  # not on Windows, where worker files are kept rather than archived at exit
+    fcntl = None
+
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+"""
+_summary_
+
+Request metrics in the Prometheus text format, served at /metrics.
+
+For every endpoint the registry counts requests (by method and status), records a
+latency histogram, and sums SQL statements and their time, response bytes and the time
+spent authenticating. Recording a request is a few dict updates under a lock; SQL is
+timed from the engine's cursor events.
+
+Each worker keeps its own registry. With METRICS_DIR set, workers write a snapshot to
+METRICS_DIR/metrics-<pid>-<token>.json at most every METRICS_FLUSH_INTERVAL seconds, and
+/metrics sums the snapshots in the directory. The token keeps a reused PID from
+overwriting the file of an earlier worker.
+
+Lifecycle of the directory:
+    - the gunicorn master clears it before forking the workers (`on_starting` in
+      gunicorn.conf.py calls Metrics.clear), so counters start from zero with the server
+    - a worker exiting normally folds its samples into metrics-archive.json and removes
+      its own file, under a lock that /metrics also takes, so the sums never go backwards
+      across worker restarts
+    - the file of a worker that was killed stays and is summed until the next start
+
+/metrics is only served with METRICS_ENABLED, off by default; it is not authenticated, so
+expose it to the scraper only.
+"""
+
+__all__ = ['Metrics', 'metrics']
+
+ARCHIVE = 'metrics-archive.json'
+LOCK = 'metrics.lock'
+
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# family -> (type, help)
+FAMILIES = {
+    'http_requests_total': ('counter', 'Requests handled, by endpoint, method and status.'),
+    'http_request_duration_seconds': ('histogram', 'Time to handle a request, by endpoint.'),
+    'http_response_bytes_total': ('counter', 'Response body bytes sent (streamed responses excluded), by endpoint.'),
+    'db_statements_total': ('counter', 'SQL statements executed while handling requests, by endpoint.'),
+    'db_statement_duration_seconds_total': ('counter', 'Time spent executing SQL statements, by endpoint.'),
+    'auth_duration_seconds_total': ('counter', 'Time spent authenticating tokens, by endpoint.'),
+}
+
+
+def _family(name):
+    for suffix in ('_bucket', '_sum', '_count'):
+        if (name.endswith(suffix) and name[:-len(suffix)] in FAMILIES):
+            return name[:-len(suffix)]
+    return name
+
+
+def _labels(labels):
+    return ','.join(f'{k}="{v}"' for k, v in labels)
+
+
+def _float(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metrics(object):
+
+    def __init__(self):
+        self.directory = None
+        self.flush_interval = 1.0
+        self._samples = {}  # (name, ((label, value), ...)) -> value
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._token = uuid.uuid4().hex[:8]
+        self._flushed = 0
+
+    def init_app(self, app):
+        config = app.config
+        if (not config.get('METRICS_ENABLED')):
+            return
+        self.directory = config.get('METRICS_DIR') or None
+        self.flush_interval = config['METRICS_FLUSH_INTERVAL']
+        if (self.directory):
+            os.makedirs(self.directory, exist_ok=True)
+            atexit.register(self.retire)
+
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.add_url_rule('/metrics', 'metrics', self.view)
+        if (not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute)):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    def _start(self):
+        # [statements, SQL seconds, auth seconds] of the current request.
+        g.metrics = [0, 0.0, 0.0]
+        g.metrics_started = time.perf_counter()
+
+    def _finish(self, response):
+        started, (statements, sql_time, auth_time) = g.pop('metrics_started', None), g.pop('metrics', (0, 0.0, 0.0))
+        if (started is None):
+            return response
+        endpoint = request.endpoint or 'unmatched'
+        size = 0 if response.is_streamed else (response.content_length or 0)
+        self.observe(endpoint, request.method, response.status_code, time.perf_counter() - started,
+                     statements, sql_time, size, auth_time)
+        return response
+
+    def observe(self, endpoint, method, status, duration, statements=0, sql_time=0.0, size=0, auth_time=0.0):
+        ''' Record one handled request. '''
+        by_endpoint = (('endpoint', endpoint),)
+        with self._lock:
+            self._forked()
+            samples = self._samples
+            key = ('http_requests_total', (('endpoint', endpoint), ('method', method), ('status', str(status))))
+            samples[key] = samples.get(key, 0) + 1
+            for le in BUCKETS:
+                if (duration <= le):
+                    key = ('http_request_duration_seconds_bucket', (('endpoint', endpoint), ('le', repr(le))))
+                    samples[key] = samples.get(key, 0) + 1
+            for name, value in (('http_request_duration_seconds_bucket', 1), ('http_request_duration_seconds_count', 1),
+                                ('http_request_duration_seconds_sum', duration), ('http_response_bytes_total', size),
+                                ('db_statements_total', statements), ('db_statement_duration_seconds_total', sql_time),
+                                ('auth_duration_seconds_total', auth_time)):
+                key = (name, by_endpoint + ((('le', '+Inf'),) if name.endswith('_bucket') else ()))
+                samples[key] = samples.get(key, 0) + value
+
+        if (self.directory and time.monotonic() - self._flushed >= self.flush_interval):
+            self.flush()
+
+    def record_auth(self, seconds):
+        ''' Add time spent authenticating to the current request. '''
+        if (has_app_context() and g.get('metrics')):
+            g.metrics[2] += seconds
+
+    def _forked(self):
+        # A forked worker starts from zero, in its own file, rather than repeating its parent's counts.
+        if (self._pid != os.getpid()):
+            self._samples, self._pid, self._token = {}, os.getpid(), uuid.uuid4().hex[:8]
+
+    def snapshot(self):
+        with self._lock:
+            self._forked()
+            return dict(self._samples)
+
+    @property
+    def path(self):
+        ''' This worker's file in METRICS_DIR. '''
+        self._forked()
+        return os.path.join(self.directory, f'metrics-{self._pid}-{self._token}.json')
+
+    @staticmethod
+    def _write(path, samples):
+        with open(path + '.tmp', 'w') as f:
+            json.dump([[name, labels, value] for (name, labels), value in samples.items()], f)
+        os.replace(path + '.tmp', path)
+
+    @staticmethod
+    def _read(path, samples):
+        ''' Add the samples of a file to `samples`. Unreadable or missing files count as empty. '''
+        try:
+            with open(path) as f:
+                rows = json.load(f)
+        except (OSError, ValueError):
+            return samples
+        for sample, labels, value in rows:
+            key = (sample, tuple(tuple(label) for label in labels))
+            samples[key] = samples.get(key, 0) + value
+        return samples
+
+    def _locked(self, operation):
+        ''' Return an open lock file of METRICS_DIR holding the given flock operation, or None without fcntl. '''
+        if (fcntl is None):
+            return None
+        lock = open(os.path.join(self.directory, LOCK), 'a')
+        fcntl.flock(lock, operation)
+        return lock
+
+    def flush(self):
+        ''' Write this worker's samples to its file in METRICS_DIR. '''
+        if (not self.directory):
+            return
+        self._flushed = time.monotonic()
+        self._write(self.path, self.snapshot())
+
+    def retire(self):
+        ''' At exit: fold this worker's samples into the archive and remove its file, in one step for readers. '''
+        if (not self.directory):
+            return
+        if (fcntl is None):
+            return self.flush()
+        with self._lock:
+            self._forked()
+            samples, self._samples = self._samples, {}
+        lock = self._locked(fcntl.LOCK_EX)
+        try:
+            archive = os.path.join(self.directory, ARCHIVE)
+            merged = self._read(archive, {})
+            for key, value in samples.items():
+                merged[key] = merged.get(key, 0) + value
+            self._write(archive, merged)
+            try: os.remove(self.path)
+            except FileNotFoundError: pass
+        finally:
+            lock.close()
+
+    @staticmethod
+    def clear(directory):
+        ''' Remove the samples of every worker, past and present. Run by the server before it starts its workers. '''
+        if (not os.path.isdir(directory)):
+            return
+        for name in os.listdir(directory):
+            if (name.startswith('metrics-') and name.endswith(('.json', '.tmp'))):
+                os.remove(os.path.join(directory, name))
+
+    def collect(self):
+        ''' Return the samples of every worker summed, or this worker's alone without METRICS_DIR. '''
+        if (not self.directory):
+            return self.snapshot()
+        self.flush()
+        lock = self._locked(fcntl.LOCK_SH) if fcntl else None
+        try:
+            samples = {}
+            for name in os.listdir(self.directory):
+                if (name.startswith('metrics-') and name.endswith('.json')):
+                    self._read(os.path.join(self.directory, name), samples)
+            return samples
+        finally:
+            if (lock): lock.close()
+
+    def render(self, samples):
+        ''' Format samples in the Prometheus text exposition format. '''
+        families = {}
+        for (name, labels), value in samples.items():
+            families.setdefault(_family(name), []).append((name, labels, value))
+
+        lines = []
+        for family in sorted(families):
+            kind, help = FAMILIES.get(family, ('untyped', family))
+            lines.append(f'# HELP {family} {help}')
+            lines.append(f'# TYPE {family} {kind}')
+            order = lambda s: (s[1][:-1] if s[0].endswith('_bucket') else s[1], s[0], float(dict(s[1]).get('le', 0)))
+            for name, labels, value in sorted(families[family], key=order):
+                lines.append(f'{name}{{{_labels(labels)}}} {_float(value)}')
+        return '\n'.join(lines) + '\n'
+
+    def view(self):
+        return current_app.response_class(self.render(self.collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+metrics = Metrics()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if (context is not None):
+        context.metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if (context is None or not has_app_context()):
+        return
+    current = g.get('metrics')
+    if (current):
+        current[0] += 1
+        current[1] += time.perf_counter() - getattr(context, 'metrics_started', time.perf_counter())
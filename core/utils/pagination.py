@@ -0,0 +1,104 @@
+
+import json
+import base64
+import datetime
+
+from sqlalchemy import Column, DateTime, tuple_
+
+
+"""
+_summary_
+
+Keyset (cursor) pagination helpers.
+
+A page is located by the sort key of the row it starts after instead of an OFFSET,
+so every page is a single index range scan no matter how deep the reader goes.
+Cursors are opaque to clients: a url-safe base64 encoding of the key values and
+the direction to continue in ('next' or 'prev').
+"""
+
+__all__ = ['encode_cursor', 'decode_cursor', 'page_size', 'keyset_query', 'keyset_page']
+
+
+def encode_cursor(values, direction='next'):
+    ''' Encode a sort key and a paging direction into an opaque cursor string. '''
+    key = [v.isoformat() if isinstance(v, datetime.datetime) else v for v in values]
+    raw = json.dumps({'k': key, 'd': direction}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, columns):
+    ''' Decode a cursor created by encode_cursor. Raise ValueError if the cursor is malformed. '''
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        key, direction = data['k'], data['d']
+    except Exception:
+        raise ValueError('invalid cursor')
+
+    if (direction not in ('next', 'prev') or len(key) != len(columns)):
+        raise ValueError('invalid cursor')
+
+    values = []
+    for column, value in zip(columns, key):
+        if (isinstance(column.type, DateTime)):
+            try: value = datetime.datetime.fromisoformat(value)
+            except Exception: raise ValueError('invalid cursor')
+        values.append(value)
+    return values, direction
+
+
+def page_size(limit, default, maximum):
+    ''' Return the requested page size clamped to [1, maximum], or the default if none was given. '''
+    if (limit is None or limit == ''):
+        return default
+    try: limit = int(limit)
+    except (TypeError, ValueError): raise ValueError('limit must be an integer')
+    return max(1, min(limit, maximum))
+
+
+def keyset_query(query, columns, limit, cursor=None, descending=True):
+    '''
+    Restrict and order a Query (or Select) to one page of rows after the cursor.
+
+    One extra row is requested so keyset_page can tell whether another page exists.
+    The returned direction must be handed to keyset_page along with the fetched rows.
+    '''
+    direction = 'next'
+    if (cursor):
+        values, direction = decode_cursor(cursor, columns)
+        # Walking backwards flips both the comparison and the sort order.
+        forward = descending if (direction == 'next') else not descending
+        key = tuple_(*columns)
+        query = query.filter(key < tuple_(*values) if forward else key > tuple_(*values))
+        if (not isinstance(getattr(columns[0], 'expression', columns[0]), Column)):
+            # SQLite only seeks an index on an expression with a bound on the expression itself, not a row value.
+            query = query.filter(columns[0] <= values[0] if forward else columns[0] >= values[0])
+
+    ascending = (direction == 'prev') if descending else (direction == 'next')
+    order = [c.asc() if ascending else c.desc() for c in columns]
+    return query.order_by(*order).limit(limit + 1), direction
+
+
+def keyset_page(rows, columns, limit, cursor=None, direction='next'):
+    ''' Return (rows, next_cursor, prev_cursor) for the rows fetched by keyset_query. '''
+    rows = list(rows)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    if (direction == 'prev'):
+        rows.reverse()
+
+    def key(row):
+        return [getattr(row, c.key) for c in columns]
+
+    next_cursor, prev_cursor = None, None
+    if (rows):
+        if (direction == 'next'):
+            next_cursor = encode_cursor(key(rows[-1]), 'next') if has_more else None
+            prev_cursor = encode_cursor(key(rows[0]), 'prev') if cursor else None
+        else:
+            next_cursor = encode_cursor(key(rows[-1]), 'next')
+            prev_cursor = encode_cursor(key(rows[0]), 'prev') if has_more else None
+
+    return rows, next_cursor, prev_cursor
@@ -0,0 +1,66 @@
+import os
+import logging
+import threading
+
+
+"""
+_summary_
+
+Run a maintenance function every few seconds on a daemon thread inside an application context.
+
+Threads do not survive fork, so a task started in a gunicorn master (preload_app) would
+silently never run in the workers. `ensure_running` is therefore meant to be called from
+a request hook: it is a cheap no-op once the thread runs in the current process and
+starts a fresh thread after a fork.
+"""
+
+__all__ = ['PeriodicTask']
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicTask(object):
+
+    def __init__(self, name, func, interval=0):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self._app = None
+        self._pid = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def init_app(self, app, interval):
+        ''' Configure the task for the application. An interval of 0 disables it. '''
+        self._app = app
+        self.interval = interval
+        if (interval > 0):
+            app.before_request(self.ensure_running)
+
+    def ensure_running(self):
+        if (self._pid == os.getpid() or self.interval <= 0):
+            return
+        with self._lock:
+            if (self._pid == os.getpid()):
+                return
+            self._stop = threading.Event()
+            thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            thread.start()
+            self._thread, self._pid = thread, os.getpid()
+
+    def stop(self, timeout=None):
+        ''' Stop the task and wait for its thread in this process to finish. '''
+        self._stop.set()
+        thread, self._thread, self._pid = self._thread, None, None
+        if (thread is not None and thread.ident is not None and thread is not threading.current_thread()):
+            thread.join(timeout)
+
+    def _run(self):
+        stop = self._stop
+        while (not stop.wait(self.interval)):
+            try:
+                with self._app.app_context():
+                    self.func()
+            except Exception:
+                logger.exception('periodic task %s failed', self.name)
@@ -0,0 +1,148 @@
+import re
+import logging
+from functools import wraps
+from contextlib import contextmanager
+from collections import Counter
+
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+"""
+_summary_
+
+Per request record of SQL statements, N+1 detection and query budgets.
+
+The recorder is on in debug and testing mode (or with QUERY_LOG_ENABLED). It keeps the
+statements executed while handling a request; statements executed at least
+QUERY_REPEAT_THRESHOLD times in one request, typically a lazy load inside a loop, are
+logged as N+1 warnings when the request ends.
+
+Views declare how many statements they may run with `@query_budget(n)`, placed above the
+auth decorators. Token validation, which runs inside `auth_statements()`, is budgeted apart
+from the view's own statements: at most `auth` statements (AUTH_BUDGET by default), the
+lookups of a token that is not cached yet. A view going over either budget logs a warning,
+and raises QueryBudgetExceeded in testing so that the regression fails the suite.
+"""
+
+__all__ = ['QueryBudgetExceeded', 'query_budget', 'auth_statements', 'count_queries', 'query_recorder']
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def _shape(statement):
+    ''' Collapse the statement to its shape: IN lists of any length look the same. '''
+    return re.sub(r'\((?:\?|%\(\w+\)s|:\w+)(?:, ?(?:\?|%\(\w+\)s|:\w+))*\)', '(...)', ' '.join(statement.split()))
+
+
+class QueryRecorder(object):
+
+    def __init__(self):
+        self._installed = False
+
+    def init_app(self, app):
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        if (not self._installed):
+            event.listen(Engine, 'before_cursor_execute', _record)
+            self._installed = True
+
+    @staticmethod
+    def enabled(app):
+        return app.debug or app.testing or app.config.get('QUERY_LOG_ENABLED')
+
+    def _start(self):
+        if (self.enabled(current_app)):
+            g.query_log = []
+
+    def _finish(self, response):
+        statements = g.pop('query_log', None)
+        if (not statements):
+            return response
+        threshold = current_app.config['QUERY_REPEAT_THRESHOLD']
+        for shape, count in Counter(map(_shape, statements)).most_common():
+            if (count < threshold):
+                break
+            logger.warning('possible N+1 in %s %s: %d x %s', request.method, request.path, count, shape)
+        return response
+
+
+query_recorder = QueryRecorder()
+
+
+# Transaction control is not counted as queries.
+TRANSACTION_CONTROL = ('BEGIN', 'SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+
+def _record(conn, cursor, statement, parameters, context, executemany):
+    if (statement.startswith(TRANSACTION_CONTROL)):
+        return
+    # Housekeeping statements (e.g. replica health checks) opt out with the query_log=False execution option.
+    if (has_app_context() and (context is None or context.execution_options.get('query_log', True))):
+        log = g.get('query_log')
+        if (log is not None):
+            log.append(statement)
+
+
+# Statements token validation may run: loading the denylist on a worker's first check and the token lookup.
+AUTH_BUDGET = 2
+
+
+@contextmanager
+def auth_statements():
+    ''' Count the statements run in the block as token validation, budgeted apart from the view's (see query_budget). '''
+    log = g.get('query_log') if has_app_context() else None
+    if (log is None):
+        yield
+        return
+    start = len(log)
+    try:
+        yield
+    finally:
+        g.auth_statements = g.get('auth_statements', 0) + len(log) - start
+
+
+def query_budget(budget, auth=AUTH_BUDGET):
+    ''' Decorator declaring the most SQL statements a view, and its token validation, may run. Checked while the recorder is on. '''
+    def decorator(f):
+        @wraps(f)
+        def func(*args, **kwargs):
+            log = g.get('query_log')
+            if (log is None):
+                return f(*args, **kwargs)
+            start, auth_start = len(log), g.get('auth_statements', 0)
+            rv = f(*args, **kwargs)
+            used, auth_used = log[start:], g.get('auth_statements', 0) - auth_start
+            if (len(used) - auth_used > budget or auth_used > auth):
+                message = (f'{f.__name__} ran {len(used) - auth_used} SQL statements and {auth_used} for token validation, '
+                           f'its budget is {budget} and {auth}:\n' + '\n'.join(map(_shape, used)))
+                if (current_app.testing):
+                    raise QueryBudgetExceeded(message)
+                logger.warning(message)
+            return rv
+        func.query_budget = (budget, auth)
+        return func
+    return decorator
+
+
+@contextmanager
+def count_queries(engine=None):
+    '''
+    Count the SQL statements executed while the block runs, e.g. in tests:
+        with count_queries() as queries: ...
+        assert len(queries) == 1
+    Yields the list of statements; with no engine, every engine is watched.
+    '''
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    target = engine if engine is not None else Engine
+    event.listen(target, 'before_cursor_execute', listener)
+    try:
+        yield statements
+    finally:
+        event.remove(target, 'before_cursor_execute', listener)
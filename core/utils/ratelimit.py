@@ -0,0 +1,259 @@
+import os
+import re
+import math
+import time
+import sqlite3
+import threading
+from functools import lru_cache
+from collections import OrderedDict, namedtuple
+
+from flask import current_app, g, make_response, request
+
+
+"""
+_summary_
+
+Token bucket rate limits.
+
+A limit such as '100/minute' is a bucket holding up to 100 requests that refills
+continuously at 100 per minute, so a client may burst up to the limit and then proceeds
+at the refill rate. Authenticated requests draw from a bucket per user and a bucket per
+token (checked by require_token and require_admin once the token is verified); requests
+to anonymous routes draw from a bucket per client IP. The default limits apply across all
+routes; a view decorated with `rate_limit` gets buckets of its own instead.
+
+Backends (RATE_LIMIT_BACKEND):
+    ''       - disabled
+    'memory' - buckets per process, so each worker enforces the limits on its own
+    'sqlite' - buckets in a SQLite file (RATE_LIMIT_PATH) shared by every worker on the host
+
+With the shared backend a worker takes up to RATE_LIMIT_LEASE requests out of a bucket in
+one transaction and hands them out from memory, so most requests never touch the file.
+Leased requests a worker has not used within LEASE_TTL seconds are dropped rather than
+returned, which can only make a limit stricter, never looser.
+
+Responses carry RateLimit-Limit, RateLimit-Remaining and RateLimit-Reset (seconds until
+the bucket is full again); limited requests get a 429 with Retry-After.
+"""
+
+__all__ = ['Limit', 'parse_limit', 'MemoryBuckets', 'SQLiteBuckets', 'RateLimiter', 'rate_limiter', 'rate_limit']
+
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+# Seconds a worker may hold on to requests leased from the shared store.
+LEASE_TTL = 1.0
+
+
+Limit = namedtuple('Limit', ['count', 'period'])
+
+# Outcome of drawing one request from a bucket.
+State = namedtuple('State', ['allowed', 'limit', 'remaining', 'reset', 'retry_after'])
+
+
+@lru_cache(maxsize=64)
+def parse_limit(value):
+    ''' Parse '<count>/[<n>]<second|minute|hour|day>' (e.g. '100/minute', '10/5second') into a Limit; '' gives None. '''
+    if (not value):
+        return None
+    match = re.fullmatch(r'\s*(\d+)\s*/\s*(\d*)\s*(second|minute|hour|day)s?\s*', value)
+    if (not match or int(match.group(1)) < 1):
+        raise ValueError(f'invalid rate limit {value!r}, expected e.g. 100/minute')
+    count, multiple, unit = match.groups()
+    return Limit(int(count), int(multiple or 1) * PERIODS[unit])
+
+
+class MemoryBuckets(object):
+    ''' Buckets of a single process, least recently used first out when there are more than maxsize. '''
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()  # key -> (tokens, updated)
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate, count, now):
+        ''' Take up to `count` whole requests from the bucket. Return (taken, tokens left). '''
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            taken = min(count, int(tokens))
+            self._buckets[key] = (tokens - taken, now)
+            while (len(self._buckets) > self.maxsize):
+                self._buckets.popitem(last=False)
+            return taken, tokens - taken
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class SQLiteBuckets(object):
+    ''' Buckets in a SQLite file shared by the worker processes on a host. '''
+
+    TRIM_EVERY = 256
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._takes = 0
+
+    def _connection(self):
+        # sqlite3 connections cannot cross threads or forks, so keep one per thread and process.
+        connection = getattr(self._local, 'connection', None)
+        if (connection is None or self._local.pid != os.getpid()):
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=OFF')
+            connection.execute('CREATE TABLE IF NOT EXISTS bucket (key TEXT PRIMARY KEY, tokens REAL NOT NULL, '
+                               'updated REAL NOT NULL, full_at REAL NOT NULL)')
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return connection
+
+    def take(self, key, capacity, rate, count, now):
+        ''' Take up to `count` whole requests from the bucket. Return (taken, tokens left). '''
+        connection = self._connection()
+        # BEGIN IMMEDIATE takes the write lock up front, so two workers cannot both read the same balance.
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute('SELECT tokens, updated FROM bucket WHERE key = ?', (key,)).fetchone()
+            tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * rate)
+            taken = min(count, int(tokens))
+            left = tokens - taken
+            connection.execute('INSERT OR REPLACE INTO bucket (key, tokens, updated, full_at) VALUES (?, ?, ?, ?)',
+                               (key, left, now, now + (capacity - left) / rate))
+
+            # A bucket that has refilled is the same as no bucket; drop those now and then.
+            self._takes += 1
+            if (self._takes % self.TRIM_EVERY == 0):
+                connection.execute('DELETE FROM bucket WHERE full_at < ?', (now,))
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return taken, left
+
+    def clear(self):
+        self._connection().execute('DELETE FROM bucket')
+
+
+class RateLimiter(object):
+
+    def __init__(self, store=None):
+        self.store = store
+        self.limits = {}
+        self.lease = 1
+        self._leases = {}  # key -> [requests, expires, requests left in the store when leased]
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        config = app.config
+        kind = config.get('RATE_LIMIT_BACKEND')
+        if (kind == 'memory'):
+            self.store, self.lease = MemoryBuckets(), 1
+        elif (kind == 'sqlite'):
+            self.store, self.lease = SQLiteBuckets(config['RATE_LIMIT_PATH']), max(1, config.get('RATE_LIMIT_LEASE', 1))
+        elif (kind):
+            raise ValueError(f'unknown RATE_LIMIT_BACKEND {kind!r}')
+        else:
+            self.store = None
+        self.limits = {scope: parse_limit(config.get(f'RATE_LIMIT_{scope.upper()}')) for scope in ('user', 'token', 'ip')}
+        self._leases.clear()
+
+        if (self._limit_anonymous not in app.before_request_funcs.get(None, [])):
+            app.before_request(self._limit_anonymous)
+            app.after_request(self._headers)
+
+    def clear(self):
+        with self._lock:
+            self._leases.clear()
+        if (self.store is not None):
+            self.store.clear()
+
+    def hit(self, key, limit, now=None):
+        ''' Draw one request from the bucket `key` holding `limit`. Return its State. '''
+        now = time.time() if now is None else now
+        rate = limit.count / limit.period
+
+        with self._lock:
+            lease = self._leases.get(key)
+            if (lease and lease[0] > 0 and lease[1] > now):
+                lease[0] -= 1
+                remaining = lease[0] + lease[2]
+                return State(True, limit.count, remaining, math.ceil((limit.count - remaining) / rate), 0)
+
+        taken, left = self.store.take(key, limit.count, rate, min(self.lease, limit.count), now)
+        if (not taken):
+            retry_after = max(1, math.ceil((1 - left) / rate))
+            return State(False, limit.count, 0, math.ceil((limit.count - left) / rate), retry_after)
+
+        spare, left = taken - 1, int(left)
+        with self._lock:
+            if (spare):
+                self._leases[key] = [spare, now + LEASE_TTL, left]
+            else:
+                self._leases.pop(key, None)
+        remaining = left + spare
+        return State(True, limit.count, remaining, math.ceil((limit.count - remaining) / rate), 0)
+
+    def check(self, identities):
+        '''
+        Draw a request from the bucket of every (scope, identity) pair, e.g. [('user', 5), ('token', '...')].
+        Return the 429 response if one of them is empty, otherwise None.
+        '''
+        if (self.store is None):
+            return None
+        view = current_app.view_functions.get(request.endpoint)
+        limits = getattr(view, 'rate_limits', None)
+        route = request.endpoint if limits is not None else '*'
+        limits = self.limits if limits is None else limits
+
+        tightest = None
+        for scope, identity in identities:
+            limit = limits.get(scope)
+            if (isinstance(limit, str)):
+                limit = parse_limit(current_app.config.get(limit, limit))
+            if (limit is None):
+                continue
+            state = self.hit(f'{scope}:{route}:{identity}', limit)
+            if (tightest is None or state.remaining < tightest.remaining or not state.allowed):
+                tightest = state
+            if (not state.allowed):
+                break
+
+        g.rate_limit = tightest
+        if (tightest is None or tightest.allowed):
+            return None
+        envelope = {'status': 429, 'msg': f'Too many requests, retry in {tightest.retry_after} seconds.', 'body': {}}
+        response = make_response(envelope, 429)
+        response.headers['Retry-After'] = str(tightest.retry_after)
+        return response
+
+    def _limit_anonymous(self):
+        view = current_app.view_functions.get(request.endpoint)
+        if (view is None or getattr(view, 'requires_token', False)):
+            return None
+        return self.check([('ip', request.remote_addr)])
+
+    def _headers(self, response):
+        state = g.pop('rate_limit', None)
+        if (state is not None):
+            response.headers['RateLimit-Limit'] = str(state.limit)
+            response.headers['RateLimit-Remaining'] = str(state.remaining)
+            response.headers['RateLimit-Reset'] = str(state.reset)
+        return response
+
+
+rate_limiter = RateLimiter()
+
+
+def rate_limit(user=None, token=None, ip=None):
+    '''
+    Decorator giving a view its own buckets in place of the default limits, e.g. rate_limit(user='10/minute').
+    A value may also name the config setting holding the limit, e.g. rate_limit(ip='RATE_LIMIT_LOGIN').
+    Scopes left out are not limited on that view.
+    '''
+    limits = {'user': user, 'token': token, 'ip': ip}
+    def decorator(f):
+        f.rate_limits = limits
+        return f
+    return decorator
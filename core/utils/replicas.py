@@ -0,0 +1,204 @@
+import time
+import logging
+import weakref
+import threading
+import itertools
+from functools import wraps
+from collections import OrderedDict
+
+from flask import g, has_request_context, request
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import event
+from sqlalchemy.orm import Session, sessionmaker
+
+
+"""
+_summary_
+
+Route the queries of read-only views to read replicas.
+
+READ_REPLICA_URIS lists the replica databases; each becomes a Flask-SQLAlchemy bind
+(replica0, replica1, ...). A view decorated with `read_replicas.read_only` picks one
+healthy replica per request, round robin, and the RoutingSession sends its queries
+there. Everything else (mutating views, the auth decorators, CLI commands) stays on
+the primary, and so does a read-only view once its session has written.
+
+Replicas are checked with `SELECT 1` at most every READ_REPLICA_CHECK_INTERVAL seconds and
+skipped while they fail; with no healthy replica reads fall back to the primary.
+
+Read your writes: for READ_YOUR_WRITES_WINDOW seconds after a request commits a write,
+the same client reads from the primary. The window is remembered per authentication
+token in the worker and in a cookie, which also covers requests landing on other workers.
+Other clients may read data as old as the replica lag, and so may responses cached from it.
+"""
+
+__all__ = ['RoutingSession', 'RoutingSQLAlchemy', 'ReplicaRouter', 'read_replicas']
+
+logger = logging.getLogger(__name__)
+
+COOKIE = 'read_primary_until'
+
+
+class RoutingSession(SignallingSession):
+    ''' Session sending the queries of read-only views to the replica chosen for the request. '''
+
+    def get_bind(self, mapper=None, clause=None):
+        engine = read_replicas.engine_for(self)
+        if (engine is not None):
+            return engine
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    ''' Flask-SQLAlchemy whose sessions are RoutingSessions. '''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.engines = weakref.WeakSet()
+
+    def create_session(self, options):
+        return sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def create_engine(self, sa_url, engine_opts):
+        engine = super().create_engine(sa_url, engine_opts)
+        self.engines.add(engine)
+        return engine
+
+    def dispose_engines(self):
+        '''
+        Drop the pooled connections inherited from a parent process, so a forked worker opens its own.
+        The parent's connections are left open for the parent (close=False).
+        '''
+        for engine in list(self.engines):
+            engine.dispose(close=False)
+
+
+class ReplicaRouter(object):
+
+    def __init__(self):
+        self.binds = []
+        self.window = 0
+        self.check_interval = 0
+        self._db = None
+        self._app = None
+        self._next = itertools.count()
+        self._health = {}  # bind -> (healthy, checked at)
+        self._tokens = OrderedDict()  # token -> read from the primary until
+        self._lock = threading.Lock()
+
+    def init_app(self, app, db):
+        ''' Register every READ_REPLICA_URIS entry as a bind. Call before the engines are first used. '''
+        config = app.config
+        uris = [uri.strip() for uri in (config.get('READ_REPLICA_URIS') or '').split(',') if uri.strip()]
+        binds = dict(config.get('SQLALCHEMY_BINDS') or {})
+        for bind in self.binds:
+            binds.pop(bind, None)
+        self.binds = [f'replica{i}' for i in range(len(uris))]
+        binds.update(zip(self.binds, uris))
+        config['SQLALCHEMY_BINDS'] = binds or None
+
+        self._app, self._db = app, db
+        self.window = config['READ_YOUR_WRITES_WINDOW']
+        self.check_interval = config['READ_REPLICA_CHECK_INTERVAL']
+        self._health.clear()
+        self._tokens.clear()
+        if (self._remember_window not in app.after_request_funcs.get(None, [])):
+            app.after_request(self._remember_window)
+
+    def _healthy(self, bind):
+        healthy, checked = self._health.get(bind, (False, None))
+        now = time.monotonic()
+        if (checked is not None and now - checked < self.check_interval):
+            return healthy
+        try:
+            with self._db.get_engine(self._app, bind=bind).connect() as connection:
+                connection.execution_options(query_log=False).exec_driver_sql('SELECT 1')
+            healthy = True
+        except Exception:
+            logger.warning('read replica %s failed its health check', bind, exc_info=True)
+            healthy = False
+        self._health[bind] = (healthy, now)
+        return healthy
+
+    def _primary_until(self):
+        until = self._tokens.get(request.headers.get('Authorization'), 0)
+        try: until = max(until, float(request.cookies.get(COOKIE, 0)))
+        except ValueError: pass
+        return until
+
+    def choose(self):
+        ''' Return the bind to read from in this request, or None for the primary. '''
+        if (not self.binds or time.time() < self._primary_until()):
+            return None
+        start = next(self._next)
+        for i in range(len(self.binds)):
+            bind = self.binds[(start + i) % len(self.binds)]
+            if (self._healthy(bind)):
+                return bind
+        return None
+
+    def engine_for(self, session):
+        ''' Return the replica engine for the session's queries, or None to use the primary. '''
+        if (not has_request_context()):
+            return None
+        bind = g.get('read_replica')
+        if (bind is None or session.info.get('wrote')):
+            return None
+        return self._db.get_engine(self._app, bind=bind)
+
+    def read_only(self, f):
+        ''' Decorator for views that only read: their queries go to a replica. '''
+        @wraps(f)
+        def func(*args, **kwargs):
+            if (not self.binds):
+                return f(*args, **kwargs)
+            g.read_replica = self.choose()
+            if (g.read_replica is not None):
+                # Tells the response cache not to store what a possibly lagging replica returned.
+                g.read_from_replica = True
+            try:
+                return f(*args, **kwargs)
+            finally:
+                g.pop('read_replica', None)
+        return func
+
+    def wrote(self):
+        ''' Start the read your writes window of the client making the current request. '''
+        if (not self.binds or not self.window or not has_request_context()):
+            return
+        until = time.time() + self.window
+        g.read_primary_until = until
+        token = request.headers.get('Authorization')
+        if (token):
+            with self._lock:
+                self._tokens[token] = until
+                self._tokens.move_to_end(token)
+                # Windows all have the same length, so the oldest entries expire first.
+                while (self._tokens and next(iter(self._tokens.values())) < time.time()):
+                    self._tokens.popitem(last=False)
+
+    def _remember_window(self, response):
+        until = g.pop('read_primary_until', None)
+        if (until):
+            response.set_cookie(COOKIE, f'{until:.3f}', max_age=int(self.window) + 1, httponly=True, samesite='Lax')
+        return response
+
+
+read_replicas = ReplicaRouter()
+
+
+@event.listens_for(Session, 'after_flush')
+def _flushed(session, flush_context):
+    if (session.new or session.dirty or session.deleted):
+        session.info['wrote'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _committed(session):
+    if (session.info.pop('wrote', False)):
+        read_replicas.wrote()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _rolled_back(session):
+    session.info.pop('wrote', None)
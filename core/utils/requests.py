@@ -1,3 +1,71 @@
-from flask import jsonify
+import hashlib
+import datetime
+from functools import wraps
 
+from flask import jsonify, current_app, make_response, request
 
+from .compression import CODECS, variant_etag
+
+
+__all__ = ['http_status', 'make_etag', 'validators_match', 'not_modified', 'cacheable']
+
+
+def _with_status(rv):
+    ''' Pair an envelope ({'status', 'msg', 'body'}) with its HTTP status code; other return values pass through. '''
+    if (isinstance(rv, dict) and 'status' in rv):
+        return rv, rv['status']
+    return rv
+
+
+def http_status(f):
+    ''' Decorator that sends an envelope ({'status', 'msg', 'body'}) with a matching HTTP status code. '''
+    @wraps(f)
+    def func(*args, **kwargs):
+        return _with_status(f(*args, **kwargs))
+    return func
+
+
+def make_etag(*parts):
+    ''' Return a strong entity tag derived from the given values (ids, timestamps, cursors, ...). '''
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+
+def _http_date(value):
+    ''' Naive timestamps are stored in server local time; HTTP dates are UTC with second precision. '''
+    if (value.tzinfo is None):
+        value = value.astimezone()
+    return value.astimezone(datetime.timezone.utc).replace(microsecond=0)
+
+
+def _cache_headers(response, etag, last_modified):
+    response.set_etag(etag)
+    if (last_modified):
+        response.last_modified = _http_date(last_modified)
+    response.headers['Cache-Control'] = current_app.config['BLOG_CACHE_CONTROL']
+    return response
+
+
+def validators_match(if_none_match, if_modified_since, etag, last_modified=None):
+    '''
+    Return True if the parsed If-None-Match (ETags) or If-Modified-Since (datetime) validators match.
+    If-None-Match takes precedence over If-Modified-Since.
+    '''
+    if (if_none_match):
+        # A compressed variant of the response carries the encoding in its tag.
+        return if_none_match.contains(etag) or any(if_none_match.contains(variant_etag(etag, encoding)) for encoding in CODECS)
+    if (if_modified_since and last_modified):
+        return _http_date(last_modified) <= if_modified_since
+    return False
+
+
+def not_modified(etag, last_modified=None):
+    ''' Return a 304 response if the request's validators match, otherwise None. '''
+    if (not validators_match(request.if_none_match, request.if_modified_since, etag, last_modified)):
+        return None
+    return _cache_headers(current_app.response_class(status=304), etag, last_modified)
+
+
+def cacheable(envelope, etag, last_modified=None):
+    ''' Build the response for an envelope with its status code and caching headers. '''
+    response = make_response(envelope, envelope['status'])
+    return _cache_headers(response, etag, last_modified)
@@ -0,0 +1,262 @@
+import os
+import sqlite3
+import datetime
+import threading
+from functools import wraps
+from contextlib import contextmanager
+from collections import OrderedDict, namedtuple
+
+from flask import current_app, g, make_response, request
+
+from .requests import not_modified, _cache_headers, _with_status
+from .compression import compression
+
+
+"""
+_summary_
+
+Cache of rendered JSON responses.
+
+A cached view stores the final response bytes along with its status, ETag and
+Last-Modified, so a hit costs neither a query nor serialization. Entries are keyed by
+the request path and query string plus the current version of every namespace the view
+reads from (e.g. 'posts', 'post:5', 'comments:5'). Mutating views call `invalidate` with
+the namespaces they touched, which bumps their versions and makes every older key
+unreachable; stale entries then age out of the backend.
+
+Only responses rendered from the primary database are stored; a view that read from a
+replica (see read_replicas.read_only) answers that one request uncached.
+
+Compressed variants of a cached body are stored next to it, under the entry's key and the
+encoding, the first time a client asks for that encoding; later hits serve them as is.
+
+Backends (RESPONSE_CACHE_BACKEND):
+    ''       - disabled
+    'memory' - per process LRU, only correct with a single worker process
+    'sqlite' - a local SQLite file (RESPONSE_CACHE_PATH) shared by every worker on the host
+"""
+
+__all__ = ['CachedResponse', 'MemoryBackend', 'SQLiteBackend', 'ResponseCache', 'response_cache']
+
+
+# Bump when the shape of cached payloads changes so entries written by an older release are never served.
+CACHE_SCHEMA = 2
+
+
+CachedResponse = namedtuple('CachedResponse', ['status', 'etag', 'last_modified', 'body'])
+
+
+class MemoryBackend(object):
+    ''' Bounded LRU of cache entries and namespace versions for a single process. '''
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if (entry is not None):
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while (len(self._entries) > self.maxsize):
+                self._entries.popitem(last=False)
+
+    def versions(self, names):
+        return [self._versions.get(name, 0) for name in names]
+
+    def bump(self, names):
+        with self._lock:
+            for name in names:
+                self._versions[name] = self._versions.get(name, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+
+
+class SQLiteBackend(object):
+    ''' Cache entries and namespace versions in a SQLite file shared by the worker processes on a host. '''
+
+    TRIM_EVERY = 64
+
+    def __init__(self, path, maxsize=1024):
+        self.path = path
+        self.maxsize = maxsize
+        self._local = threading.local()
+        self._writes = 0
+
+    def _connection(self):
+        # sqlite3 connections cannot cross threads or forks, so keep one per thread and process.
+        connection = getattr(self._local, 'connection', None)
+        if (connection is None or self._local.pid != os.getpid()):
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=OFF')
+            connection.execute('CREATE TABLE IF NOT EXISTS entry (key TEXT PRIMARY KEY, status INTEGER, etag TEXT, last_modified TEXT, body BLOB)')
+            connection.execute('CREATE TABLE IF NOT EXISTS version (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return connection
+
+    def get(self, key):
+        row = self._connection().execute('SELECT status, etag, last_modified, body FROM entry WHERE key = ?', (key,)).fetchone()
+        if (row is None):
+            return None
+        status, etag, last_modified, body = row
+        last_modified = datetime.datetime.fromisoformat(last_modified) if last_modified else None
+        return CachedResponse(status, etag, last_modified, body)
+
+    def set(self, key, entry):
+        connection = self._connection()
+        last_modified = entry.last_modified.isoformat() if entry.last_modified else None
+        connection.execute('INSERT OR REPLACE INTO entry (key, status, etag, last_modified, body) VALUES (?, ?, ?, ?, ?)',
+                           (key, entry.status, entry.etag, last_modified, entry.body))
+
+        # Trim the oldest written entries now and then rather than counting rows on every write.
+        self._writes += 1
+        if (self._writes % self.TRIM_EVERY == 0):
+            connection.execute('DELETE FROM entry WHERE rowid IN (SELECT rowid FROM entry ORDER BY rowid '
+                               'LIMIT max(0, (SELECT count(*) FROM entry) - ?))', (self.maxsize,))
+
+    def versions(self, names):
+        placeholders = ','.join('?' * len(names))
+        rows = dict(self._connection().execute(f'SELECT name, value FROM version WHERE name IN ({placeholders})', names).fetchall())
+        return [rows.get(name, 0) for name in names]
+
+    def bump(self, names):
+        self._connection().executemany('INSERT INTO version (name, value) VALUES (?, 1) '
+                                       'ON CONFLICT(name) DO UPDATE SET value = value + 1', [(name,) for name in names])
+
+    def clear(self):
+        connection = self._connection()
+        connection.execute('DELETE FROM entry')
+        connection.execute('DELETE FROM version')
+
+
+class ResponseCache(object):
+
+    def __init__(self, backend=None):
+        self.backend = backend
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0, 'replica_skips': 0, 'compressions': 0, 'invalidations': 0}
+
+    def init_app(self, app):
+        kind = app.config.get('RESPONSE_CACHE_BACKEND')
+        size = app.config.get('RESPONSE_CACHE_SIZE', 1024)
+        if (kind == 'memory'):
+            self.backend = MemoryBackend(size)
+        elif (kind == 'sqlite'):
+            self.backend = SQLiteBackend(app.config['RESPONSE_CACHE_PATH'], size)
+        elif (kind):
+            raise ValueError(f'unknown RESPONSE_CACHE_BACKEND {kind!r}')
+        else:
+            self.backend = None
+
+    @staticmethod
+    def namespace(name, id=None):
+        ''' Return the namespace for a resource, normalizing numeric ids taken from the url. '''
+        if (id is None):
+            return name
+        return f'{name}:{int(id)}' if str(id).isdigit() else f'{name}:{id}'
+
+    def invalidate(self, *names):
+        ''' Make every cached response that read from the given namespaces unreachable. '''
+        if (self.backend is None):
+            return
+        pending = g.get('pending_invalidations')
+        if (pending is not None):
+            pending.update(names)
+            return
+        self.backend.bump(list(names))
+        self.stats['invalidations'] += 1
+
+    @contextmanager
+    def deferred(self):
+        '''
+        Hold back the invalidations made inside the block and apply them when it exits.
+        Wrap work whose commit comes later, so that readers cannot cache data that is not committed yet.
+        Cached views called inside the block bypass the cache, neither reading nor storing entries.
+        '''
+        g.pending_invalidations = pending = set()
+        try:
+            yield
+        finally:
+            del g.pending_invalidations
+            if (pending):
+                self.invalidate(*sorted(pending))
+
+    def compressed(self, response, key, entry):
+        ''' Compress the response of a cached entry for the current request, reusing the stored variant. '''
+        encoding = compression.negotiate()
+        if (encoding is None or len(entry.body) < compression.min_size):
+            return response
+        variant_key = repr((key, encoding))
+        variant = self.backend.get(variant_key)
+        if (variant is None):
+            variant = entry._replace(body=compression.compress(entry.body, encoding))
+            self.backend.set(variant_key, variant)
+            self.stats['compressions'] += 1
+        return compression.encode(response, encoding, variant.body)
+
+    def respond(self, entry, key=None):
+        ''' Serve a cached entry, answering conditional requests with a 304. '''
+        response = not_modified(entry.etag, entry.last_modified)
+        if (response is None):
+            response = current_app.response_class(entry.body, status=entry.status, mimetype='application/json')
+            response = _cache_headers(response, entry.etag, entry.last_modified)
+            if (key is not None):
+                response = self.compressed(response, key, entry)
+        response.headers['X-Cache'] = 'HIT'
+        return response
+
+    def cached(self, namespaces):
+        '''
+        Decorator caching the successful responses of a view.
+        `namespaces` maps the view's keyword arguments to the namespaces the view reads from.
+        '''
+        def decorator(f):
+            @wraps(f)
+            def func(*args, **kwargs):
+                # Inside deferred() the request may read its own uncommitted writes: a cached entry would miss them,
+                # and what it renders must not be stored for other requests.
+                if (self.backend is None or g.get('pending_invalidations') is not None):
+                    return f(*args, **kwargs)
+
+                # Read the versions before the view queries, so a concurrent invalidation can only
+                # make this response land under a key that is already unreachable.
+                names = namespaces(**kwargs)
+                versions = self.backend.versions(names)
+                key = repr((CACHE_SCHEMA, request.path, sorted(request.args.items(multi=True)), names, versions))
+
+                entry = self.backend.get(key)
+                if (entry is not None):
+                    self.stats['hits'] += 1
+                    return self.respond(entry, key)
+
+                self.stats['misses'] += 1
+                g.pop('read_from_replica', None)
+                # The view's envelope keeps its status: http_status above only sees the response built here.
+                response = make_response(_with_status(f(*args, **kwargs)))
+                # Only responses rendered from the primary are stored: a lagging replica's body would otherwise be
+                # served under the namespace versions a write has just bumped, to the writer as well.
+                if (g.pop('read_from_replica', False)):
+                    self.stats['replica_skips'] += 1
+                elif (response.status_code == 200 and response.get_etag()[0]):
+                    entry = CachedResponse(200, response.get_etag()[0], response.last_modified, response.get_data())
+                    self.backend.set(key, entry)
+                    self.stats['stores'] += 1
+                    response = self.compressed(response, key, entry)
+                response.headers['X-Cache'] = 'MISS'
+                return response
+            return func
+        return decorator
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,103 @@
+import json
+import datetime
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional, the stdlib encoder is used without it
+    orjson = None
+
+
+"""
+_summary_
+
+JSON provider for the response envelopes.
+
+Serializes with orjson when it is installed (JSON_LIBRARY 'orjson', the default when
+available) and otherwise with the stdlib's C encoder ('stdlib'). Either way the response
+body is built as bytes in one step, skipping the per call option handling of Flask's
+provider.
+
+Datetimes (JSON_DATETIME_FORMAT):
+    'http' - RFC 822 dates, as Flask's default provider writes them (the default)
+    'iso'  - ISO 8601, encoded natively by orjson without calling back into Python
+
+Output matches Flask's default provider (sorted keys, compact, trailing newline) except
+that orjson writes non-ASCII characters as UTF-8 instead of \\u escapes.
+"""
+
+__all__ = ['JSONProvider']
+
+
+_DAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+_MONTHS = (None, 'Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+
+def http_date(value):
+    '''
+    Format a date or datetime as werkzeug.http.http_date does (naive values are UTC),
+    without going through email.utils; listings format one or two dates per row.
+    '''
+    if (isinstance(value, datetime.datetime)):
+        if (value.tzinfo is not None):
+            value = value.astimezone(datetime.timezone.utc)
+        time = f'{value.hour:02d}:{value.minute:02d}:{value.second:02d}'
+    else:
+        time = '00:00:00'
+    return f'{_DAYS[value.weekday()]}, {value.day:02d} {_MONTHS[value.month]} {value.year:04d} {time} GMT'
+
+
+class JSONProvider(DefaultJSONProvider):
+
+    def __init__(self, app):
+        super().__init__(app)
+        config = app.config
+        library = config.get('JSON_LIBRARY') or ('orjson' if orjson else 'stdlib')
+        if (library == 'orjson' and orjson is None):
+            raise ValueError('JSON_LIBRARY is orjson but orjson is not installed')
+        elif (library not in ('orjson', 'stdlib')):
+            raise ValueError(f'unknown JSON_LIBRARY {library!r}')
+        self.library = library
+
+        self.datetime_format = config.get('JSON_DATETIME_FORMAT', 'http')
+        if (self.datetime_format not in ('http', 'iso')):
+            raise ValueError(f"unknown JSON_DATETIME_FORMAT {self.datetime_format!r}, expected 'http' or 'iso'")
+
+    def _datetime(self, value):
+        if (self.datetime_format == 'iso'):
+            return value.isoformat()
+        return http_date(value)
+
+    def _default(self, value):
+        if (isinstance(value, (datetime.date, datetime.datetime))):
+            return self._datetime(value)
+        return self.default(value)
+
+    def encode(self, obj, indent=None):
+        ''' Return the JSON bytes of obj. '''
+        if (self.library == 'orjson'):
+            option = orjson.OPT_NON_STR_KEYS
+            if (self.sort_keys): option |= orjson.OPT_SORT_KEYS
+            if (indent): option |= orjson.OPT_INDENT_2
+            if (self.datetime_format != 'iso'): option |= orjson.OPT_PASSTHROUGH_DATETIME
+            return orjson.dumps(obj, default=self._default, option=option)
+        separators = None if indent else (',', ':')
+        encoder = json.JSONEncoder(ensure_ascii=self.ensure_ascii, sort_keys=self.sort_keys, indent=indent,
+                                   separators=separators, default=self._default)
+        return encoder.encode(obj).encode('utf-8')
+
+    def dumps(self, obj, **kwargs):
+        if (kwargs):
+            return super().dumps(obj, **kwargs)
+        return self.encode(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if (kwargs or orjson is None or self.library != 'orjson'):
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        pretty = self.compact is False or (self.compact is None and self._app.debug)
+        return self._app.response_class(self.encode(obj, indent=2 if pretty else None) + b'\n', mimetype=self.mimetype)
@@ -1,6 +1,9 @@
-from flask import jsonify
+from flask import Response, current_app, jsonify, request, stream_with_context
 
-from core import app
+from core import utils
+from core import export
+from core import batch
+from core.user_auth.utils import require_admin, require_token
 
 
 
@@ -13,3 +16,56 @@ from core import app
 #     # return response('arg1', 'arg2', kwarg1=1)
 
 
+
+@utils.http_status
+@require_admin
+def export_dataset(dataset, admin, token):
+    '''
+    Stream the posts, comments or users as a download.
+    Choose `format=ndjson|csv` (default ndjson) and pass `gzip=1` to compress it on the fly.
+    '''
+    format = request.args.get('format', 'ndjson')
+    gzip = request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
+    try:
+        chunks = export.export_stream(dataset, format, gzip)
+    except ValueError as e:
+        return {'status': 400, 'msg': 'invalid request parameters', 'body': str(e)}
+
+    mimetype = 'application/gzip' if gzip else export.FORMATS[format][0]
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={export.filename(dataset, format, gzip)}'
+    return response
+
+
+
+@utils.http_status
+@require_token
+def run_batch(user, token):
+    '''
+    Run a list of operations in one request and one transaction (see core.batch).
+    Send {"operations": [{"method", "path", "body"}, ...], "atomic": false}; with atomic
+    set, the first failure rolls back every operation. Results come back in order as envelopes.
+    '''
+    data = request.get_json(silent=True) or {}
+    operations = data.get('operations')
+    limit = current_app.config['BATCH_MAX_OPERATIONS']
+    if (not isinstance(operations, list) or not operations):
+        return {'status': 400, 'msg': 'invalid batch', 'body': 'operations must be a non-empty list'}
+    if (len(operations) > limit):
+        return {'status': 400, 'msg': 'invalid batch', 'body': f'a batch holds at most {limit} operations'}
+
+    try:
+        committed, results = batch.run_batch(operations, user, token, atomic=bool(data.get('atomic')))
+    except Exception as e:
+        return {'status': 500, 'msg': 'batch failed', 'body': str(e)}
+
+    if (not committed):
+        return {'status': 409, 'msg': 'batch rolled back', 'body': {'committed': False, 'results': results}}
+    return {'status': 200, 'msg': f'{len(results)} operations run', 'body': {'committed': True, 'results': results}}
+
+
+
+def init_app(app):
+    ''' Register the core application views. '''
+    app.add_url_rule('/export/<dataset>', view_func=export_dataset)
+    app.add_url_rule('/batch', view_func=run_batch, methods=['POST'])
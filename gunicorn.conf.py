@@ -0,0 +1,14 @@
+"""
+_summary_
+
+Server hooks for gunicorn, which loads this file from the working directory (see Procfile).
+"""
+
+from config import Configuration
+from core.utils.metrics import Metrics
+
+
+def on_starting(server):
+    ''' Start the request metrics of the workers from zero (see core/utils/metrics.py). '''
+    if (Configuration.METRICS_ENABLED and Configuration.METRICS_DIR):
+        Metrics.clear(Configuration.METRICS_DIR)
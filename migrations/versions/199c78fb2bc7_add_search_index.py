@@ -0,0 +1,58 @@
+"""add the FTS5 search_index over posts and comments
+
+Revision ID: 199c78fb2bc7
+Revises: a87e03430a27
+Create Date: 2026-10-18 16:05:12.448190
+
+"""
+import zlib
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '199c78fb2bc7'
+down_revision = 'a87e03430a27'
+branch_labels = None
+depends_on = None
+
+
+BATCH_SIZE = 1000
+
+
+def upgrade():
+    connection = op.get_bind()
+    if (connection.dialect.name != 'sqlite'):
+        return
+
+    op.execute("CREATE VIRTUAL TABLE search_index USING fts5(title, body, post_id UNINDEXED, tokenize='porter unicode61')")
+
+    # Posts are stored at rowid 2 * id and comments at 2 * id + 1 (see core/blog/search.py).
+    last_id = 0
+    while True:
+        rows = connection.execute(sa.text(
+            'SELECT id, title, body, body_encoding FROM post WHERE id > :id ORDER BY id LIMIT :limit'
+        ), {'id': last_id, 'limit': BATCH_SIZE}).fetchall()
+        if (not rows):
+            break
+        connection.execute(sa.text(
+            'INSERT INTO search_index (rowid, title, body, post_id) VALUES (:rowid, :title, :body, :post_id)'
+        ), [{
+            'rowid': 2 * id,
+            'title': title,
+            'body': (zlib.decompress(body) if encoding == 'zlib' else body).decode('utf-8'),
+            'post_id': id,
+        } for id, title, body, encoding in rows])
+        last_id = rows[-1][0]
+
+    op.execute(
+        "INSERT INTO search_index (rowid, title, body, post_id) "
+        "SELECT 2 * id + 1, '', body, post_id FROM comment"
+    )
+
+
+def downgrade():
+    if (op.get_bind().dialect.name != 'sqlite'):
+        return
+    op.execute('DROP TABLE IF EXISTS search_index')
@@ -0,0 +1,50 @@
+import os
+import tempfile
+
+import pytest
+
+# The application is configured at import time, so point it at a scratch database first.
+_db_dir = tempfile.mkdtemp()
+os.environ['DATABASE_URI'] = 'sqlite:///' + os.path.join(_db_dir, 'test.db')
+os.environ.setdefault('SECRET_KEY', 'test-secret-key')
+os.environ.setdefault('ADMIN_SECRET_KEY', 'test-admin-secret-key')
+os.environ.setdefault('METRICS_ENABLED', 'true')
+# Run on the pooled, tuned SQLite connections of a deployment (Procfile).
+os.environ.setdefault('DATABASE_PROFILE', 'production')
+# Tests refresh the revocation denylist themselves rather than from a background thread.
+os.environ.setdefault('AUTH_REVOCATION_REFRESH', '3600')
+
+from core import app as flask_app
+from core import db
+from core.user_auth import models
+from core.user_auth.cache import token_cache
+from core.user_auth.revocation import revoked_tokens
+
+
+@pytest.fixture(autouse=True)
+def app():
+    ''' Provide the application inside an app context with a freshly created schema. '''
+    flask_app.config['TESTING'] = True
+    with flask_app.app_context():
+        db.create_all()
+        yield flask_app
+        db.session.remove()
+        db.drop_all()
+        token_cache.clear()
+        revoked_tokens.reset()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def admin_headers(client):
+    ''' Authorization headers of a freshly logged in admin. '''
+    user = models.User.create('admin@email.com', 'adminPassword')
+    user.is_admin = True
+    db.session.add(user)
+    db.session.commit()
+    response = client.post('/login', json={'email': 'admin@email.com', 'password': 'adminPassword'})
+    return {'Authorization': response.get_json()['body']['Authorization']}
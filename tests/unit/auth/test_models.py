@@ -1,4 +1,8 @@
+import datetime
+
+from core import db
 from core.user_auth import models
+from core.user_auth.sweeper import sweep_expired_tokens
 from werkzeug.security import check_password_hash, generate_password_hash
 
 
@@ -38,3 +42,21 @@ def test_create_user():
 
 
 
+def test_sweep_expired_tokens():
+    """
+    GIVEN a user with one expired and one live token
+    WHEN the token sweeper runs
+    THEN only the expired token is deleted
+    """
+    user = models.User.create('someuser@email.com', 'myPassword')
+    db.session.add(user)
+    db.session.commit()
+
+    now = datetime.datetime.now()
+    expired = user.generate_token(expires=now - datetime.timedelta(minutes=1))
+    live = user.generate_token(expires=now + datetime.timedelta(days=1))
+    db.session.add_all([expired, live])
+    db.session.commit()
+
+    assert sweep_expired_tokens() == (1, 0)
+    assert [t.token for t in models.Token.query.all()] == [live.token]
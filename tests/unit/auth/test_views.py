@@ -0,0 +1,162 @@
+import time
+import datetime
+
+import pytest
+from sqlalchemy import event
+
+from core import db
+from core.user_auth import models
+from core.user_auth.hashing import HashingBusy, password_hasher
+from core.user_auth.revocation import RevocationList, revoked_tokens
+
+
+def make_user(email='someuser@email.com', password='myPassword', is_admin=False):
+    user = models.User.create(email, password)
+    user.is_admin = is_admin
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def login(client, email='someuser@email.com', password='myPassword'):
+    response = client.post('/login', json={'email': email, 'password': password})
+    return response.get_json()['body']['Authorization']
+
+
+class QueryCounter(object):
+    ''' Count the SQL statements executed on the engine while active. '''
+
+    def __enter__(self):
+        self.count = 0
+        event.listen(db.engine, 'before_cursor_execute', self.callback)
+        return self
+
+    def __exit__(self, *args):
+        event.remove(db.engine, 'before_cursor_execute', self.callback)
+
+    def callback(self, *args, **kwargs):
+        self.count += 1
+
+
+def test_cached_token_costs_no_queries(client):
+    """
+    GIVEN an admin with a fresh login token
+    WHEN an admin route is requested twice with the token
+    THEN the first request validates the token with one query and the second with none
+    """
+    make_user(is_admin=True)
+    token = login(client)
+    revoked_tokens.refresh()
+
+    with QueryCounter() as cold:
+        assert client.get('/users/all', headers={'Authorization': token}).get_json()['status'] == 200
+    with QueryCounter() as warm:
+        assert client.get('/users/all', headers={'Authorization': token}).get_json()['status'] == 200
+
+    # get_all_users itself runs one query.
+    assert cold.count == 2
+    assert warm.count == 1
+
+
+def test_logout_evicts_cached_token(client):
+    """
+    GIVEN an admin whose token has been cached by an authenticated request
+    WHEN the admin logs out
+    THEN the token is no longer accepted
+    """
+    make_user(is_admin=True)
+    token = login(client)
+    headers = {'Authorization': token}
+
+    assert client.get('/users/all', headers=headers).get_json()['status'] == 200
+    assert client.post('/logout', headers=headers).get_json()['status'] == 200
+    assert client.get('/users/all', headers=headers).get_json()['status'] == 404
+
+
+def test_stateless_logout_revokes_across_workers(client, app):
+    """
+    GIVEN stateless token verification and a second worker's view of the denylist
+    WHEN a cached token is logged out
+    THEN it is rejected, and the other worker sees the revocation once it refreshes
+    """
+    app.config['AUTH_STATELESS'] = True
+    try:
+        make_user(is_admin=True)
+        token = login(client)
+        headers = {'Authorization': token}
+        other_worker = RevocationList()
+        other_worker.refresh()
+
+        assert client.get('/users/all', headers=headers).get_json()['status'] == 200
+        assert client.post('/logout', headers=headers).get_json()['status'] == 200
+        assert client.get('/users/all', headers=headers).get_json()['status'] == 404
+
+        jti = models.Token.decode_token(token)['jti']
+        assert not other_worker.is_revoked(jti)
+        other_worker.refresh()
+        assert other_worker.is_revoked(jti)
+    finally:
+        app.config['AUTH_STATELESS'] = False
+
+
+def test_revocations_are_refreshed_in_the_background(app):
+    """
+    GIVEN a worker whose denylist is loaded
+    WHEN another worker revokes a token and the refresh interval passes
+    THEN checks still run no queries, and the background refresher picks up the revocation
+    """
+    worker = RevocationList(refresh=0.05)
+    worker.refresh()
+    now = datetime.datetime.now()
+    db.session.add(models.RevokedToken(jti='elsewhere', expires_at=now + datetime.timedelta(hours=1), revoked_at=now))
+    db.session.commit()
+    time.sleep(0.1)
+
+    with QueryCounter() as checks:
+        assert not worker.is_revoked('elsewhere')
+    assert checks.count == 0
+
+    worker.refresher._app = app
+    worker.refresher.ensure_running()
+    try:
+        deadline = time.monotonic() + 5
+        while (not worker.is_revoked('elsewhere') and time.monotonic() < deadline):
+            time.sleep(0.05)
+        assert worker.is_revoked('elsewhere')
+    finally:
+        worker.refresher.stop()
+        # Close the connection the refresher's thread left in the pool.
+        db.engine.dispose()
+
+
+def test_login_with_pooled_hashing(client, app):
+    """
+    GIVEN password hashing sent to a one process pool
+    WHEN a user registers and logs in
+    THEN the hash is verified in the pool, a full queue is reported as a 503, and a timed out job holds its slot
+    """
+    app.config.update(PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_QUEUE=1)
+    password_hasher.init_app(app)
+    try:
+        assert client.post('/register', json={'email': 'someuser@email.com', 'password': 'myPassword'}).get_json()['status'] == 200
+        assert login(client)
+        assert client.post('/login', json={'email': 'someuser@email.com', 'password': 'wrong'}).get_json()['status'] == 400
+
+        password_hasher.timeout = 0.01
+        _, slots = password_hasher._pool()
+        slots.acquire()
+        try:
+            response = client.post('/login', json={'email': 'someuser@email.com', 'password': 'myPassword'})
+            assert (response.status_code, response.get_json()['status']) == (503, 503)
+        finally:
+            slots.release()
+
+        # A job that timed out keeps its slot until it finishes.
+        with pytest.raises(HashingBusy, match='timed out'):
+            password_hasher._run(time.sleep, 0.5)
+        assert not slots.acquire(blocking=False)
+        assert slots.acquire(timeout=5)
+        slots.release()
+    finally:
+        app.config.update(PASSWORD_HASH_WORKERS=0, PASSWORD_HASH_QUEUE=None)
+        password_hasher.init_app(app)
@@ -0,0 +1,37 @@
+from core.blog import models
+
+
+def test_create_post_compresses_long_body():
+    """
+    GIVEN a long and a short post body
+    WHEN posts are created from them
+    THEN the long body is stored compressed, the short one as is, and both read back unchanged
+    """
+    long_text = 'the quick brown fox jumps over the lazy dog ' * 100
+    long_post = models.Post.create({'title': 'long', 'body': long_text})
+    short_post = models.Post.create({'title': 'short', 'body': 'a short body'})
+
+    assert long_post.body_encoding == 'zlib'
+    assert len(long_post.body) < len(long_text)
+    assert long_post.text == long_text
+    assert long_post.word_count == 900
+    assert long_post.excerpt.endswith('…') and len(long_post.excerpt) <= 281
+
+    assert short_post.body_encoding == 'utf-8'
+    assert short_post.body == b'a short body'
+    assert short_post.serialize['body'] == 'a short body'
+    assert short_post.excerpt == 'a short body'
+
+
+def test_update_post_recomputes_excerpt():
+    """
+    GIVEN a post
+    WHEN its body is updated
+    THEN the excerpt and word count follow the new body
+    """
+    post = models.Post.create({'title': 'post', 'body': 'one two three'})
+    post.update({'body': 'four five'})
+
+    assert post.text == 'four five'
+    assert post.excerpt == 'four five'
+    assert post.word_count == 2
@@ -0,0 +1,659 @@
+import asyncio
+import csv
+import gzip
+import json
+import zlib
+import sqlite3
+import datetime
+
+import pytest
+from sqlalchemy import event
+
+from core import db
+from core.blog import models, search, activity
+from core.utils import ResponseCache, response_cache, read_replicas
+
+
+def make_posts(count):
+    start = datetime.datetime(2022, 1, 1)
+    for i in range(count):
+        post = models.Post.create({'title': f'post {i}', 'body': f'body {i}', 'created_at': start + datetime.timedelta(minutes=i)})
+        db.session.add(post)
+    db.session.commit()
+
+
+def test_get_posts_pages_with_cursors(client):
+    """
+    GIVEN 25 posts
+    WHEN /post/all is walked forward with the `next` cursor and back with `prev`
+    THEN every post is returned exactly once, newest first, and `prev` returns the previous page
+    """
+    make_posts(25)
+
+    seen, pages, cursor = [], [], None
+    while True:
+        url = '/post/all?limit=10' + (f'&cursor={cursor}' if cursor else '')
+        body = client.get(url).get_json()['body']
+        pages.append(body)
+        seen += [p['title'] for p in body['posts']]
+        cursor = body['next']
+        if (not cursor): break
+
+    assert seen == [f'post {i}' for i in reversed(range(25))]
+    assert 'body' not in pages[0]['posts'][0] and pages[0]['posts'][0]['excerpt'] == 'body 24'
+    assert [len(p['posts']) for p in pages] == [10, 10, 5]
+    assert pages[0]['prev'] is None
+
+    body = client.get(f"/post/all?limit=10&cursor={pages[2]['prev']}").get_json()['body']
+    assert [p['title'] for p in body['posts']] == [p['title'] for p in pages[1]['posts']]
+
+
+def test_get_posts_limit_is_capped(client, app):
+    """
+    GIVEN more posts than MAX_PAGE_SIZE
+    WHEN a page larger than the cap is requested
+    THEN only MAX_PAGE_SIZE posts are returned and a malformed cursor is rejected
+    """
+    app.config['MAX_PAGE_SIZE'] = 5
+    try:
+        make_posts(8)
+        body = client.get('/post/all?limit=50').get_json()['body']
+        assert len(body['posts']) == 5
+        assert client.get('/post/all?cursor=garbage').get_json()['status'] == 400
+    finally:
+        app.config['MAX_PAGE_SIZE'] = 100
+
+
+def test_get_comments_show_more(client):
+    """
+    GIVEN a post with 7 comments and another post with 1 comment
+    WHEN the post's comments are requested 3 at a time following the `next` cursor as `after`
+    THEN the post's comments are returned oldest first without the other post's comment
+    """
+    make_posts(2)
+    first, second = models.Post.query.order_by(models.Post.id).all()
+    start = datetime.datetime(2022, 2, 1)
+    for i in range(7):
+        db.session.add(models.Comment.create({'post_id': first.id, 'body': f'comment {i}', 'created_at': start + datetime.timedelta(minutes=i)}))
+    db.session.add(models.Comment.create({'post_id': second.id, 'body': 'elsewhere'}))
+    db.session.commit()
+
+    bodies, after = [], None
+    while True:
+        url = f'/post/{first.id}/comments?limit=3' + (f'&after={after}' if after else '')
+        body = client.get(url).get_json()['body']
+        bodies += [c['body'] for c in body['comments']]
+        after = body['next']
+        if (not after): break
+
+    assert bodies == [f'comment {i}' for i in range(7)]
+
+
+def test_get_post_conditional_requests(client):
+    """
+    GIVEN a post fetched once
+    WHEN it is fetched again with its ETag or Last-Modified, before and after an update
+    THEN a bodiless 304 is returned until the post changes, and a missing post is an HTTP 404
+    """
+    make_posts(1)
+    post = models.Post.query.first()
+
+    response = client.get(f'/post/{post.id}')
+    etag, last_modified = response.headers['ETag'], response.headers['Last-Modified']
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == 'no-cache'
+
+    response = client.get(f'/post/{post.id}', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert client.get(f'/post/{post.id}', headers={'If-Modified-Since': last_modified}).status_code == 304
+
+    post.update({'body': 'edited', 'updated_at': post.created_at + datetime.timedelta(days=1)})
+    db.session.commit()
+    response = client.get(f'/post/{post.id}', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['body']['body'] == 'edited'
+
+    assert client.get('/post/12345').status_code == 404
+
+
+def test_get_posts_etag_changes_with_the_page(client):
+    """
+    GIVEN a page of posts and its ETag
+    WHEN a new post is created
+    THEN the listing no longer matches the old ETag
+    """
+    make_posts(3)
+    etag = client.get('/post/all').headers['ETag']
+    assert client.get('/post/all', headers={'If-None-Match': etag}).status_code == 304
+
+    db.session.add(models.Post.create({'title': 'newest', 'body': 'new'}))
+    db.session.commit()
+    assert client.get('/post/all', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_response_cache_hits_and_invalidation(client, app, admin_headers, tmp_path):
+    """
+    GIVEN the shared SQLite response cache
+    WHEN a post is read twice, updated through the API and read again
+    THEN the second read is a hit, the update invalidates it, and a second worker's cache agrees
+    """
+    app.config.update(RESPONSE_CACHE_BACKEND='sqlite', RESPONSE_CACHE_PATH=str(tmp_path / 'cache.db'))
+    response_cache.init_app(app)
+    other_worker = ResponseCache()
+    other_worker.init_app(app)
+    try:
+        make_posts(1)
+        post = models.Post.query.first()
+
+        assert client.get(f'/post/{post.id}').headers['X-Cache'] == 'MISS'
+        response = client.get(f'/post/{post.id}')
+        assert response.headers['X-Cache'] == 'HIT'
+        assert response.get_json()['body']['body'] == 'body 0'
+
+        assert client.patch(f'/post/{post.id}/update', json={'body': 'edited'}, headers=admin_headers).status_code == 200
+        assert other_worker.backend.versions(['post:%d' % post.id]) == [1]
+
+        response = client.get(f'/post/{post.id}')
+        assert response.headers['X-Cache'] == 'MISS'
+        assert response.get_json()['body']['body'] == 'edited'
+    finally:
+        app.config['RESPONSE_CACHE_BACKEND'] = ''
+        response_cache.init_app(app)
+
+
+def test_cached_views_keep_their_error_status(client, app, tmp_path):
+    """
+    GIVEN the shared SQLite response cache
+    WHEN cached views answer a missing post or invalid parameters
+    THEN the HTTP status matches the envelope's, as without the cache, and nothing is stored
+    """
+    app.config.update(RESPONSE_CACHE_BACKEND='sqlite', RESPONSE_CACHE_PATH=str(tmp_path / 'cache.db'))
+    response_cache.init_app(app)
+    stores = response_cache.stats['stores']
+    try:
+        response = client.get('/post/1')
+        assert (response.status_code, response.get_json()['status']) == (404, 404)
+        for path in ('/post/all?fields=nope', '/post/all?sort=zzz', '/post/all?cursor=garbage', '/post/all?limit=abc'):
+            response = client.get(path)
+            assert (response.status_code, response.get_json()['status']) == (400, 400), path
+        assert response_cache.stats['stores'] == stores
+    finally:
+        app.config['RESPONSE_CACHE_BACKEND'] = ''
+        response_cache.init_app(app)
+
+
+def test_sparse_fieldsets_select_only_requested_columns(client):
+    """
+    GIVEN posts with bodies
+    WHEN the listing and a post are requested with `fields` or `view`
+    THEN only the requested fields are returned, the body column is not selected, and unknown fields are rejected
+    """
+    make_posts(2)
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        body = client.get('/post/all?fields=id,title,created_at').get_json()['body']
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+
+    assert all(set(p) == {'id', 'title', 'created_at'} for p in body['posts'])
+    assert 'post.body' not in statements[0]
+    assert 'post.excerpt' not in statements[0]
+
+    post_id = body['posts'][0]['id']
+    assert set(client.get(f'/post/{post_id}?view=summary').get_json()['body']) == set(models.Post.VIEWS['summary'])
+    assert client.get(f'/post/{post_id}?fields=id,secret').status_code == 400
+
+
+def test_search_posts_and_comments(client, admin_headers):
+    """
+    GIVEN posts and a comment created through the API
+    WHEN the blog is searched, a post is deleted and the index is rebuilt
+    THEN title matches rank first, comments are found, and deleted documents disappear
+    """
+    client.post('/post/create', json={'title': 'Brewing coffee', 'body': 'How to grind beans.'}, headers=admin_headers)
+    client.post('/post/create', json={'title': 'Tea notes', 'body': 'Coffee is fine too, but tea is better.'}, headers=admin_headers)
+    tea = models.Post.query.filter_by(title='Tea notes').first()
+    client.post(f'/post/{tea.id}/comment/create', json={'body': 'Espresso beans are underrated'}, headers=admin_headers)
+
+    results = client.get('/search?q=coffee').get_json()['body']['results']
+    assert [r['title'] for r in results] == ['Brewing <mark>coffee</mark>', 'Tea notes']
+    assert '<mark>Coffee</mark>' in results[1]['snippet']
+
+    results = client.get('/search?q=bean').get_json()['body']['results']
+    assert {r['type'] for r in results} == {'post', 'comment'}
+
+    client.post('/post/create', json={'title': '<script>alert(1)</script> & grinders', 'body': 'A <b>bold</b> grinder.'},
+                headers=admin_headers)
+    result, = client.get('/search?q=grinder').get_json()['body']['results']
+    assert result['title'] == '&lt;script&gt;alert(1)&lt;/script&gt; &amp; <mark>grinders</mark>'
+    assert result['snippet'] == 'A &lt;b&gt;bold&lt;/b&gt; <mark>grinder</mark>.'
+    client.delete(f"/post/{result['id']}/delete", headers=admin_headers)
+
+    page = client.get('/search?q=coffee&limit=1').get_json()['body']
+    assert len(page['results']) == 1
+    assert client.get(f"/search?q=coffee&limit=1&cursor={page['next']}").get_json()['body']['results'][0]['title'] == 'Tea notes'
+
+    client.delete(f'/post/{tea.id}/delete', headers=admin_headers)
+    assert [r['id'] for r in client.get('/search?q=bean').get_json()['body']['results']] == [models.Post.query.first().id]
+    assert search.reindex() == 1
+
+
+def test_import_posts_from_ndjson(client, app, admin_headers, monkeypatch):
+    """
+    GIVEN an existing post and an NDJSON upload with valid, invalid and duplicate rows
+    WHEN it is imported in batches of two
+    THEN valid rows and their comments are written and searchable, and every bad line is reported
+    """
+    client.post('/post/create', json={'title': 'existing', 'body': 'already here'}, headers=admin_headers)
+    lines = [
+        '{"title": "first", "body": "imported body", "created_at": "2020-05-01T10:00:00", "comments": [{"body": "nice import"}]}',
+        '{"title": "existing", "body": "clashes with the database"}',
+        '',
+        'not json',
+        '{"title": "second", "body": "' + 'long imported body ' * 100 + '"}',
+        '{"title": "second", "body": "clashes within the upload"}',
+        '{"body": "no title"}',
+    ]
+    monkeypatch.setitem(app.config, 'IMPORT_BATCH_SIZE', 2)
+    response = client.post('/post/import', data='\n'.join(lines).encode(), content_type='application/x-ndjson', headers=admin_headers)
+
+    assert response.status_code == 200
+    report = response.get_json()['body']
+    assert (report['posts'], report['comments']) == (2, 1)
+    assert [e['line'] for e in report['errors']] == [2, 4, 6, 7]
+    assert 'already exists' in report['errors'][0]['error']
+
+    first = models.Post.query.filter_by(title='first').first()
+    assert first.created_at == datetime.datetime(2020, 5, 1, 10)
+    assert [c.body for c in first.comments] == ['nice import']
+    assert (first.comment_count, first.last_comment_at) == (1, first.comments[0].created_at)
+    second = models.Post.query.filter_by(title='second').first()
+    assert second.body_encoding == 'zlib' and second.text.startswith('long imported body')
+    assert {r['type'] for r in client.get('/search?q=import').get_json()['body']['results']} == {'post', 'comment'}
+
+    assert client.post('/post/import', data=b'{}').status_code == 404
+
+
+def test_import_replays_a_conflicting_batch_in_one_transaction(client, admin_headers, monkeypatch):
+    """
+    GIVEN an existing post and a batch whose replay (after a title conflict) fails while indexing
+    WHEN the batch is imported
+    THEN none of its rows are committed
+    """
+    client.post('/post/create', json={'title': 'existing', 'body': 'already here'}, headers=admin_headers)
+
+    def index_posts(connection, posts):
+        raise RuntimeError('index unavailable')
+    monkeypatch.setattr(search, 'index_posts', index_posts)
+    lines = ['{"title": "dup", "body": "replayed", "comments": [{"body": "lost"}]}', '{"title": "existing", "body": "clash"}']
+    response = client.post('/post/import', data='\n'.join(lines).encode(), content_type='application/x-ndjson', headers=admin_headers)
+
+    assert response.status_code == 400
+    db.session.expire_all()
+    assert [post.title for post in models.Post.query] == ['existing']
+
+
+def test_import_invalidates_cached_pages_of_new_posts(client, app, admin_headers, tmp_path):
+    """
+    GIVEN a cached (empty) comment listing of a post id that does not exist yet
+    WHEN a post with comments is imported under that id
+    THEN the listing shows the imported comments
+    """
+    app.config.update(RESPONSE_CACHE_BACKEND='sqlite', RESPONSE_CACHE_PATH=str(tmp_path / 'cache.db'))
+    response_cache.init_app(app)
+    try:
+        assert client.get('/post/1/comments').get_json()['body']['comments'] == []
+        assert client.get('/post/1/comments').headers['X-Cache'] == 'HIT'
+
+        line = b'{"title": "imported", "body": "text", "comments": [{"body": "first!"}]}'
+        client.post('/post/import', data=line, content_type='application/x-ndjson', headers=admin_headers)
+        response = client.get('/post/1/comments')
+        assert response.headers['X-Cache'] == 'MISS'
+        assert [c['body'] for c in response.get_json()['body']['comments']] == ['first!']
+    finally:
+        app.config['RESPONSE_CACHE_BACKEND'] = ''
+        response_cache.init_app(app)
+
+
+def test_export_streams_datasets(client, app, admin_headers, monkeypatch):
+    """
+    GIVEN posts (one with a compressed body) and a comment
+    WHEN posts, comments and users are exported as NDJSON, CSV and gzip, over HTTP and from the CLI
+    THEN every row comes back with decoded bodies, in small batches, and without passwords
+    """
+    make_posts(5)
+    models.Post.query.first().update({'body': 'compressed ' * 200})
+    db.session.add(models.Comment.create({'post_id': 1, 'body': 'first!'}))
+    db.session.commit()
+    monkeypatch.setitem(app.config, 'EXPORT_BATCH_SIZE', 2)
+
+    response = client.get('/export/posts', headers=admin_headers)
+    assert response.is_streamed and response.mimetype == 'application/x-ndjson'
+    posts = [json.loads(line) for line in response.get_data().splitlines()]
+    assert [p['id'] for p in posts] == [1, 2, 3, 4, 5]
+    assert posts[0]['body'] == 'compressed ' * 200 and 'body_encoding' not in posts[0]
+
+    response = client.get('/export/comments?format=csv&gzip=1', headers=admin_headers)
+    assert response.headers['Content-Disposition'] == 'attachment; filename=comments.csv.gz'
+    rows = list(csv.DictReader(gzip.decompress(response.get_data()).decode().splitlines()))
+    assert [(r['post_id'], r['body']) for r in rows] == [('1', 'first!')]
+
+    users = [json.loads(line) for line in client.get('/export/users', headers=admin_headers).get_data().splitlines()]
+    assert users[0]['email'] == 'admin@email.com' and 'password' not in users[0]
+
+    assert client.get('/export/tokens', headers=admin_headers).status_code == 400
+    assert client.get('/export/posts').status_code == 404
+
+    result = app.test_cli_runner().invoke(args=['export', 'posts', '--format', 'csv'])
+    assert result.exit_code == 0
+    assert [r['title'] for r in csv.DictReader(result.output.splitlines())] == [f'post {i}' for i in range(5)]
+
+
+def test_batch_runs_operations_in_one_transaction(client, admin_headers, monkeypatch):
+    """
+    GIVEN two posts with comments
+    WHEN moderation operations are sent as one batch, then as an atomic batch with a failing operation
+    THEN the token is validated once, failed operations are rolled back alone, and an atomic batch rolls back entirely
+    """
+    make_posts(2)
+    for body in ('spam', 'fine', 'keep'):
+        db.session.add(models.Comment.create({'post_id': 1, 'body': body}))
+    db.session.commit()
+
+    from core.user_auth import models as auth_models
+    calls = []
+    validate_token = auth_models.User.validate_token
+    monkeypatch.setattr(auth_models.User, 'validate_token', staticmethod(lambda token: calls.append(token) or validate_token(token)))
+
+    operations = [
+        {'method': 'DELETE', 'path': '/post/1/comment/1/delete'},
+        {'method': 'PATCH', 'path': '/post/1/comment/2/update', 'body': {'body': 'edited'}},
+        {'method': 'PATCH', 'path': '/post/2/update', 'body': {'title': 'post 0'}},
+        {'method': 'GET', 'path': '/post/1/comment/2'},
+        {'method': 'GET', 'path': '/nowhere'},
+        {'method': 'POST', 'path': '/batch', 'body': {'operations': []}},
+    ]
+    response = client.post('/batch', json={'operations': operations}, headers=admin_headers)
+    assert response.status_code == 200
+    results = response.get_json()['body']['results']
+    assert [r['status'] for r in results] == [200, 200, 400, 200, 404, 400]
+    assert results[3]['body']['body'] == 'edited'
+    assert len(calls) == 1
+
+    db.session.expire_all()
+    assert [c.body for c in models.Comment.query.order_by(models.Comment.id)] == ['edited', 'keep']
+    assert models.Post.query.get(2).title == 'post 1'
+
+    operations = [
+        {'method': 'DELETE', 'path': '/post/1/comment/3/delete'},
+        {'method': 'PATCH', 'path': '/post/1/comment/99/update', 'body': {'body': 'missing'}},
+        {'method': 'PATCH', 'path': '/post/1/comment/2/update', 'body': {'body': 'not run'}},
+    ]
+    response = client.post('/batch', json={'operations': operations, 'atomic': True}, headers=admin_headers)
+    assert response.status_code == 409
+    assert [r['status'] for r in response.get_json()['body']['results']] == [200, 400, 424]
+    db.session.expire_all()
+    assert [c.body for c in models.Comment.query.order_by(models.Comment.id)] == ['edited', 'keep']
+
+    assert client.post('/batch', json={'operations': []}, headers=admin_headers).status_code == 400
+
+
+def test_batches_bypass_the_response_cache(client, app, admin_headers, tmp_path):
+    """
+    GIVEN the shared SQLite response cache holding a post
+    WHEN a batch updates the post then reads it, and an atomic batch reads its own update before failing
+    THEN the batch reads its own write, and nothing it rendered is stored in the cache
+    """
+    app.config.update(RESPONSE_CACHE_BACKEND='sqlite', RESPONSE_CACHE_PATH=str(tmp_path / 'cache.db'))
+    response_cache.init_app(app)
+    try:
+        make_posts(2)
+        assert client.get('/post/1').get_json()['body']['title'] == 'post 0'
+        stores = response_cache.stats['stores']
+
+        operations = [{'method': 'PATCH', 'path': '/post/1/update', 'body': {'title': 'NEW'}}, {'method': 'GET', 'path': '/post/1'}]
+        results = client.post('/batch', json={'operations': operations}, headers=admin_headers).get_json()['body']['results']
+        assert results[1]['body']['title'] == 'NEW'
+
+        operations = [
+            {'method': 'PATCH', 'path': '/post/2/update', 'body': {'title': 'uncommitted'}},
+            {'method': 'GET', 'path': '/post/2'},
+            {'method': 'PATCH', 'path': '/post/1/comment/99/update', 'body': {'body': 'missing'}},
+        ]
+        response = client.post('/batch', json={'operations': operations, 'atomic': True}, headers=admin_headers)
+        assert response.get_json()['body']['results'][1]['body']['title'] == 'uncommitted'
+        assert response_cache.stats['stores'] == stores
+        assert client.get('/post/2').get_json()['body']['title'] == 'post 1'
+    finally:
+        app.config['RESPONSE_CACHE_BACKEND'] = ''
+        response_cache.init_app(app)
+
+
+def test_reads_are_routed_to_a_healthy_replica(client, app, admin_headers, tmp_path):
+    """
+    GIVEN a replica copied from the primary, an unreachable replica, and a post written to the primary since
+    WHEN posts are listed before and after the client writes through the API
+    THEN reads skip the unreachable replica and are served from the stale copy, except right after the client's own write
+    """
+    make_posts(2)
+    replica = tmp_path / 'replica.db'
+    with sqlite3.connect(db.engine.url.database) as primary, sqlite3.connect(replica) as copy:
+        primary.backup(copy)
+    db.session.add(models.Post.create({'title': 'not replicated yet', 'body': 'new'}))
+    db.session.commit()
+
+    app.config['READ_REPLICA_URIS'] = f"sqlite:///{tmp_path / 'missing' / 'down.db'},sqlite:///{replica}"
+    read_replicas.init_app(app, db)
+    titles = lambda client: [p['title'] for p in client.get('/post/all').get_json()['body']['posts']]
+    try:
+        assert titles(client) == ['post 1', 'post 0']
+
+        client.post('/post/create', json={'title': 'mine', 'body': 'just written'}, headers=admin_headers)
+        assert titles(client) == ['mine', 'not replicated yet', 'post 1', 'post 0']
+        assert titles(app.test_client()) == ['post 1', 'post 0']
+    finally:
+        app.config['READ_REPLICA_URIS'] = ''
+        read_replicas.init_app(app, db)
+
+
+def test_replica_reads_are_not_cached(client, app, admin_headers, tmp_path):
+    """
+    GIVEN a lagging replica and the shared response cache
+    WHEN another client lists posts right after a write, then the writer does
+    THEN the stale replica page is never stored, so the writer and later readers get the primary's page
+    """
+    make_posts(2)
+    replica = tmp_path / 'replica.db'
+    with sqlite3.connect(db.engine.url.database) as primary, sqlite3.connect(replica) as copy:
+        primary.backup(copy)
+
+    app.config.update(READ_REPLICA_URIS=f'sqlite:///{replica}', RESPONSE_CACHE_BACKEND='sqlite', RESPONSE_CACHE_PATH=str(tmp_path / 'cache.db'))
+    read_replicas.init_app(app, db)
+    response_cache.init_app(app)
+    titles = lambda response: [p['title'] for p in response.get_json()['body']['posts']]
+    try:
+        client.post('/post/create', json={'title': 'mine', 'body': 'just written'}, headers=admin_headers)
+        other = app.test_client()
+        stores = response_cache.stats['stores']
+
+        stale = other.get('/post/all')
+        assert titles(stale) == ['post 1', 'post 0'] and stale.headers['X-Cache'] == 'MISS'
+        assert other.get('/post/all').headers['X-Cache'] == 'MISS' and response_cache.stats['stores'] == stores
+
+        fresh = client.get('/post/all')
+        assert titles(fresh) == ['mine', 'post 1', 'post 0'] and fresh.headers['X-Cache'] == 'MISS'
+        assert response_cache.stats['stores'] == stores + 1
+        assert client.get('/post/all').headers['X-Cache'] == 'HIT'
+    finally:
+        app.config.update(READ_REPLICA_URIS='', RESPONSE_CACHE_BACKEND='')
+        read_replicas.init_app(app, db)
+        response_cache.init_app(app)
+
+
+def test_compressed_responses_and_cached_variants(client, app, tmp_path):
+    """
+    GIVEN the shared response cache and clients accepting gzip or deflate
+    WHEN a listing is read, read again and revalidated
+    THEN it is compressed once per encoding, served from the stored variant, and matched by its variant ETag
+    """
+    make_posts(10)
+    plain = client.get('/post/all')
+    assert 'Content-Encoding' not in plain.headers and 'Accept-Encoding' in plain.headers['Vary']
+
+    app.config.update(RESPONSE_CACHE_BACKEND='sqlite', RESPONSE_CACHE_PATH=str(tmp_path / 'cache.db'))
+    response_cache.init_app(app)
+    compressions = response_cache.stats['compressions']
+    try:
+        gzipped = {'Accept-Encoding': 'gzip, deflate;q=0.5'}
+        first = client.get('/post/all?limit=10', headers=gzipped)
+        assert (first.headers['X-Cache'], first.headers['Content-Encoding']) == ('MISS', 'gzip')
+        assert json.loads(gzip.decompress(first.get_data()))['body']['posts'] == plain.get_json()['body']['posts']
+        etag = first.headers['ETag']
+        assert etag.endswith('-gzip"')
+
+        second = client.get('/post/all?limit=10', headers=gzipped)
+        assert second.headers['X-Cache'] == 'HIT' and second.get_data() == first.get_data()
+        assert response_cache.stats['compressions'] == compressions + 1
+
+        revalidated = client.get('/post/all?limit=10', headers={**gzipped, 'If-None-Match': etag})
+        assert revalidated.status_code == 304 and revalidated.headers['ETag'] == etag
+
+        deflated = client.get('/post/all?limit=10', headers={'Accept-Encoding': 'deflate'})
+        assert deflated.headers['Content-Encoding'] == 'deflate'
+        assert json.loads(zlib.decompress(deflated.get_data())) == json.loads(gzip.decompress(first.get_data()))
+        assert response_cache.stats['compressions'] == compressions + 2
+    finally:
+        app.config['RESPONSE_CACHE_BACKEND'] = ''
+        response_cache.init_app(app)
+
+    # Without the cache the response is compressed on the way out.
+    response = client.get('/post/all', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(response.get_data())) == plain.get_json()
+
+
+def test_async_reads_match_the_wsgi_views(client, app):
+    """
+    GIVEN posts with comments
+    WHEN the blog reads are served by the ASGI application on the async engine
+    THEN status, body and validators match the WSGI views, and conditional and compressed requests behave alike
+    """
+    pytest.importorskip('aiosqlite')
+    from core.asgi import AsyncReads
+
+    make_posts(12)
+    post = models.Post.query.filter_by(title='post 11').first()
+    for i in range(3):
+        db.session.add(models.Comment.create({'post_id': post.id, 'body': f'comment {i}'}))
+    db.session.commit()
+
+    async def get(asgi, path, headers={}):
+        path, _, query = path.partition('?')
+        scope = {'type': 'http', 'method': 'GET', 'path': path, 'query_string': query.encode(),
+                 'headers': [(k.lower().encode(), v.encode()) for k, v in headers.items()]}
+        messages = []
+        async def receive(): return {'type': 'http.request', 'body': b''}
+        async def send(message): messages.append(message)
+        await asgi(scope, receive, send)
+        return messages[0]['status'], {k.decode(): v.decode() for k, v in messages[0]['headers']}, messages[1]['body']
+
+    urls = ['/post/all?limit=5', '/post/all?view=full&fields=id,title', f'/post/{post.id}', '/post/0',
+            f'/post/{post.id}/comments?limit=2', f'/post/{post.id}/comment/1', f'/post/{post.id}/comment/9', '/post/all?cursor=bad']
+
+    async def run(asgi):
+        try:
+            results = [await get(asgi, url) for url in urls]
+            status, headers, _ = results[0]
+            revalidated = await get(asgi, urls[0], {'If-None-Match': headers['ETag']})
+            gzipped = await get(asgi, '/post/all?view=full', {'Accept-Encoding': 'gzip'})
+            return results, revalidated, gzipped
+        finally:
+            await asgi.stop()
+
+    results, revalidated, gzipped = asyncio.run(run(AsyncReads(app)))
+    for url, (status, headers, body) in zip(urls, results):
+        expected = client.get(url)
+        assert (status, json.loads(body)) == (expected.status_code, expected.get_json()), url
+        assert headers.get('ETag') == expected.headers.get('ETag'), url
+        assert headers.get('Last-Modified') == expected.headers.get('Last-Modified'), url
+
+    assert revalidated[0] == 304 and revalidated[2] == b''
+    status, headers, body = gzipped
+    assert headers['Content-Encoding'] == 'gzip' and headers['ETag'].endswith('-gzip"')
+    assert json.loads(gzip.decompress(body)) == client.get('/post/all?view=full').get_json()
+
+
+def test_comment_counts_and_activity_sorts(client, app, admin_headers):
+    """
+    GIVEN posts with comments created, moved and deleted through the API
+    WHEN posts are listed by newest, most discussed and most recently active
+    THEN every post carries its comment count and last comment time, the orders page with cursors, and drift is reconciled
+    """
+    make_posts(5)
+    ids = {p.title: p.id for p in models.Post.query.all()}
+    for title in ('post 1', 'post 1', 'post 3', 'post 1'):
+        client.post(f"/post/{ids[title]}/comment/create", json={'body': f'on {title}'}, headers=admin_headers)
+
+    def listing(sort, limit=10):
+        posts, cursor = [], None
+        while True:
+            body = client.get(f'/post/all?sort={sort}&limit={limit}' + (f'&cursor={cursor}' if cursor else '')).get_json()['body']
+            posts += body['posts']
+            cursor = body['next']
+            if (not cursor): return posts
+
+    posts = {p['title']: p for p in listing('new')}
+    assert {t: p['comment_count'] for t, p in posts.items()} == {'post 0': 0, 'post 1': 3, 'post 2': 0, 'post 3': 1, 'post 4': 0}
+    assert posts['post 0']['last_comment_at'] is None and posts['post 1']['last_comment_at'] is not None
+    assert [p['title'] for p in listing('discussed', limit=2)] == ['post 1', 'post 3', 'post 4', 'post 2', 'post 0']
+    assert [p['title'] for p in listing('active', limit=2)] == ['post 1', 'post 3', 'post 4', 'post 2', 'post 0']
+    assert client.get('/post/all?sort=popular').status_code == 400
+
+    # A new comment changes the post's representation.
+    etag = client.get(f"/post/{ids['post 3']}").headers['ETag']
+    client.post(f"/post/{ids['post 3']}/comment/create", json={'body': 'again'}, headers=admin_headers)
+    response = client.get(f"/post/{ids['post 3']}", headers={'If-None-Match': etag})
+    assert response.status_code == 200 and response.get_json()['body']['comment_count'] == 2
+
+    # Moving and deleting comments recounts both posts.
+    moved, deleted = models.Comment.query.filter_by(post_id=ids['post 1']).order_by(models.Comment.id).all()[:2]
+    client.patch(f"/post/{ids['post 1']}/comment/{moved.id}/update", json={'post_id': ids['post 0']}, headers=admin_headers)
+    client.delete(f"/post/{ids['post 1']}/comment/{deleted.id}/delete", headers=admin_headers)
+    post_1, post_0 = db.session.get(models.Post, ids['post 1']), db.session.get(models.Post, ids['post 0'])
+    assert (post_1.comment_count, post_0.comment_count) == (1, 1)
+    assert post_0.last_comment_at == moved.created_at
+    assert post_1.last_comment_at == models.Comment.query.filter_by(post_id=ids['post 1']).one().created_at
+
+    db.session.execute(models.Post.__table__.update().where(models.Post.id == ids['post 2']).values(comment_count=7))
+    db.session.commit()
+    assert activity.reconcile(batch_size=2) == 1
+    result = app.test_cli_runner().invoke(args=['comments', 'reconcile'])
+    assert result.exit_code == 0 and 'repaired 0 posts' in result.output
+    assert db.session.get(models.Post, ids['post 2']).comment_count == 0
+
+
+def test_reconcile_invalidates_cached_posts(client, app, tmp_path):
+    """
+    GIVEN a post cached with a drifted comment count
+    WHEN the counts are reconciled
+    THEN the post is read again with its repaired count
+    """
+    app.config.update(RESPONSE_CACHE_BACKEND='sqlite', RESPONSE_CACHE_PATH=str(tmp_path / 'cache.db'))
+    response_cache.init_app(app)
+    try:
+        make_posts(1)
+        db.session.execute(models.Post.__table__.update().values(comment_count=7))
+        db.session.commit()
+        assert client.get('/post/1').get_json()['body']['comment_count'] == 7
+        assert client.get('/post/1').headers['X-Cache'] == 'HIT'
+
+        assert activity.reconcile() == 1
+        response = client.get('/post/1')
+        assert response.headers['X-Cache'] == 'MISS'
+        assert response.get_json()['body']['comment_count'] == 0
+    finally:
+        app.config['RESPONSE_CACHE_BACKEND'] = ''
+        response_cache.init_app(app)
@@ -0,0 +1,73 @@
+import os
+
+from sqlalchemy import create_engine
+from sqlalchemy.pool import QueuePool
+
+from core import db
+from core.utils import SQLiteProfile, sqlite_profile
+
+
+def test_production_profile_tunes_sqlite_connections(app, tmp_path):
+    """
+    GIVEN a file SQLite database
+    WHEN connections are opened with and without the production DATABASE_PROFILE
+    THEN only the production profile pools them and applies SQLITE_PRAGMAS to every connection
+    """
+    config = {'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'profile.db'}", 'DATABASE_PROFILE': 'production',
+              'DATABASE_POOL_SIZE': 3, 'DATABASE_MAX_OVERFLOW': 2, 'DATABASE_POOL_TIMEOUT': 7.0, 'DATABASE_POOL_RECYCLE': 60}
+    options = SQLiteProfile.engine_options(config)
+    assert options['poolclass'] is QueuePool and options['connect_args'] == {'check_same_thread': False}
+    assert (options['pool_size'], options['max_overflow'], options['pool_timeout'], options['pool_recycle'], options['pool_pre_ping']) == (3, 2, 7.0, 60, True)
+    assert SQLiteProfile.engine_options(dict(config, DATABASE_POOL_SIZE=0)) == {}
+    assert SQLiteProfile.engine_options(dict(config, SQLALCHEMY_DATABASE_URI='sqlite://')) == {}
+    assert SQLiteProfile.engine_options(dict(config, DATABASE_PROFILE='')) == {}
+
+    def pragmas():
+        engine = create_engine(config['SQLALCHEMY_DATABASE_URI'], **options)
+        try:
+            with engine.connect() as connection:
+                assert isinstance(engine.pool, QueuePool)
+                return {name: connection.exec_driver_sql(f'PRAGMA {name}').scalar() for name in tuned}
+        finally:
+            engine.dispose()
+
+    tuned = app.config['SQLITE_PRAGMAS']
+    expected = {name: str(value).lower() if isinstance(value, str) else value for name, value in tuned.items()}
+    expected.update(synchronous=1, temp_store=2)  # NORMAL, MEMORY
+    profile = app.config['DATABASE_PROFILE']
+    try:
+        app.config['DATABASE_PROFILE'] = ''
+        sqlite_profile.init_app(app, db)
+        defaults = pragmas()
+        assert (defaults['journal_mode'], defaults['synchronous'], defaults['cache_size']) == ('delete', 2, -2000)
+
+        app.config['DATABASE_PROFILE'] = 'production'
+        sqlite_profile.init_app(app, db)
+        assert pragmas() == expected
+    finally:
+        app.config['DATABASE_PROFILE'] = profile
+        sqlite_profile.init_app(app, db)
+
+
+def test_forked_workers_open_their_own_connections():
+    """
+    GIVEN an application whose connection pool holds a connection
+    WHEN the process forks, as gunicorn --preload does for each worker
+    THEN the child starts from an empty pool and the parent keeps its connection
+    """
+    assert db.session.execute(db.text('SELECT 1')).scalar() == 1
+    db.session.remove()
+    engine = db.get_engine()
+    assert engine.pool.checkedin() == 1
+
+    read, write = os.pipe()
+    pid = os.fork()
+    if (pid == 0):
+        try:
+            ok = engine.pool.checkedin() == 0 and db.session.execute(db.text('SELECT 1')).scalar() == 1
+            os.write(write, b'1' if ok else b'0')
+        finally:
+            os._exit(0)
+    os.waitpid(pid, 0)
+    assert os.read(read, 1) == b'1'
+    assert engine.pool.checkedin() == 1
@@ -0,0 +1,79 @@
+import os
+import json
+import datetime
+
+from core import db
+from core.blog import models
+from core.utils import Metrics, metrics
+
+
+def make_posts(count):
+    start = datetime.datetime(2022, 1, 1)
+    for i in range(count):
+        post = models.Post.create({'title': f'post {i}', 'body': f'body {i}', 'created_at': start + datetime.timedelta(minutes=i)})
+        db.session.add(post)
+    db.session.commit()
+
+
+def test_metrics_per_endpoint_and_across_workers(client, admin_headers, tmp_path, monkeypatch):
+    """
+    GIVEN a few reads and an authenticated write, and the snapshot of another worker in METRICS_DIR
+    WHEN /metrics is scraped
+    THEN requests, latency buckets, SQL statements and auth time are reported per endpoint and summed across workers
+    """
+    make_posts(3)
+    monkeypatch.setattr(metrics, '_samples', {})
+    client.get('/post/all')
+    client.get('/post/all')
+    client.post('/post/create', json={'title': 'measured', 'body': 'x'}, headers=admin_headers)
+
+    def scrape():
+        samples = {}
+        for line in client.get('/metrics').get_data(as_text=True).splitlines():
+            if (not line.startswith('#')):
+                name, value = line.rsplit(' ', 1)
+                samples[name] = float(value)
+        return samples
+
+    samples = scrape()
+    assert samples['http_requests_total{endpoint="blog.get_posts",method="GET",status="200"}'] == 2
+    assert samples['http_request_duration_seconds_count{endpoint="blog.get_posts"}'] == 2
+    assert samples['http_request_duration_seconds_bucket{endpoint="blog.get_posts",le="+Inf"}'] == 2
+    assert samples['db_statements_total{endpoint="blog.get_posts"}'] >= 2
+    assert samples['http_response_bytes_total{endpoint="blog.get_posts"}'] > 0
+    assert samples['auth_duration_seconds_total{endpoint="blog.create_post"}'] > 0
+
+    other = [['http_requests_total', [['endpoint', 'blog.get_posts'], ['method', 'GET'], ['status', '200']], 5]]
+    (tmp_path / 'metrics-1.json').write_text(json.dumps(other))
+    monkeypatch.setattr(metrics, 'directory', str(tmp_path))
+    assert scrape()['http_requests_total{endpoint="blog.get_posts",method="GET",status="200"}'] == 7
+
+
+def test_metrics_dir_lifecycle(tmp_path, monkeypatch):
+    """
+    GIVEN workers writing their samples to METRICS_DIR
+    WHEN a worker exits, a new worker gets a reused pid, and the server starts again
+    THEN the exited worker's samples move to the archive, nothing is overwritten, and the directory is cleared
+    """
+    key = ('http_requests_total', (('endpoint', 'blog.get_posts'), ('method', 'GET'), ('status', '200')))
+    directory = str(tmp_path)
+    monkeypatch.setattr(metrics, 'directory', directory)
+    monkeypatch.setattr(metrics, '_samples', {key: 3})
+    metrics.flush()
+    exited = metrics.path
+    assert os.path.exists(exited)
+
+    metrics.retire()
+    assert not os.path.exists(exited)
+    assert sorted(os.listdir(directory)) == ['metrics-archive.json', 'metrics.lock']
+    assert metrics.collect()[key] == 3
+
+    # A later worker with the same pid writes its own file next to the archive.
+    monkeypatch.setattr(metrics, '_pid', -1)
+    metrics.observe('blog.get_posts', 'GET', 200, 0.01)
+    metrics.observe('blog.get_posts', 'GET', 200, 0.01)
+    assert metrics.path != exited
+    assert metrics.collect()[key] == 5
+
+    Metrics.clear(directory)
+    assert os.listdir(directory) == ['metrics.lock']
@@ -0,0 +1,47 @@
+import logging
+import datetime
+
+import pytest
+from flask import g
+
+from core import db
+from core.blog import models
+from core.utils import query_budget, QueryBudgetExceeded
+from core.user_auth.cache import token_cache
+from core.user_auth.revocation import revoked_tokens
+
+
+def make_posts(count):
+    start = datetime.datetime(2022, 1, 1)
+    for i in range(count):
+        post = models.Post.create({'title': f'post {i}', 'body': f'body {i}', 'created_at': start + datetime.timedelta(minutes=i)})
+        db.session.add(post)
+    db.session.commit()
+
+
+def test_query_budgets_and_repeated_statements(client, app, admin_headers, caplog):
+    """
+    GIVEN views with declared query budgets
+    WHEN a view runs more statements than its budget, and a batch repeats one statement shape
+    THEN the test fails with QueryBudgetExceeded, and the repeated statement is logged as a possible N+1
+    """
+    make_posts(6)
+    assert client.get('/post/1').status_code == 200
+    # Three statements for the update itself, apart from validating a token that is not cached yet.
+    token_cache.clear()
+    revoked_tokens.reset()
+    assert client.patch('/post/1/update', json={'title': 'budgeted'}, headers=admin_headers).get_json()['body']['title'] == 'budgeted'
+
+    @query_budget(1)
+    def greedy_view():
+        return [post.title for post in models.Post.query.limit(2)] + [models.Post.query.get(3).title]
+
+    with app.test_request_context('/'):
+        g.query_log = []
+        with pytest.raises(QueryBudgetExceeded, match='ran 2 SQL statements and 0 for token validation, its budget is 1 and 2'):
+            greedy_view()
+
+    operations = [{'method': 'GET', 'path': f'/post/{id}?view=summary'} for id in range(1, 7)]
+    with caplog.at_level(logging.WARNING, logger='core.utils.queries'):
+        client.post('/batch', json={'operations': operations}, headers=admin_headers)
+    assert 'possible N+1 in POST /batch: 6 x SELECT post.id' in caplog.text
@@ -0,0 +1,38 @@
+from core.utils import RateLimiter, SQLiteBuckets, Limit, rate_limiter
+
+
+def test_rate_limits_per_ip_and_per_user(client, app, admin_headers, tmp_path):
+    """
+    GIVEN rate limits shared through SQLite, with requests leased two at a time
+    WHEN anonymous and authenticated clients exceed their limits
+    THEN they get a 429 with Retry-After, and another worker sees the same empty bucket
+    """
+    path = str(tmp_path / 'rate-limit.db')
+    app.config.update(RATE_LIMIT_BACKEND='sqlite', RATE_LIMIT_PATH=path, RATE_LIMIT_LEASE=2,
+                      RATE_LIMIT_USER='3/minute', RATE_LIMIT_TOKEN='', RATE_LIMIT_IP='2/minute')
+    rate_limiter.init_app(app)
+    try:
+        response = client.get('/post/all')
+        assert response.status_code == 200
+        assert (response.headers['RateLimit-Limit'], response.headers['RateLimit-Remaining']) == ('2', '1')
+        assert client.get('/post/all').headers['RateLimit-Remaining'] == '0'
+        response = client.get('/post/all')
+        assert response.status_code == 429
+        assert 1 <= int(response.headers['Retry-After']) <= 30
+        assert response.get_json()['status'] == 429
+
+        # Authenticated routes draw from the user's bucket, not the IP's.
+        for remaining in ('2', '1', '0'):
+            response = client.get('/users/all', headers=admin_headers)
+            assert response.get_json()['status'] == 200
+            assert response.headers['RateLimit-Remaining'] == remaining
+        response = client.get('/users/all', headers=admin_headers)
+        assert response.status_code == 429 and 'Retry-After' in response.headers
+
+        from core.user_auth import models as auth_models
+        admin = auth_models.User.query.filter_by(is_admin=True).one()
+        other_worker = RateLimiter(SQLiteBuckets(path))
+        assert not other_worker.hit(f'user:*:{admin.id}', Limit(3, 60)).allowed
+    finally:
+        app.config['RATE_LIMIT_BACKEND'] = ''
+        rate_limiter.init_app(app)
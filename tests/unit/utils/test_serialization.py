@@ -0,0 +1,26 @@
+import datetime
+
+import pytest
+
+from core.utils import JSONProvider
+
+
+@pytest.mark.parametrize('library', ['orjson', 'stdlib'])
+def test_json_provider_matches_flask(app, monkeypatch, library):
+    """
+    GIVEN the JSON provider backed by orjson or by the stdlib
+    WHEN envelopes with datetimes are serialized
+    THEN the output matches Flask's default provider, and ISO datetimes can be chosen instead
+    """
+    from flask.json.provider import DefaultJSONProvider
+    assert isinstance(app.json, JSONProvider)
+
+    envelope = {'status': 200, 'msg': 'ok', 'body': {'b': [1, 2.5, None, 'x'], 'a': datetime.datetime(2022, 8, 1, 12, 30)}}
+    monkeypatch.setitem(app.config, 'JSON_LIBRARY', library)
+    provider = JSONProvider(app)
+    assert provider.response(envelope).get_data() == DefaultJSONProvider(app).response(envelope).get_data()
+
+    assert provider.loads(b'{"a": [1]}') == {'a': [1]}
+
+    monkeypatch.setitem(app.config, 'JSON_DATETIME_FORMAT', 'iso')
+    assert JSONProvider(app).dumps({'at': datetime.datetime(2022, 8, 1, 12, 30)}) == '{"at":"2022-08-01T12:30:00"}'